@@ -1,14 +1,24 @@
-import asyncio
-from datetime import datetime
 from fastapi import APIRouter, HTTPException, Depends, Query, Body
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, validator
-import math
-from loguru import logger
 
 from database import Database
 from config import settings
 from websocket_manager import manager
+from dispatch import offers
+from dispatch_queue import dispatch_queue
+from driver_index import driver_index, find_nearby_drivers
+from location_ingest import location_ingest
+from location_filter import location_filter
+from route_cache import route_cache
+from address_index import address_index
+from geocode_cache import geocode_cache
+from reference_cache import reference_cache
+from pricing import pricing_engine
+from surge import surge_engine
+from live_tracking import live_tracker
+from http_client import http_client
+from resilience import geocoder_guard
 import utils
 
 router = APIRouter()
@@ -43,6 +53,18 @@ class DriverLocationUpdate(BaseModel):
     speed: Optional[float] = None
     heading: Optional[int] = None
     accuracy: Optional[float] = None
+    
+    @validator('lat')
+    def validate_lat(cls, v):
+        if not -90 <= v <= 90:
+            raise ValueError('Latitude must be between -90 and 90')
+        return v
+    
+    @validator('lon')
+    def validate_lon(cls, v):
+        if not -180 <= v <= 180:
+            raise ValueError('Longitude must be between -180 and 180')
+        return v
 
 class OrderStatusUpdate(BaseModel):
     status: str
@@ -54,28 +76,23 @@ class OrderStatusUpdate(BaseModel):
 async def create_order(order: OrderCreate):
     """Создать новый заказ"""
     
-    # Расчет расстояния и времени
-    distance = utils.calculate_distance(
+    # Расчет расстояния и времени по дорогам
+    distance, duration = await route_cache.route(
         order.pickup_lat, order.pickup_lon,
-        order.destination_lat, order.destination_lon
+        order.destination_lat, order.destination_lon,
+        utils.calculate_route
     )
     
-    duration = utils.calculate_eta(distance)
-    
-    # Расчет стоимости
-    price = await Database.calculate_price(
-        distance_km=distance,
-        duration_minutes=duration,
-        tariff_id=order.tariff_id
-    )
-    
-    # Получаем информацию о тарифе
-    tariffs = await Database.get_tariffs()
-    tariff = next((t for t in tariffs if t['id'] == order.tariff_id), None)
+    # Тариф из кэша справочников
+    tariff = reference_cache.get_tariff(order.tariff_id)
     
     if not tariff:
         raise HTTPException(status_code=400, detail="Invalid tariff")
     
+    # Расчет стоимости с учетом спроса в точке подачи
+    surge = surge_engine.multiplier(order.pickup_lat, order.pickup_lon)
+    price = pricing_engine.quote(distance, duration, tariff, surge=surge)
+    
     # Создаем заказ
     order_data = {
         'passenger_id': order.passenger_id,
@@ -96,14 +113,21 @@ async def create_order(order: OrderCreate):
     if not created_order:
         raise HTTPException(status_code=500, detail="Failed to create order")
     
-    # Запускаем поиск водителя в фоне
-    asyncio.create_task(find_driver_for_order(created_order['id']))
+    surge_engine.order_opened(created_order['id'], order.pickup_lat, order.pickup_lon)
+    
+    # Запускаем поиск водителя: в режиме global заказ подхватит диспетчер на ближайшем тике,
+    # иначе - задача в очереди поиска, которая переживает перезапуск процесса
+    if settings.DISPATCH_MODE == 'global':
+        await Database.update_order_status(created_order['id'], 'searching_driver')
+    else:
+        await dispatch_queue.enqueue(created_order['id'])
     
     return {
         "success": True,
         "order_id": created_order['id'],
         "order_uuid": created_order['order_uuid'],
         "price": price,
+        "surge": surge,
         "estimated_duration": duration,
         "message": "Order created successfully"
     }
@@ -125,17 +149,24 @@ async def update_order_status(
 ):
     """Обновить статус заказа"""
     
-    success = await Database.update_order_status(
+    changes = await Database.update_order_status(
         order_id=order_id,
         status=status_update.status,
         driver_id=status_update.driver_id
     )
     
-    if not success:
+    if not changes:
         raise HTTPException(status_code=404, detail="Order not found or status update failed")
     
+    surge_engine.order_status(order_id, status_update.status)
+    
+    # Останавливаем поиск водителя, если заказ отменен
+    if status_update.status in ('cancelled', 'failed'):
+        offers.stop_search(order_id)
+        await Database.complete_dispatch_job(order_id)
+    
     # Уведомляем через WebSocket
-    await manager.notify_order_update(order_id, status_update.status, status_update.driver_id or 0)
+    await manager.notify_order_update(order_id, status_update.status, status_update.driver_id or 0, changes)
     
     return {"success": True, "message": "Order status updated"}
 
@@ -152,7 +183,10 @@ async def get_nearby_drivers_for_order(order_id: int):
     lat = order.get('pickup_lat') or 55.7558
     lon = order.get('pickup_lon') or 37.6176
     
-    drivers = await Database.find_nearby_drivers(lat, lon)
+    # Поиск отдает только координаты и расстояние (из индекса или PostGIS) - профили одним запросом
+    nearby = await find_nearby_drivers(lat, lon, settings.DRIVER_SEARCH_RADIUS_KM)
+    profiles = await Database.get_drivers_by_ids([d['id'] for d in nearby]) if nearby else {}
+    drivers = [{**profiles[d['id']], **d} for d in nearby if d['id'] in profiles]
     
     return {
         "order_id": order_id,
@@ -170,18 +204,40 @@ async def update_driver_location(
 ):
     """Обновить местоположение водителя"""
     
-    success = await Database.update_driver_location(
-        driver_id=driver_id,
-        lat=location.lat,
-        lon=location.lon,
+    # Индекс знает всех водителей из БД - в базу идем только за незнакомым id
+    if driver_index.get_status(driver_id) is None and not await Database.driver_exists(driver_id):
+        raise HTTPException(status_code=404, detail="Driver not found")
+    
+    # Индекс в памяти получает каждую точку, в БД пишутся только значимые - пакетом
+    driver_index.update_position(driver_id, location.lat, location.lon)
+    
+    # Точку - пассажиру, если водитель везет заказ (частоту ограничивает сам трекер)
+    await live_tracker.driver_moved(driver_id, location.lat, location.lon, location.heading)
+    
+    if not location_filter.should_store(
+        driver_id,
+        location.lat,
+        location.lon,
+        status=driver_index.get_status(driver_id),
+        speed=location.speed,
+        heading=location.heading,
+        accuracy=location.accuracy
+    ):
+        return {"success": True, "message": "Location unchanged"}
+    
+    accepted = location_ingest.submit(
+        driver_id,
+        location.lat,
+        location.lon,
         speed=location.speed,
-        heading=location.heading
+        heading=location.heading,
+        accuracy=location.accuracy
     )
     
-    if not success:
-        raise HTTPException(status_code=404, detail="Driver not found")
+    if not accepted:
+        raise HTTPException(status_code=503, detail="Location queue is full, retry later")
     
-    return {"success": True, "message": "Location updated"}
+    return {"success": True, "message": "Location accepted"}
 
 @router.put("/drivers/{driver_id}/status")
 async def update_driver_status(
@@ -198,6 +254,10 @@ async def update_driver_status(
     if not success:
         raise HTTPException(status_code=404, detail="Driver not found")
     
+    driver_index.set_status(driver_id, status)
+    # Первая точка в новом статусе сохраняется без отсева
+    location_filter.forget(driver_id)
+    
     return {"success": True, "message": "Driver status updated"}
 
 @router.get("/drivers/{driver_id}/active-order")
@@ -218,46 +278,84 @@ async def accept_order(
 ):
     """Принять заказ водителем"""
     
-    success = await Database.assign_driver_to_order(order_id, driver_id)
+    changes = await Database.assign_driver_to_order(order_id, driver_id)
     
-    if not success:
+    if not changes:
         raise HTTPException(status_code=400, detail="Cannot accept this order")
     
+    # Сообщаем поиску водителя, что заказ принят
+    offers.assign_order(order_id, driver_id)
+    surge_engine.order_closed(order_id)
+    await Database.complete_dispatch_job(order_id)
+    
     # Обновляем статус водителя
     await Database.update_driver_status(driver_id, 'busy')
+    driver_index.set_status(driver_id, 'busy')
     
     # Уведомляем пассажира
-    await manager.notify_order_update(order_id, 'driver_assigned', driver_id)
+    await manager.notify_order_update(order_id, 'driver_assigned', driver_id, changes)
     
     return {"success": True, "message": "Order accepted"}
 
+@router.post("/drivers/{driver_id}/decline-order/{order_id}")
+async def decline_order(
+    driver_id: int,
+    order_id: int
+):
+    """Отказ водителя от предложенного заказа"""
+    
+    if not offers.resolve(order_id, driver_id, False):
+        raise HTTPException(status_code=400, detail="No pending offer for this order")
+    
+    return {"success": True, "message": "Order declined"}
+
 # === TARIFF ENDPOINTS ===
 
 @router.get("/tariffs")
 async def get_tariffs():
     """Получить список тарифов"""
-    tariffs = await Database.get_tariffs()
-    return tariffs
+    return reference_cache.get_tariffs()
 
 @router.get("/calculate-price")
 async def calculate_price(
-    distance_km: float = Query(..., gt=0),
-    duration_minutes: int = Query(..., gt=0),
-    tariff_id: int = Query(1, gt=0)
+    distance_km: Optional[float] = Query(None, gt=0),
+    duration_minutes: Optional[int] = Query(None, gt=0),
+    tariff_id: int = Query(1, gt=0),
+    pickup_lat: Optional[float] = Query(None, ge=-90, le=90),
+    pickup_lon: Optional[float] = Query(None, ge=-180, le=180),
+    destination_lat: Optional[float] = Query(None, ge=-90, le=90),
+    destination_lon: Optional[float] = Query(None, ge=-180, le=180)
 ):
-    """Рассчитать стоимость поездки"""
+    """Рассчитать стоимость поездки (по расстоянию и времени или по координатам)"""
+    
+    if distance_km is None or duration_minutes is None:
+        if None in (pickup_lat, pickup_lon, destination_lat, destination_lon):
+            raise HTTPException(
+                status_code=400,
+                detail="Either distance_km and duration_minutes or pickup/destination coordinates are required"
+            )
+        
+        distance_km, duration_minutes = await route_cache.route(
+            pickup_lat, pickup_lon, destination_lat, destination_lon, utils.calculate_route
+        )
     
-    price = await Database.calculate_price(
-        distance_km=distance_km,
-        duration_minutes=duration_minutes,
-        tariff_id=tariff_id
-    )
+    tariff = reference_cache.get_tariff(tariff_id)
+    
+    if not tariff:
+        raise HTTPException(status_code=400, detail="Invalid tariff")
+    
+    # Коэффициент спроса известен только при заданной точке подачи
+    surge = 1.0
+    if pickup_lat is not None and pickup_lon is not None:
+        surge = surge_engine.multiplier(pickup_lat, pickup_lon)
     
     return {
         "distance_km": distance_km,
         "duration_minutes": duration_minutes,
         "tariff_id": tariff_id,
-        "price": price
+        "surge": surge,
+        "price": pricing_engine.quote(distance_km, duration_minutes, tariff, surge=surge),
+        "quotes": pricing_engine.quote_all(distance_km, duration_minutes, surge=surge)
     }
 
 # === STATISTICS ===
@@ -269,6 +367,17 @@ async def get_stats():
     
     # Добавляем WebSocket статистику
     stats['online_drivers_ws'] = manager.get_online_drivers_count()
+    stats['websocket'] = manager.get_stats()
+    stats['live_tracking'] = live_tracker.get_stats()
+    stats['location_ingest'] = location_ingest.get_stats()
+    stats['location_filter'] = location_filter.get_stats()
+    stats['route_cache'] = route_cache.get_stats()
+    stats['geocode_cache'] = geocode_cache.get_stats()
+    stats['address_index'] = address_index.get_stats()
+    stats['reference_cache'] = reference_cache.get_stats()
+    stats['surge'] = surge_engine.get_stats()
+    stats['http_client'] = http_client.get_stats()
+    stats['geocoder'] = geocoder_guard.get_stats()
     
     return stats
 
@@ -277,58 +386,3 @@ async def get_recent_orders(limit: int = Query(10, ge=1, le=100)):
     """Получить последние заказы"""
     orders = await Database.get_recent_orders(limit)
     return orders
-
-# === UTILITY FUNCTIONS ===
-
-async def find_driver_for_order(order_id: int):
-    """Алгоритм поиска водителя для заказа"""
-    
-    order = await Database.get_order_by_id(order_id)
-    if not order:
-        return
-    
-    # Обновляем статус заказа на поиск водителя
-    await Database.update_order_status(order_id, 'searching_driver')
-    
-    lat = order.get('pickup_lat') or 55.7558
-    lon = order.get('pickup_lon') or 37.6176
-    
-    start_time = datetime.now()
-    search_radius = settings.DRIVER_SEARCH_RADIUS_KM
-    
-    while (datetime.now() - start_time).seconds < settings.MAX_ORDER_SEARCH_TIME_SEC:
-        # Ищем ближайших водителей
-        drivers = await Database.find_nearby_drivers(lat, lon, search_radius)
-        
-        if drivers:
-            # Отправляем заказ каждому водителю
-            for driver in drivers:
-                driver_id = driver['id']
-                
-                # Отправляем через WebSocket
-                await manager.send_order_to_driver(
-                    order_id=order_id,
-                    driver_id=driver_id,
-                    order_data=order
-                )
-                
-                # Ждем ответа
-                # В реальном проекте нужно реализовать механизм ожидания
-                await asyncio.sleep(settings.DRIVER_RESPONSE_TIMEOUT_SEC)
-                
-                # Проверяем, не принял ли уже кто-то заказ
-                current_order = await Database.get_order_by_id(order_id)
-                if current_order and current_order['status'] != 'searching_driver':
-                    return  # Заказ уже принят
-        
-        # Увеличиваем радиус поиска
-        search_radius = min(search_radius * 1.5, 50)  # Максимум 50 км
-        
-        # Ждем перед следующим кругом поиска
-        await asyncio.sleep(10)
-    
-    # Если не нашли водителя
-    await Database.update_order_status(order_id, 'cancelled')
-    await manager.notify_order_update(order_id, 'cancelled', 0)
-    
-    logger.warning(f"Order {order_id} cancelled - no drivers found")
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""Бенчмарк тика глобального диспетчера: матрица и назначение с дорожным графом и без него.
+
+БД не нужна: граф - синтетическая сетка улиц, заказы и водители разбросаны по ней случайно.
+Замеряется GlobalDispatcher._match, который диспетчер вызывает в отдельном потоке.
+    
+    python benchmarks/dispatch_tick.py --orders 5000 --drivers 20000 --grid 60
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from config import settings
+from dispatch import GlobalDispatcher
+from routing import build_graph, routing_engine
+import geo
+
+# Центр Москвы и шаг сетки улиц
+CENTER_LAT, CENTER_LON = 55.7558, 37.6173
+STEP_KM = 0.2
+
+
+def grid_graph(side: int, seed: int = 42):
+    """Сетка side x side с двусторонними улицами разной скорости"""
+    rng = np.random.default_rng(seed)
+    step_lat = STEP_KM / geo.KM_PER_DEGREE
+    step_lon = step_lat / np.cos(np.radians(CENTER_LAT))
+    
+    ys, xs = np.divmod(np.arange(side * side), side)
+    node_lat = CENTER_LAT + (ys - side / 2) * step_lat
+    node_lon = CENTER_LON + (xs - side / 2) * step_lon
+    
+    edges = []
+    for node in range(side * side):
+        y, x = divmod(node, side)
+        for other in ((node + 1) if x + 1 < side else None, (node + side) if y + 1 < side else None):
+            if other is None:
+                continue
+            speed_kmh = rng.choice([20.0, 40.0, 60.0])
+            seconds = STEP_KM * 1000 / (speed_kmh / 3.6)
+            edges.append((node, other, seconds, STEP_KM * 1000))
+            edges.append((other, node, seconds, STEP_KM * 1000))
+    
+    return node_lat, node_lon, np.array(edges, dtype=np.float64)
+
+
+def points(rng, n: int, node_lat: np.ndarray, node_lon: np.ndarray):
+    lats = rng.uniform(node_lat.min(), node_lat.max(), n)
+    lons = rng.uniform(node_lon.min(), node_lon.max(), n)
+    return lats, lons
+
+
+def timed(orders, drivers, rounds: int):
+    results = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        pairs = GlobalDispatcher._match(orders, drivers, [])
+        results.append((time.perf_counter() - started) * 1000)
+    return min(results), max(results), len(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--drivers', type=int, default=20000)
+    parser.add_argument('--grid', type=int, default=60, help='узлов по стороне сетки')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+    
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    
+    node_lat, node_lon, edges = grid_graph(args.grid)
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'graph.npz')
+        build_graph(node_lat, node_lon, edges, path)
+        routing_engine.load(path)
+    print(f"Graph: {len(node_lat)} nodes, {len(edges)} edges, contracted in {time.perf_counter() - started:.1f}s")
+    
+    rng = np.random.default_rng(7)
+    order_lats, order_lons = points(rng, args.orders, node_lat, node_lon)
+    driver_lats, driver_lons = points(rng, args.drivers, node_lat, node_lon)
+    orders = [
+        {'id': i, 'pickup_lat': lat, 'pickup_lon': lon}
+        for i, (lat, lon) in enumerate(zip(order_lats.tolist(), order_lons.tolist()))
+    ]
+    drivers = [
+        {'id': i, 'lat': lat, 'lon': lon}
+        for i, (lat, lon) in enumerate(zip(driver_lats.tolist(), driver_lons.tolist()))
+    ]
+    
+    print(
+        f"Tick budget {settings.DISPATCH_TICK_BUDGET_MS} ms, routing budget {settings.DISPATCH_ROUTING_BUDGET_MS} ms, "
+        f"top {settings.DISPATCH_ROUTED_CANDIDATES} candidates routed"
+    )
+    
+    routing_engine.ready = False
+    fastest, slowest, assigned = timed(orders, drivers, args.rounds)
+    print(f"straight line  {fastest:8.0f}-{slowest:.0f} ms  {assigned} assigned")
+    
+    routing_engine.ready = True
+    fastest, slowest, assigned = timed(orders, drivers, args.rounds)
+    print(f"road graph     {fastest:8.0f}-{slowest:.0f} ms  {assigned} assigned, routing budget hit {routing_engine.deadline_hits}x")
+
+
+if __name__ == '__main__':
+    main()
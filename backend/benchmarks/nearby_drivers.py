@@ -0,0 +1,154 @@
+"""Бенчмарк поиска ближайших водителей: DISTINCT ON по driver_locations против KNN по driver_positions.
+
+Данные создаются во временных таблицах одного соединения и исчезают после выхода,
+рабочие таблицы не затрагиваются. Нужна БД с PostGIS (DB_* из .env).
+    
+    python benchmarks/nearby_drivers.py --drivers 50000 --queries 500
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import asyncpg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+
+# Центр Москвы и разброс точек вокруг него в градусах
+CENTER_LAT, CENTER_LON = 55.7558, 37.6173
+SPREAD_DEG = 0.3
+
+SEED_SQL = """
+CREATE TEMP TABLE bench_drivers AS
+SELECT g AS id,
+       (random() < 0.6) AS is_online,
+       (random() < 0.95) AS is_verified
+FROM generate_series(1, {drivers}) g;
+
+ALTER TABLE bench_drivers ADD PRIMARY KEY (id);
+
+-- История: points_per_driver точек каждого водителя за последние две минуты
+CREATE TEMP TABLE bench_locations AS
+SELECT d.id AS driver_id,
+       ST_SetSRID(ST_MakePoint(
+           {lon} + ({spread} * (random() * 2 - 1)),
+           {lat} + ({spread} * (random() * 2 - 1))
+       ), 4326) AS location,
+       NOW() - (p * INTERVAL '110 seconds' / {points}) AS recorded_at
+FROM bench_drivers d
+CROSS JOIN generate_series(1, {points}) p;
+
+CREATE INDEX ON bench_locations(driver_id, recorded_at DESC);
+CREATE INDEX ON bench_locations(recorded_at DESC);
+
+CREATE TEMP TABLE bench_positions AS
+SELECT DISTINCT ON (driver_id) driver_id, location::geography AS location, recorded_at
+FROM bench_locations
+ORDER BY driver_id, recorded_at DESC;
+
+ALTER TABLE bench_positions ADD PRIMARY KEY (driver_id);
+CREATE INDEX ON bench_positions USING GIST(location);
+
+ANALYZE bench_drivers;
+ANALYZE bench_locations;
+ANALYZE bench_positions;
+"""
+
+# Прежний вариант функции find_nearby_drivers
+DISTINCT_ON_SQL = """
+SELECT d.id, ST_Distance(p.point::geography, dl.location::geography) AS distance_meters
+FROM (SELECT ST_SetSRID(ST_MakePoint($2, $1), 4326) AS point) p
+CROSS JOIN bench_drivers d
+JOIN (
+    SELECT DISTINCT ON (driver_id) driver_id, location
+    FROM bench_locations
+    WHERE recorded_at > NOW() - INTERVAL '2 minutes'
+    ORDER BY driver_id, recorded_at DESC
+) dl ON dl.driver_id = d.id
+WHERE d.is_online AND d.is_verified
+  AND ST_DWithin(p.point::geography, dl.location::geography, $3 * 1000)
+ORDER BY distance_meters
+LIMIT $4
+"""
+
+KNN_SQL = """
+SELECT d.id, ST_Distance(dp.location, ST_SetSRID(ST_MakePoint($2, $1), 4326)::geography) AS distance_meters
+FROM bench_positions dp
+JOIN bench_drivers d ON d.id = dp.driver_id
+WHERE d.is_online AND d.is_verified
+  AND dp.recorded_at > NOW() - INTERVAL '2 minutes'
+  AND ST_DWithin(dp.location, ST_SetSRID(ST_MakePoint($2, $1), 4326)::geography, $3 * 1000)
+ORDER BY dp.location <-> ST_SetSRID(ST_MakePoint($2, $1), 4326)::geography
+LIMIT $4
+"""
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def measure(conn, sql, points, radius_km, limit):
+    """Время каждого запроса в мс"""
+    statement = await conn.prepare(sql)
+    
+    # Прогрев планов и кэша
+    for lat, lon in points[:5]:
+        await statement.fetch(lat, lon, radius_km, limit)
+    
+    timings = []
+    for lat, lon in points:
+        started = time.perf_counter()
+        await statement.fetch(lat, lon, radius_km, limit)
+        timings.append((time.perf_counter() - started) * 1000)
+    
+    return timings
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--drivers', type=int, default=50000)
+    parser.add_argument('--points-per-driver', type=int, default=12)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--radius-km', type=int, default=5)
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+    
+    random.seed(42)
+    points = [
+        (CENTER_LAT + random.uniform(-SPREAD_DEG, SPREAD_DEG), CENTER_LON + random.uniform(-SPREAD_DEG, SPREAD_DEG))
+        for _ in range(args.queries)
+    ]
+    
+    conn = await asyncpg.connect(settings.database_url)
+    try:
+        started = time.perf_counter()
+        await conn.execute("SELECT setseed(0.42)")
+        await conn.execute(SEED_SQL.format(
+            drivers=args.drivers,
+            points=args.points_per_driver,
+            lat=CENTER_LAT,
+            lon=CENTER_LON,
+            spread=SPREAD_DEG
+        ))
+        
+        rows = await conn.fetchval("SELECT count(*) FROM bench_locations")
+        print(f"Seeded {args.drivers} drivers, {rows} location rows in {time.perf_counter() - started:.1f}s")
+        
+        for name, sql in (('DISTINCT ON driver_locations', DISTINCT_ON_SQL), ('KNN driver_positions', KNN_SQL)):
+            timings = await measure(conn, sql, points, args.radius_km, args.limit)
+            print(
+                f"{name:<30} p50={percentile(timings, 0.5):8.2f}ms "
+                f"p95={percentile(timings, 0.95):8.2f}ms "
+                f"p99={percentile(timings, 0.99):8.2f}ms"
+            )
+    finally:
+        await conn.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,159 @@
+"""Бенчмарк surge-движка: повтор синтетического потока событий (координаты, статусы, заказы).
+
+БД не нужна: поток генерируется заранее и проигрывается через SurgeEngine,
+отдельно замеряется стоимость события каждого типа и пересчета коэффициентов.
+    
+    python benchmarks/surge_replay.py --drivers 20000 --events 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from surge import SurgeEngine
+
+# Центр Москвы и разброс точек вокруг него в градусах
+CENTER_LAT, CENTER_LON = 55.7558, 37.6173
+SPREAD_DEG = 0.3
+
+# Доли событий в потоке: в основном координаты водителей. Заказов открывается больше,
+# чем закрывается, - спрос растет, как в час пик
+MIX = (('driver_update', 0.9), ('order_opened', 0.041), ('order_closed', 0.039), ('driver_status', 0.02))
+
+# Радиус точки притяжения спроса (вокзал, аэропорт, стадион) в градусах, около 300 м
+HOTSPOT_SPREAD_DEG = 0.003
+
+
+def generate(drivers: int, events: int, hotspots: int = 3, hotspot_share: float = 0.3, seed: int = 42):
+    """Поток событий (тип, аргументы) - как их получает движок.
+    
+    Доля hotspot_share заказов приходится на hotspots точек притяжения: без них спрос
+    размазан по городу и ни одна клетка не получает повышения.
+    """
+    rng = random.Random(seed)
+    centers = [
+        (CENTER_LAT + rng.uniform(-SPREAD_DEG / 2, SPREAD_DEG / 2), CENTER_LON + rng.uniform(-SPREAD_DEG / 2, SPREAD_DEG / 2))
+        for _ in range(hotspots)
+    ]
+    positions = [
+        [CENTER_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG), CENTER_LON + rng.uniform(-SPREAD_DEG, SPREAD_DEG)]
+        for _ in range(drivers)
+    ]
+    available = [rng.random() < 0.6 for _ in range(drivers)]
+    kinds = [kind for kind, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    
+    open_orders = []
+    next_order_id = 1
+    stream = []
+    
+    for kind in rng.choices(kinds, weights, k=events):
+        if kind == 'order_closed' and not open_orders:
+            kind = 'order_opened'
+        
+        if kind == 'driver_update':
+            driver_id = rng.randrange(drivers)
+            position = positions[driver_id]
+            # Примерно 10 м между точками
+            position[0] += rng.uniform(-1e-4, 1e-4)
+            position[1] += rng.uniform(-1e-4, 1e-4)
+            stream.append((kind, (driver_id, position[0], position[1], available[driver_id])))
+        elif kind == 'driver_status':
+            driver_id = rng.randrange(drivers)
+            available[driver_id] = not available[driver_id]
+            position = positions[driver_id]
+            stream.append(('driver_update', (driver_id, position[0], position[1], available[driver_id])))
+        elif kind == 'order_opened':
+            if centers and rng.random() < hotspot_share:
+                center_lat, center_lon = rng.choice(centers)
+                lat = center_lat + rng.gauss(0, HOTSPOT_SPREAD_DEG)
+                lon = center_lon + rng.gauss(0, HOTSPOT_SPREAD_DEG)
+            else:
+                # Остальной спрос сосредоточен у центра
+                lat = CENTER_LAT + rng.gauss(0, SPREAD_DEG / 4)
+                lon = CENTER_LON + rng.gauss(0, SPREAD_DEG / 4)
+            stream.append((kind, (next_order_id, lat, lon)))
+            open_orders.append(next_order_id)
+            next_order_id += 1
+        else:
+            index = rng.randrange(len(open_orders))
+            open_orders[index], open_orders[-1] = open_orders[-1], open_orders[index]
+            stream.append((kind, (open_orders.pop(),)))
+    
+    return stream
+
+
+def replay(engine: SurgeEngine, stream, tick_every: int):
+    """Время событий по типам (нс) и пересчетов (мс)"""
+    handlers = {
+        'driver_update': engine.driver_update,
+        'order_opened': engine.order_opened,
+        'order_closed': engine.order_closed
+    }
+    timings = {kind: [0, 0] for kind in handlers}
+    ticks = []
+    
+    for i, (kind, args) in enumerate(stream, 1):
+        started = time.perf_counter_ns()
+        handlers[kind](*args)
+        elapsed = time.perf_counter_ns() - started
+        
+        timing = timings[kind]
+        timing[0] += 1
+        timing[1] += elapsed
+        
+        if i % tick_every == 0:
+            started = time.perf_counter()
+            engine.recompute()
+            ticks.append((time.perf_counter() - started) * 1000)
+    
+    return timings, ticks
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--drivers', type=int, default=20000)
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--tick-every', type=int, default=20000, help='пересчет через каждые N событий')
+    parser.add_argument('--cell-km', type=float, default=1.0)
+    parser.add_argument('--hotspots', type=int, default=3, help='точек притяжения спроса')
+    parser.add_argument('--hotspot-share', type=float, default=0.3, help='доля заказов в точках притяжения')
+    args = parser.parse_args()
+    
+    started = time.perf_counter()
+    stream = generate(args.drivers, args.events, args.hotspots, args.hotspot_share)
+    print(f"Generated {len(stream)} events for {args.drivers} drivers in {time.perf_counter() - started:.1f}s")
+    
+    engine = SurgeEngine(cell_km=args.cell_km)
+    started = time.perf_counter()
+    timings, ticks = replay(engine, stream, args.tick_every)
+    total = time.perf_counter() - started
+    
+    print(f"Replayed in {total:.2f}s ({len(stream) / total:,.0f} events/s including timing overhead)")
+    for kind, (count, elapsed_ns) in timings.items():
+        if count:
+            print(f"{kind:<15} {count:>9} events  {elapsed_ns / count:8.0f} ns/event")
+    
+    if ticks:
+        print(
+            f"{'recompute':<15} {len(ticks):>9} ticks   "
+            f"p50={percentile(ticks, 0.5):.2f}ms p99={percentile(ticks, 0.99):.2f}ms"
+        )
+    
+    stats = engine.get_stats()
+    print(
+        f"Final state: {stats['open_orders']} open orders, {stats['idle_drivers']} idle drivers, "
+        f"{stats['surge_cells']} surge cells, max x{stats['max_multiplier']}"
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Бенчмарк рассылки по WebSocket: постановка в очереди и доставка на 20k соединений.
+
+БД и сеть не нужны: соединения - заглушки с задержкой send_text, часть из них медленные.
+Сравнивается прежний последовательный цикл await send_json и очереди ConnectionManager.
+    
+    python benchmarks/ws_broadcast.py --connections 20000 --slow 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from websocket_manager import ConnectionManager, encode
+
+
+class FakeWebSocket:
+    """Заглушка соединения: время отправки кадра и время получения каждого кадра"""
+    
+    # Кадры, полученные быстрыми соединениями, - чтобы не обходить 20k заглушек в ожидании доставки
+    delivered = 0
+    
+    def __init__(self, delay_sec: float):
+        self.delay_sec = delay_sec
+        self.received = []
+        self.closed_code = None
+    
+    async def accept(self):
+        pass
+    
+    async def send_text(self, text: str):
+        if self.delay_sec:
+            await asyncio.sleep(self.delay_sec)
+        else:
+            # Отдаем управление, как при записи в сокет
+            await asyncio.sleep(0)
+        self.received.append(time.perf_counter())
+        if not self.delay_sec:
+            FakeWebSocket.delivered += 1
+    
+    async def send_json(self, data: dict):
+        await self.send_text(encode(data))
+    
+    async def close(self, code: int = 1000):
+        self.closed_code = code
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def serial_broadcast(sockets, message: dict):
+    """Прежняя рассылка: await send_json каждому по очереди"""
+    for websocket in sockets:
+        await websocket.send_json(message)
+
+
+async def run(args):
+    sockets = [
+        FakeWebSocket(args.slow_delay if i < args.slow else 0.0)
+        for i in range(args.connections)
+    ]
+    fast = sockets[args.slow:]
+    message = {"type": "new_order_available", "order_id": 1, "pickup": "ул. Тверская, 1", "price": 450.0}
+    
+    # Прежний последовательный цикл: медленные соединения задерживают всех следующих
+    if args.serial:
+        started = time.perf_counter()
+        await serial_broadcast(sockets, message)
+        elapsed = time.perf_counter() - started
+        latencies = [(w.received[-1] - started) * 1000 for w in fast]
+        print(
+            f"serial loop     total {elapsed * 1000:9.1f}ms  "
+            f"fast p50={percentile(latencies, 0.5):.1f}ms p99={percentile(latencies, 0.99):.1f}ms"
+        )
+        for websocket in sockets:
+            websocket.received.clear()
+    
+    manager = ConnectionManager(
+        max_queue=args.queue_size,
+        overflow_policy=args.policy,
+        send_timeout_sec=args.send_timeout
+    )
+    for driver_id, websocket in enumerate(sockets):
+        await manager.connect(websocket, driver_id, 'drivers')
+    
+    # Даем отправить приветствия
+    await asyncio.sleep(args.slow_delay * 2)
+    for websocket in sockets:
+        websocket.received.clear()
+    
+    enqueue_ms = []
+    latencies = []
+    for _ in range(args.rounds):
+        FakeWebSocket.delivered = 0
+        started = time.perf_counter()
+        await manager.broadcast_to_drivers(message)
+        enqueue_ms.append((time.perf_counter() - started) * 1000)
+        
+        # Ждем доставки всем быстрым соединениям (медленные свое не успевают)
+        while FakeWebSocket.delivered < len(fast):
+            await asyncio.sleep(0.001)
+        
+        latencies.extend((w.received[0] - started) * 1000 for w in fast)
+        for websocket in fast:
+            websocket.received.clear()
+    
+    print(
+        f"queued broadcast enqueue p50={percentile(enqueue_ms, 0.5):.1f}ms p99={percentile(enqueue_ms, 0.99):.1f}ms  "
+        f"fast delivery p50={percentile(latencies, 0.5):.1f}ms p99={percentile(latencies, 0.99):.1f}ms"
+    )
+    
+    stats = manager.get_stats()
+    print(
+        f"after {args.rounds} rounds: {stats['queued']} queued (max {stats['max_queued']} per connection), "
+        f"{stats['dropped']} dropped, {stats['coalesced']} coalesced, {stats['evicted']} evicted"
+    )
+    
+    for user_key in list(manager.active_connections['drivers']):
+        manager.disconnect(int(user_key.split(':')[1]), 'drivers')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=20000)
+    parser.add_argument('--slow', type=int, default=200, help='медленных соединений')
+    parser.add_argument('--slow-delay', type=float, default=0.05, help='время отправки кадра медленному, с')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--queue-size', type=int, default=256)
+    parser.add_argument('--policy', default='coalesce', choices=('drop_oldest', 'coalesce', 'disconnect'))
+    parser.add_argument('--send-timeout', type=float, default=5.0)
+    parser.add_argument('--no-serial', dest='serial', action='store_false', help='без замера прежнего цикла')
+    args = parser.parse_args()
+    
+    # Подключения и отключения 20k соединений в логе не нужны
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -18,6 +18,135 @@ class Settings:
         self.DB_PASSWORD = os.getenv("DB_PASSWORD", "StrongPass123!")
         self.REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
         self.REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+        self.REDIS_DB = int(os.getenv("REDIS_DB", "0"))
+        self.REDIS_PASSWORD = os.getenv("REDIS_PASSWORD") or None
+        self.YANDEX_GEOCODER_API_KEY = os.getenv("YANDEX_GEOCODER_API_KEY", "")
+        
+        # Поиск водителей
+        self.DRIVER_SEARCH_RADIUS_KM = float(os.getenv("DRIVER_SEARCH_RADIUS_KM", "5"))
+        self.DRIVER_RESPONSE_TIMEOUT_SEC = int(os.getenv("DRIVER_RESPONSE_TIMEOUT_SEC", "30"))
+        self.MAX_ORDER_SEARCH_TIME_SEC = int(os.getenv("MAX_ORDER_SEARCH_TIME_SEC", "120"))
+        # Пакетная запись координат водителей
+        self.LOCATION_INGEST_MAX_QUEUE = int(os.getenv("LOCATION_INGEST_MAX_QUEUE", "50000"))
+        self.LOCATION_INGEST_FLUSH_MS = int(os.getenv("LOCATION_INGEST_FLUSH_MS", "250"))
+        self.LOCATION_INGEST_MAX_BATCH = int(os.getenv("LOCATION_INGEST_MAX_BATCH", "10000"))
+        self.LOCATION_INGEST_PUT_TIMEOUT_SEC = float(os.getenv("LOCATION_INGEST_PUT_TIMEOUT_SEC", "1"))
+        
+        # История координат: секции по дням, хранение и прореживание
+        self.LOCATION_PARTITIONS_AHEAD_DAYS = int(os.getenv("LOCATION_PARTITIONS_AHEAD_DAYS", "3"))
+        self.LOCATION_RETENTION_DAYS = int(os.getenv("LOCATION_RETENTION_DAYS", "90"))
+        self.LOCATION_DOWNSAMPLE_AFTER_DAYS = int(os.getenv("LOCATION_DOWNSAMPLE_AFTER_DAYS", "7"))
+        self.LOCATION_MAINTENANCE_INTERVAL_SEC = int(os.getenv("LOCATION_MAINTENANCE_INTERVAL_SEC", "3600"))
+        
+        # Отсев лишних GPS-точек по статусу водителя: "мин_расстояние_м:макс_смена_курса:heartbeat_сек"
+        self.LOCATION_FILTER_ONLINE = os.getenv("LOCATION_FILTER_ONLINE", "30:30:30")
+        self.LOCATION_FILTER_BUSY = os.getenv("LOCATION_FILTER_BUSY", "15:20:10")
+        self.LOCATION_FILTER_DEFAULT = os.getenv("LOCATION_FILTER_DEFAULT", "100:45:60")
+        
+        # Индекс координат водителей в памяти
+        self.DRIVER_INDEX_CELL_KM = float(os.getenv("DRIVER_INDEX_CELL_KM", "1"))
+        self.DRIVER_POSITION_STALE_SEC = int(os.getenv("DRIVER_POSITION_STALE_SEC", "120"))
+        self.DRIVER_INDEX_REFRESH_SEC = int(os.getenv("DRIVER_INDEX_REFRESH_SEC", "30"))
+        
+        # sequential - по одному водителю, batch - сразу нескольким (кто первый принял),
+        # global - общее назначение всех заказов на каждом тике диспетчера
+        self.DISPATCH_MODE = os.getenv("DISPATCH_MODE", "sequential")
+        self.DISPATCH_BATCH_SIZE = int(os.getenv("DISPATCH_BATCH_SIZE", "5"))
+        self.DISPATCH_TICK_MS = int(os.getenv("DISPATCH_TICK_MS", "500"))
+        self.DISPATCH_TICK_BUDGET_MS = int(os.getenv("DISPATCH_TICK_BUDGET_MS", "400"))
+        self.DISPATCH_MAX_ORDERS_PER_TICK = int(os.getenv("DISPATCH_MAX_ORDERS_PER_TICK", "5000"))
+        self.DISPATCH_CANDIDATES_PER_ORDER = int(os.getenv("DISPATCH_CANDIDATES_PER_ORDER", "8"))
+        # Глобальный режим с дорожным графом: по дорогам пересчитываются только лучшие по прямой
+        # кандидаты каждого заказа и только в пределах бюджета времени, остальные - оценка по прямой
+        self.DISPATCH_ROUTED_CANDIDATES = int(os.getenv("DISPATCH_ROUTED_CANDIDATES", "3"))
+        self.DISPATCH_ROUTING_BUDGET_MS = int(os.getenv("DISPATCH_ROUTING_BUDGET_MS", "100"))
+        self.PICKUP_SPEED_KMH = float(os.getenv("PICKUP_SPEED_KMH", "25"))
+        
+        # Маршрутизация по дорожному графу (пустой путь - расчет по прямой)
+        self.ROUTING_GRAPH_PATH = os.getenv("ROUTING_GRAPH_PATH", "")
+        self.ROUTING_MAX_SNAP_KM = float(os.getenv("ROUTING_MAX_SNAP_KM", "1.0"))
+        
+        # Кэш маршрутов (ROUTE_CACHE_REDIS=true - общий кэш в Redis для всех процессов и бота)
+        self.ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", "50000"))
+        self.ROUTE_CACHE_TTL_SEC = int(os.getenv("ROUTE_CACHE_TTL_SEC", "1800"))
+        self.ROUTE_CACHE_PRECISION = int(os.getenv("ROUTE_CACHE_PRECISION", "7"))
+        self.ROUTE_CACHE_BUCKET_MIN = int(os.getenv("ROUTE_CACHE_BUCKET_MIN", "15"))
+        self.ROUTE_CACHE_REDIS = os.getenv("ROUTE_CACHE_REDIS", "false").lower() == "true"
+        # Маршруты по дорогам считает backend и публикует их в общий кэш
+        self.ROUTE_CACHE_PUBLISH = os.getenv("ROUTE_CACHE_PUBLISH", "true").lower() == "true"
+        
+        # Профиль скоростей по истории координат (python speed_profile.py build)
+        self.SPEED_PROFILE_PATH = os.getenv("SPEED_PROFILE_PATH", "data/speed_profile")
+        self.SPEED_PROFILE_DAYS = int(os.getenv("SPEED_PROFILE_DAYS", "28"))
+        self.SPEED_PROFILE_CELL_KM = float(os.getenv("SPEED_PROFILE_CELL_KM", "1.0"))
+        self.SPEED_PROFILE_SLOT_MIN = int(os.getenv("SPEED_PROFILE_SLOT_MIN", "15"))
+        # Предел размера сетки (клеток): 250000 - около 190 МБ при 15-минутных интервалах
+        self.SPEED_PROFILE_MAX_CELLS = int(os.getenv("SPEED_PROFILE_MAX_CELLS", "250000"))
+        self.TIMEZONE = os.getenv("TIMEZONE", "Europe/Moscow")
+        
+        # Кэш геокодирования (память + SQLite на диске)
+        self.GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", "data/geocode_cache.sqlite3")
+        self.GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "20000"))
+        self.GEOCODE_CACHE_TTL_SEC = int(os.getenv("GEOCODE_CACHE_TTL_SEC", str(30 * 24 * 3600)))
+        self.GEOCODE_CACHE_NEGATIVE_TTL_SEC = int(os.getenv("GEOCODE_CACHE_NEGATIVE_TTL_SEC", "3600"))
+        self.GEOCODE_CACHE_WARM_LIMIT = int(os.getenv("GEOCODE_CACHE_WARM_LIMIT", "50000"))
+        
+        # Общий HTTP-клиент для внешних API (пул соединений, кэш DNS, ограничение параллельности)
+        self.HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "100"))
+        self.HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", "20"))
+        self.HTTP_DNS_TTL_SEC = int(os.getenv("HTTP_DNS_TTL_SEC", "300"))
+        self.HTTP_KEEPALIVE_SEC = float(os.getenv("HTTP_KEEPALIVE_SEC", "30"))
+        self.HTTP_TIMEOUT_SEC = float(os.getenv("HTTP_TIMEOUT_SEC", "5"))
+        self.HTTP_MAX_CONCURRENCY = int(os.getenv("HTTP_MAX_CONCURRENCY", "20"))
+        
+        # Геокодер: общий срок вызова, повторный запрос после p95 задержки, предохранитель
+        self.GEOCODER_DEADLINE_SEC = float(os.getenv("GEOCODER_DEADLINE_SEC", "2.0"))
+        self.GEOCODER_MAX_HEDGES = int(os.getenv("GEOCODER_MAX_HEDGES", "1"))
+        self.GEOCODER_HEDGE_MIN_DELAY_SEC = float(os.getenv("GEOCODER_HEDGE_MIN_DELAY_SEC", "0.1"))
+        self.GEOCODER_BREAKER_FAILURES = int(os.getenv("GEOCODER_BREAKER_FAILURES", "5"))
+        self.GEOCODER_BREAKER_RESET_SEC = float(os.getenv("GEOCODER_BREAKER_RESET_SEC", "30"))
+        
+        # Локальный обратный геокодер по известным адресам (ADDRESS_INDEX_DUMP_PATH - CSV address,lat,lon)
+        self.ADDRESS_INDEX_RADIUS_M = float(os.getenv("ADDRESS_INDEX_RADIUS_M", "50"))
+        self.ADDRESS_INDEX_REFRESH_SEC = int(os.getenv("ADDRESS_INDEX_REFRESH_SEC", "60"))
+        self.ADDRESS_INDEX_REFRESH_OVERLAP_SEC = int(os.getenv("ADDRESS_INDEX_REFRESH_OVERLAP_SEC", "300"))
+        self.ADDRESS_INDEX_LIMIT = int(os.getenv("ADDRESS_INDEX_LIMIT", "200000"))
+        self.ADDRESS_INDEX_DUMP_PATH = os.getenv("ADDRESS_INDEX_DUMP_PATH", "")
+        
+        # Кэш тарифов и настроек (сбрасывается по NOTIFY, полная перезагрузка - страховка)
+        self.REFERENCE_CACHE_REFRESH_SEC = int(os.getenv("REFERENCE_CACHE_REFRESH_SEC", "300"))
+        
+        # Повышающий коэффициент по спросу и предложению (пересчет раз в SURGE_TICK_SEC)
+        self.SURGE_CELL_KM = float(os.getenv("SURGE_CELL_KM", "1.0"))
+        self.SURGE_TICK_SEC = float(os.getenv("SURGE_TICK_SEC", "10"))
+        self.SURGE_ALPHA = float(os.getenv("SURGE_ALPHA", "0.3"))
+        self.SURGE_SENSITIVITY = float(os.getenv("SURGE_SENSITIVITY", "0.5"))
+        self.SURGE_MAX_MULTIPLIER = float(os.getenv("SURGE_MAX_MULTIPLIER", "3.0"))
+        self.SURGE_MIN_ORDERS = int(os.getenv("SURGE_MIN_ORDERS", "2"))
+        self.SURGE_ORDER_TTL_SEC = int(os.getenv("SURGE_ORDER_TTL_SEC", "900"))
+        self.SURGE_RESYNC_SEC = int(os.getenv("SURGE_RESYNC_SEC", "60"))
+        # Публикация коэффициентов в Redis для бота (без нее заказы бота идут без surge)
+        self.SURGE_REDIS = os.getenv("SURGE_REDIS", "false").lower() == "true"
+        
+        # Очередь отправки на каждое WebSocket соединение (переполнение: drop_oldest, coalesce, disconnect)
+        self.WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+        self.WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "coalesce")
+        self.WS_SEND_TIMEOUT_SEC = float(os.getenv("WS_SEND_TIMEOUT_SEC", "5"))
+        
+        # Шина WebSocket-сообщений между воркерами: memory - один процесс, postgres (LISTEN/NOTIFY) или redis
+        self.WS_BUS = os.getenv("WS_BUS", "memory")
+        self.WS_BUS_CHANNEL = os.getenv("WS_BUS_CHANNEL", "ws_fanout")
+        # Снимки активных заказов для разностных уведомлений
+        self.WS_ORDER_SNAPSHOT_LIMIT = int(os.getenv("WS_ORDER_SNAPSHOT_LIMIT", "10000"))
+        
+        # Координаты водителя пассажиру во время поездки (не чаще раза в LIVE_TRACKING_INTERVAL_SEC)
+        self.LIVE_TRACKING_INTERVAL_SEC = float(os.getenv("LIVE_TRACKING_INTERVAL_SEC", "2"))
+        
+        # Очередь задач поиска в БД (режимы sequential и batch)
+        self.DISPATCH_QUEUE_CONCURRENCY = int(os.getenv("DISPATCH_QUEUE_CONCURRENCY", "200"))
+        self.DISPATCH_QUEUE_POLL_SEC = float(os.getenv("DISPATCH_QUEUE_POLL_SEC", "1"))
+        self.DISPATCH_LEASE_SEC = int(os.getenv("DISPATCH_LEASE_SEC", "30"))
+        self.DISPATCH_MAX_ATTEMPTS = int(os.getenv("DISPATCH_MAX_ATTEMPTS", "5"))
     
     @property
     def database_url(self):
@@ -7,6 +7,14 @@ from contextlib import asynccontextmanager
 
 from config import settings
 
+# Ключ advisory lock для обслуживания секций driver_locations
+DRIVER_LOCATIONS_MAINTENANCE_LOCK_KEY = 7_300_002
+
+# Заглушки бота вместо геокодирования (bot/handlers.py): подпись геопозиции и тестовые координаты.
+# Такие адреса не годятся для прогрева геокодера
+PLACEHOLDER_ADDRESSES = ['Текущее местоположение']
+PLACEHOLDER_POINTS = [(55.7558, 37.6176), (55.7602, 37.6185)]
+
 class Database:
     """Класс для работы с базой данных"""
     
@@ -97,6 +105,10 @@ class Database:
         async with cls.get_connection() as conn:
             order = await conn.fetchrow("""
                 SELECT o.*, 
+                       ST_Y(o.pickup_location) as pickup_lat,
+                       ST_X(o.pickup_location) as pickup_lon,
+                       ST_Y(o.destination_location) as destination_lat,
+                       ST_X(o.destination_location) as destination_lon,
                        u.first_name as passenger_name,
                        u.phone as passenger_phone,
                        d.car_model as driver_car,
@@ -110,6 +122,12 @@ class Database:
             """, order_id)
             return dict(order) if order else None
     
+    @classmethod
+    async def get_order_status(cls, order_id: int) -> Optional[str]:
+        """Текущий статус заказа (None - заказ не найден)"""
+        async with cls.get_connection() as conn:
+            return await conn.fetchval("SELECT status FROM orders WHERE id = $1", order_id)
+    
     @classmethod
     async def find_nearby_drivers(
         cls,
@@ -118,34 +136,87 @@ class Database:
         radius_km: int = 5,
         limit: int = 10
     ) -> List[Dict[str, Any]]:
-        """Поиск ближайших водителей"""
+        """Поиск ближайших водителей (id, lat, lon, distance_meters - как у индекса в памяти)"""
+        async with cls.get_connection() as conn:
+            # KNN по GiST-индексу driver_positions: кандидаты читаются в порядке удаления,
+            # фильтры по статусу отсеивают занятых без сортировки всей выборки
+            drivers = await conn.fetch("""
+                SELECT d.id,
+                       ST_Y(dp.location::geometry) as lat,
+                       ST_X(dp.location::geometry) as lon,
+                       round(ST_Distance(dp.location, ST_SetSRID(ST_MakePoint($2, $1), 4326)::geography)::numeric, 1)::float8
+                           as distance_meters
+                FROM driver_positions dp
+                JOIN drivers d ON d.id = dp.driver_id
+                WHERE d.status = 'online'
+                  AND d.is_verified = true
+                  AND dp.recorded_at > CURRENT_TIMESTAMP - make_interval(secs => $5)
+                  AND ST_DWithin(dp.location, ST_SetSRID(ST_MakePoint($2, $1), 4326)::geography, $3 * 1000)
+                ORDER BY dp.location <-> ST_SetSRID(ST_MakePoint($2, $1), 4326)::geography
+                LIMIT $4
+            """, lat, lon, radius_km, limit, settings.DRIVER_POSITION_STALE_SEC)
+            
+            return [dict(driver) for driver in drivers]
+    
+    @classmethod
+    async def get_drivers_by_ids(cls, driver_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Профили водителей с именем и рейтингом: id -> водитель"""
         async with cls.get_connection() as conn:
             drivers = await conn.fetch("""
-                SELECT d.*, u.first_name, u.rating,
-                       ST_Distance(
-                           ST_SetSRID(ST_MakePoint($2, $1), 4326)::geography,
-                           dl.location::geography
-                       ) as distance_meters
+                SELECT d.*, u.first_name, u.rating
                 FROM drivers d
                 JOIN users u ON d.user_id = u.id
-                LEFT JOIN LATERAL (
-                    SELECT location
-                    FROM driver_locations
-                    WHERE driver_id = d.id
-                    ORDER BY recorded_at DESC
-                    LIMIT 1
-                ) dl ON true
+                WHERE d.id = ANY($1::int[])
+            """, driver_ids)
+            
+            return {driver['id']: dict(driver) for driver in drivers}
+    
+    @classmethod
+    async def get_searching_orders(cls, limit: int = 5000) -> List[Dict[str, Any]]:
+        """Заказы в поиске водителя (самые старые первыми)"""
+        async with cls.get_connection() as conn:
+            orders = await conn.fetch("""
+                SELECT o.*,
+                       ST_Y(o.pickup_location) as pickup_lat,
+                       ST_X(o.pickup_location) as pickup_lon,
+                       EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - o.created_at) as waiting_sec
+                FROM orders o
+                WHERE o.status = 'searching_driver'
+                  AND o.pickup_location IS NOT NULL
+                ORDER BY o.created_at
+                LIMIT $1
+            """, limit)
+            
+            return [dict(order) for order in orders]
+    
+    @classmethod
+    async def get_idle_drivers(cls) -> List[Dict[str, Any]]:
+        """Свободные проверенные водители на линии с текущими координатами"""
+        async with cls.get_connection() as conn:
+            drivers = await conn.fetch("""
+                SELECT d.id,
+                       ST_Y(dp.location::geometry) as lat,
+                       ST_X(dp.location::geometry) as lon
+                FROM drivers d
+                JOIN driver_positions dp ON dp.driver_id = d.id
                 WHERE d.status = 'online'
                   AND d.is_verified = true
-                  AND dl.location IS NOT NULL
-                  AND ST_DWithin(
-                        ST_SetSRID(ST_MakePoint($2, $1), 4326)::geography,
-                        dl.location::geography,
-                        $3 * 1000
-                      )
-                ORDER BY distance_meters
-                LIMIT $4
-            """, lat, lon, radius_km, limit)
+            """)
+            
+            return [dict(driver) for driver in drivers]
+    
+    @classmethod
+    async def get_driver_index_snapshot(cls) -> List[Dict[str, Any]]:
+        """Статусы и последние координаты водителей для индекса в памяти"""
+        async with cls.get_connection() as conn:
+            drivers = await conn.fetch("""
+                SELECT d.id, d.status, d.is_verified,
+                       ST_Y(dp.location::geometry) as lat,
+                       ST_X(dp.location::geometry) as lon,
+                       dp.recorded_at as updated_at
+                FROM drivers d
+                LEFT JOIN driver_positions dp ON dp.driver_id = d.id
+            """)
             
             return [dict(driver) for driver in drivers]
     
@@ -154,44 +225,49 @@ class Database:
         cls,
         order_id: int,
         driver_id: int
-    ) -> bool:
-        """Назначить водителя на заказ"""
+    ) -> Optional[Dict[str, Any]]:
+        """Назначить водителя на заказ (измененные поля или None, если заказ уже не ждет водителя)"""
         async with cls.get_connection() as conn:
             try:
-                result = await conn.execute("""
+                order = await conn.fetchrow("""
                     UPDATE orders 
                     SET driver_id = $1, 
                         status = 'driver_assigned',
                         accepted_at = CURRENT_TIMESTAMP,
                         updated_at = CURRENT_TIMESTAMP
                     WHERE id = $2 AND status = 'searching_driver'
+                    RETURNING id, passenger_id, driver_id, status, accepted_at, updated_at
                 """, driver_id, order_id)
-                return "UPDATE 1" in result
+                return dict(order) if order else None
             except Exception as e:
                 logger.error(f"Error assigning driver: {e}")
-                return False
+                return None
     
     @classmethod
     async def update_order_status(
         cls,
         order_id: int,
         status: str,
-        driver_id: Optional[int] = None
-    ) -> bool:
-        """Обновить статус заказа"""
+        driver_id: Optional[int] = None,
+        expected_status: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Обновить статус заказа (измененные поля или None, если заказ не найден
+        или его статус уже не expected_status)"""
         async with cls.get_connection() as conn:
             try:
                 query = "UPDATE orders SET status = $1, updated_at = CURRENT_TIMESTAMP"
                 params = [status]
+                returning = ["id", "passenger_id", "driver_id", "status", "updated_at"]
                 
-                if status == 'driver_arrived':
-                    query += ", arrived_at = CURRENT_TIMESTAMP"
-                elif status == 'in_progress':
-                    query += ", started_at = CURRENT_TIMESTAMP"
-                elif status == 'completed':
-                    query += ", completed_at = CURRENT_TIMESTAMP"
-                elif status == 'cancelled':
-                    query += ", cancelled_at = CURRENT_TIMESTAMP"
+                timestamp = {
+                    'driver_arrived': 'arrived_at',
+                    'in_progress': 'started_at',
+                    'completed': 'completed_at',
+                    'cancelled': 'cancelled_at'
+                }.get(status)
+                if timestamp:
+                    query += f", {timestamp} = CURRENT_TIMESTAMP"
+                    returning.append(timestamp)
                 
                 if driver_id:
                     query += ", driver_id = $2"
@@ -200,45 +276,278 @@ class Database:
                 query += " WHERE id = $" + str(len(params) + 1)
                 params.append(order_id)
                 
-                result = await conn.execute(query, *params)
-                return "UPDATE 1" in result
+                if expected_status:
+                    query += " AND status = $" + str(len(params) + 1)
+                    params.append(expected_status)
+                
+                query += " RETURNING " + ", ".join(returning)
+                
+                order = await conn.fetchrow(query, *params)
+                return dict(order) if order else None
             except Exception as e:
                 logger.error(f"Error updating order status: {e}")
+                return None
+    
+    @classmethod
+    async def get_open_order_points(cls) -> List[Dict[str, Any]]:
+        """Точки подачи заказов, ожидающих водителя (для расчета спроса)"""
+        async with cls.get_connection() as conn:
+            rows = await conn.fetch("""
+                SELECT id, ST_Y(pickup_location) as lat, ST_X(pickup_location) as lon, created_at
+                FROM orders
+                WHERE status IN ('created', 'searching_driver') AND pickup_location IS NOT NULL
+            """)
+            return [dict(row) for row in rows]
+    
+    @classmethod
+    async def get_active_trips(cls) -> List[Dict[str, Any]]:
+        """Заказы с назначенным водителем, которые еще не завершены (для живого трекинга)"""
+        async with cls.get_connection() as conn:
+            rows = await conn.fetch("""
+                SELECT id, passenger_id, driver_id, status
+                FROM orders
+                WHERE status IN ('driver_assigned', 'driver_arrived', 'in_progress') AND driver_id IS NOT NULL
+            """)
+            return [dict(row) for row in rows]
+    
+    @classmethod
+    async def get_active_order_ids(cls, user_type: str, user_id: int) -> List[int]:
+        """Незавершенные заказы пассажира или водителя (user_type - 'passengers' или 'drivers')"""
+        column = {'passengers': 'passenger_id', 'drivers': 'driver_id'}.get(user_type)
+        if column is None:
+            return []
+        
+        async with cls.get_connection() as conn:
+            rows = await conn.fetch(f"""
+                SELECT id FROM orders
+                WHERE {column} = $1 AND status NOT IN ('completed', 'cancelled', 'failed')
+            """, user_id)
+            return [row['id'] for row in rows]
+    
+    # === DISPATCH QUEUE ===
+    
+    @classmethod
+    async def enqueue_dispatch_job(cls, order_id: int) -> bool:
+        """Поставить заказ в очередь поиска водителя"""
+        async with cls.get_connection() as conn:
+            try:
+                result = await conn.execute("""
+                    INSERT INTO dispatch_jobs (order_id)
+                    VALUES ($1)
+                    ON CONFLICT (order_id) DO NOTHING
+                """, order_id)
+                return "INSERT 0 1" in result
+            except Exception as e:
+                logger.error(f"Error enqueueing dispatch job: {e}")
                 return False
     
-    # === DRIVER METHODS ===
+    @classmethod
+    async def enqueue_orphaned_orders(cls) -> int:
+        """Поставить в очередь заказы в поиске, для которых нет задачи (например, созданные до обновления)"""
+        async with cls.get_connection() as conn:
+            result = await conn.execute("""
+                INSERT INTO dispatch_jobs (order_id)
+                SELECT id FROM orders
+                WHERE status IN ('created', 'searching_driver')
+                ON CONFLICT (order_id) DO NOTHING
+            """)
+            return int(result.split()[-1])
     
     @classmethod
-    async def update_driver_location(
+    async def claim_dispatch_jobs(
         cls,
-        driver_id: int,
-        lat: float,
-        lon: float,
-        speed: Optional[float] = None,
-        heading: Optional[int] = None
-    ) -> bool:
-        """Обновить местоположение водителя"""
+        worker_id: str,
+        limit: int,
+        lease_sec: int
+    ) -> List[Dict[str, Any]]:
+        """Захватить свободные задачи и задачи с истекшей арендой (упавший процесс)"""
+        async with cls.get_connection() as conn:
+            jobs = await conn.fetch("""
+                UPDATE dispatch_jobs j
+                SET status = 'running',
+                    locked_by = $1,
+                    lease_until = CURRENT_TIMESTAMP + make_interval(secs => $3),
+                    heartbeat_at = CURRENT_TIMESTAMP,
+                    attempts = j.attempts + 1,
+                    search_started_at = COALESCE(j.search_started_at, CURRENT_TIMESTAMP),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE j.order_id IN (
+                    SELECT order_id
+                    FROM dispatch_jobs
+                    WHERE status = 'pending'
+                       OR (status = 'running' AND lease_until < CURRENT_TIMESTAMP)
+                    ORDER BY created_at
+                    LIMIT $2
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING j.*,
+                          EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - j.search_started_at) as elapsed_sec
+            """, worker_id, limit, lease_sec)
+            
+            return [dict(job) for job in jobs]
+    
+    @classmethod
+    async def heartbeat_dispatch_job(cls, order_id: int, worker_id: str, lease_sec: int) -> bool:
+        """Продлить аренду задачи. False - задача завершена или перехвачена другим процессом"""
+        async with cls.get_connection() as conn:
+            result = await conn.execute("""
+                UPDATE dispatch_jobs
+                SET lease_until = CURRENT_TIMESTAMP + make_interval(secs => $3),
+                    heartbeat_at = CURRENT_TIMESTAMP
+                WHERE order_id = $1 AND locked_by = $2 AND status = 'running'
+            """, order_id, worker_id, lease_sec)
+            return "UPDATE 1" in result
+    
+    @classmethod
+    async def complete_dispatch_job(cls, order_id: int, worker_id: Optional[str] = None) -> bool:
+        """Завершить задачу поиска (заказ принят, отменен или поиск исчерпан)"""
         async with cls.get_connection() as conn:
             try:
-                await conn.execute("""
-                    INSERT INTO driver_locations 
-                    (driver_id, location, speed, heading)
-                    VALUES ($1, ST_SetSRID(ST_MakePoint($3, $2), 4326), $4, $5)
-                """, driver_id, lat, lon, speed, heading)
+                query = """
+                    UPDATE dispatch_jobs
+                    SET status = 'done', lease_until = NULL, updated_at = CURRENT_TIMESTAMP
+                    WHERE order_id = $1 AND status != 'done'
+                """
+                params = [order_id]
                 
-                # Обновляем текущее местоположение в таблице drivers
-                await conn.execute("""
-                    UPDATE drivers 
-                    SET current_location = ST_SetSRID(ST_MakePoint($2, $1), 4326),
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE id = $3
-                """, lat, lon, driver_id)
+                if worker_id:
+                    query += " AND locked_by = $2"
+                    params.append(worker_id)
                 
-                return True
+                result = await conn.execute(query, *params)
+                return "UPDATE 1" in result
             except Exception as e:
-                logger.error(f"Error updating driver location: {e}")
+                logger.error(f"Error completing dispatch job: {e}")
                 return False
     
+    @classmethod
+    async def record_dispatch_offers(cls, order_id: int, driver_ids: List[int]):
+        """Запомнить водителей, которым уже предлагался заказ (для продолжения после сбоя)"""
+        async with cls.get_connection() as conn:
+            await conn.execute("""
+                UPDATE dispatch_jobs
+                SET offered_drivers = offered_drivers || $2::INTEGER[]
+                WHERE order_id = $1
+            """, order_id, driver_ids)
+    
+    @classmethod
+    async def lock_drivers_for_offer(
+        cls,
+        order_id: int,
+        driver_ids: List[int],
+        ttl_sec: int
+    ) -> List[int]:
+        """Закрепить водителей за предложением заказа, пока заказ ждет водителя.
+        Возвращает тех, кого удалось закрепить"""
+        if not driver_ids:
+            return []
+        
+        async with cls.get_connection() as conn:
+            rows = await conn.fetch("""
+                INSERT INTO driver_offer_locks (driver_id, order_id, expires_at)
+                SELECT unnest($2::INTEGER[]), $1, CURRENT_TIMESTAMP + make_interval(secs => $3)
+                WHERE EXISTS (SELECT 1 FROM orders WHERE id = $1 AND status = 'searching_driver')
+                ON CONFLICT (driver_id) DO UPDATE
+                SET order_id = EXCLUDED.order_id, expires_at = EXCLUDED.expires_at
+                WHERE driver_offer_locks.expires_at < CURRENT_TIMESTAMP
+                   OR driver_offer_locks.order_id = EXCLUDED.order_id
+                RETURNING driver_id
+            """, order_id, driver_ids, ttl_sec)
+            
+            locked = {row['driver_id'] for row in rows}
+            return [driver_id for driver_id in driver_ids if driver_id in locked]
+    
+    @classmethod
+    async def release_driver_offer_locks(cls, order_id: int):
+        """Освободить водителей, закрепленных за предложением заказа"""
+        async with cls.get_connection() as conn:
+            await conn.execute("""
+                DELETE FROM driver_offer_locks WHERE order_id = $1
+            """, order_id)
+    
+    @classmethod
+    async def try_advisory_lock(cls, key: int) -> Optional[asyncpg.Connection]:
+        """Захватить advisory lock уровня сессии. Соединение удерживается до release_advisory_lock"""
+        if cls._pool is None:
+            await cls.initialize()
+        
+        conn = await cls._pool.acquire()
+        try:
+            if await conn.fetchval("SELECT pg_try_advisory_lock($1)", key):
+                return conn
+        except Exception as e:
+            logger.error(f"Error acquiring advisory lock: {e}")
+        
+        await cls._pool.release(conn)
+        return None
+    
+    @classmethod
+    async def release_advisory_lock(cls, conn: asyncpg.Connection, key: int):
+        """Освободить advisory lock и вернуть соединение в пул"""
+        try:
+            if not conn.is_closed():
+                await conn.execute("SELECT pg_advisory_unlock($1)", key)
+        finally:
+            await cls._pool.release(conn)
+    
+    # === DRIVER METHODS ===
+    
+    @classmethod
+    async def write_driver_locations(cls, records: List[tuple]):
+        """Пакетная запись GPS-точек: COPY во временную таблицу, затем set-based INSERT и UPDATE.
+        
+        records - кортежи (driver_id, lat, lon, speed, heading, accuracy, recorded_at).
+        """
+        async with cls.get_connection() as conn:
+            async with conn.transaction():
+                await conn.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS driver_locations_stage (
+                        driver_id INTEGER,
+                        lat DOUBLE PRECISION,
+                        lon DOUBLE PRECISION,
+                        speed DOUBLE PRECISION,
+                        heading INTEGER,
+                        accuracy DOUBLE PRECISION,
+                        recorded_at TIMESTAMP WITH TIME ZONE
+                    ) ON COMMIT DELETE ROWS
+                """)
+                
+                await conn.copy_records_to_table(
+                    'driver_locations_stage',
+                    records=records,
+                    columns=['driver_id', 'lat', 'lon', 'speed', 'heading', 'accuracy', 'recorded_at']
+                )
+                
+                # Точки неизвестных водителей отбрасываются, чтобы не ронять весь пакет на FK
+                await conn.execute("""
+                    INSERT INTO driver_locations
+                    (driver_id, location, speed, heading, accuracy, recorded_at)
+                    SELECT s.driver_id, ST_SetSRID(ST_MakePoint(s.lon, s.lat), 4326),
+                           s.speed, s.heading, s.accuracy, s.recorded_at
+                    FROM driver_locations_stage s
+                    JOIN drivers d ON d.id = s.driver_id
+                """)
+                
+                # Текущее местоположение - последняя точка каждого водителя в пакете.
+                # Опоздавшие пакеты не перетирают более свежую позицию
+                await conn.execute("""
+                    INSERT INTO driver_positions (driver_id, location, speed, heading, recorded_at)
+                    SELECT s.driver_id, ST_SetSRID(ST_MakePoint(s.lon, s.lat), 4326)::geography,
+                           s.speed, s.heading, s.recorded_at
+                    FROM (
+                        SELECT DISTINCT ON (driver_id) driver_id, lat, lon, speed, heading, recorded_at
+                        FROM driver_locations_stage
+                        ORDER BY driver_id, recorded_at DESC
+                    ) s
+                    JOIN drivers d ON d.id = s.driver_id
+                    ON CONFLICT (driver_id) DO UPDATE
+                    SET location = EXCLUDED.location,
+                        speed = EXCLUDED.speed,
+                        heading = EXCLUDED.heading,
+                        recorded_at = EXCLUDED.recorded_at
+                    WHERE driver_positions.recorded_at <= EXCLUDED.recorded_at
+                """)
+    
     @classmethod
     async def update_driver_status(
         cls,
@@ -258,6 +567,12 @@ class Database:
                 logger.error(f"Error updating driver status: {e}")
                 return False
     
+    @classmethod
+    async def driver_exists(cls, driver_id: int) -> bool:
+        """Есть ли водитель с таким id"""
+        async with cls.get_connection() as conn:
+            return await conn.fetchval("SELECT EXISTS(SELECT 1 FROM drivers WHERE id = $1)", driver_id)
+    
     @classmethod
     async def get_driver_active_order(cls, driver_id: int) -> Optional[Dict[str, Any]]:
         """Получить активный заказ водителя"""
@@ -271,6 +586,147 @@ class Database:
             """, driver_id)
             return dict(order) if order else None
     
+    @classmethod
+    async def maintain_driver_locations(
+        cls,
+        days_ahead: int,
+        retention_days: int,
+        downsample_after_days: int
+    ) -> Optional[Dict[str, int]]:
+        """Обслуживание секций driver_locations. None - обслуживание уже выполняет другой процесс"""
+        async with cls.get_connection() as conn:
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", DRIVER_LOCATIONS_MAINTENANCE_LOCK_KEY):
+                return None
+            
+            try:
+                return {
+                    'created': await conn.fetchval(
+                        "SELECT create_driver_locations_partitions($1)", days_ahead
+                    ),
+                    'dropped': await conn.fetchval(
+                        "SELECT drop_old_driver_locations_partitions($1)", retention_days
+                    ),
+                    # Прореживание переписывает секции целиком - может идти дольше command_timeout
+                    'downsampled': await conn.fetchval(
+                        "SELECT downsample_driver_locations($1)", downsample_after_days, timeout=3600
+                    )
+                }
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", DRIVER_LOCATIONS_MAINTENANCE_LOCK_KEY)
+    
+    @classmethod
+    async def get_driver_locations_bounds(cls, days: int, trim: float = 0.001) -> Optional[Dict[str, float]]:
+        """Границы области, где были водители за последние days дней (без доли trim выбросов с каждой стороны)"""
+        async with cls.get_connection() as conn:
+            bounds = await conn.fetchrow("""
+                SELECT percentile_cont($2) WITHIN GROUP (ORDER BY ST_Y(location)) as min_lat,
+                       percentile_cont(1 - $2) WITHIN GROUP (ORDER BY ST_Y(location)) as max_lat,
+                       percentile_cont($2) WITHIN GROUP (ORDER BY ST_X(location)) as min_lon,
+                       percentile_cont(1 - $2) WITHIN GROUP (ORDER BY ST_X(location)) as max_lon
+                FROM driver_locations
+                WHERE recorded_at > CURRENT_TIMESTAMP - make_interval(days => $1)
+                  AND speed IS NOT NULL
+            """, days, trim, timeout=3600)
+            
+            return dict(bounds) if bounds and bounds['min_lat'] is not None else None
+    
+    @classmethod
+    async def aggregate_driver_speeds(
+        cls,
+        days: int,
+        origin_lat: float,
+        origin_lon: float,
+        cell_lat: float,
+        cell_lon: float,
+        slot_minutes: int,
+        timezone: str,
+        min_speed_ms: float = 0.5,
+        min_samples: int = 5
+    ) -> List[Dict[str, Any]]:
+        """Медианная скорость движения (км/ч) по клеткам сетки, типу дня и интервалу суток.
+        
+        Стоянки (speed < min_speed_ms) не учитываются - иначе ожидающие заказ водители занижают скорость.
+        """
+        async with cls.get_connection() as conn:
+            rows = await conn.fetch("""
+                SELECT floor((ST_Y(location) - $2) / $4)::int as row,
+                       floor((ST_X(location) - $3) / $5)::int as col,
+                       (EXTRACT(ISODOW FROM recorded_at AT TIME ZONE $7) >= 6)::int as weekend,
+                       floor(
+                           EXTRACT(EPOCH FROM (recorded_at AT TIME ZONE $7)::time) / ($6 * 60)
+                       )::int as slot,
+                       percentile_cont(0.5) WITHIN GROUP (ORDER BY speed::float8) * 3.6 as speed_kmh,
+                       COUNT(*) as samples
+                FROM driver_locations
+                WHERE recorded_at > CURRENT_TIMESTAMP - make_interval(days => $1)
+                  AND speed >= $8
+                GROUP BY 1, 2, 3, 4
+                HAVING COUNT(*) >= $9
+            """, days, origin_lat, origin_lon, cell_lat, cell_lon, slot_minutes, timezone,
+                min_speed_ms, min_samples, timeout=3600)
+            
+            return [dict(row) for row in rows]
+    
+    @classmethod
+    async def get_known_addresses(cls, limit: int = 50000, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Сохраненные адреса с координатами без заглушек бота, новые первыми (since - только более поздние).
+        
+        Адреса заказов не берутся: их координаты не проходят через геокодер.
+        """
+        async with cls.get_connection() as conn:
+            rows = await conn.fetch("""
+                SELECT address, ST_Y(location) as lat, ST_X(location) as lon, updated_at as used_at
+                FROM user_addresses
+                WHERE location IS NOT NULL
+                  AND address <> ALL($3::text[])
+                  AND NOT EXISTS (
+                      SELECT 1 FROM unnest($4::float8[], $5::float8[]) AS p(lat, lon)
+                      WHERE abs(ST_Y(location) - p.lat) < 0.00001 AND abs(ST_X(location) - p.lon) < 0.00001
+                  )
+                  AND ($2::timestamptz IS NULL OR updated_at > $2)
+                ORDER BY updated_at DESC
+                LIMIT $1
+            """, limit, since, PLACEHOLDER_ADDRESSES,
+                [lat for lat, _ in PLACEHOLDER_POINTS], [lon for _, lon in PLACEHOLDER_POINTS])
+            
+            return [dict(row) for row in rows]
+    
+    # === REFERENCE DATA ===
+    
+    @classmethod
+    async def get_tariffs(cls) -> List[Dict[str, Any]]:
+        """Активные тарифы"""
+        async with cls.get_connection() as conn:
+            tariffs = await conn.fetch("""
+                SELECT * FROM tariffs
+                WHERE is_active = TRUE
+                ORDER BY base_fee
+            """)
+            return [dict(tariff) for tariff in tariffs]
+    
+    @classmethod
+    async def get_settings(cls) -> Dict[str, Any]:
+        """Системные настройки из таблицы settings (ключ -> значение)"""
+        async with cls.get_connection() as conn:
+            rows = await conn.fetch("SELECT key, value FROM settings")
+            return {row['key']: json.loads(row['value']) for row in rows}
+    
+    @classmethod
+    async def listen(cls, channel: str, callback) -> asyncpg.Connection:
+        """Отдельное соединение (вне пула), подписанное на LISTEN channel"""
+        conn = await asyncpg.connect(
+            dsn=settings.database_url,
+            server_settings={'application_name': 'taxi-backend-listener'}
+        )
+        await conn.add_listener(channel, callback)
+        return conn
+    
+    @classmethod
+    async def notify(cls, channel: str, payload: str):
+        """NOTIFY channel (получат все процессы, подписанные через listen)"""
+        async with cls.get_connection() as conn:
+            await conn.execute("SELECT pg_notify($1, $2)", channel, payload)
+    
     # === USER METHODS ===
     
     @classmethod
@@ -0,0 +1,490 @@
+import asyncio
+import time
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from loguru import logger
+
+from config import settings
+from database import Database
+from websocket_manager import manager
+from driver_index import driver_index, find_nearby_drivers
+from routing import routing_engine
+from speed_profile import speed_profile
+from surge import surge_engine
+import matching
+
+
+class OfferEngine:
+    """Ожидание ответов водителей на предложения заказов"""
+
+    def __init__(self):
+        # (order_id, driver_id) -> future с ответом водителя (True - принял, False - отказался)
+        self._offers: Dict[Tuple[int, int], asyncio.Future] = {}
+
+        # Заказы, по которым сейчас идет поиск водителя
+        self._searching: Set[int] = set()
+
+    def open_offer(self, order_id: int, driver_id: int) -> asyncio.Future:
+        """Зарегистрировать предложение заказа водителю"""
+        key = (order_id, driver_id)
+        future = self._offers.get(key)
+
+        if future is None or future.done():
+            future = asyncio.get_running_loop().create_future()
+            self._offers[key] = future
+
+        return future
+
+    def close_offer(self, order_id: int, driver_id: int):
+        """Удалить предложение"""
+        future = self._offers.pop((order_id, driver_id), None)
+        if future and not future.done():
+            future.cancel()
+
+    def resolve(self, order_id: int, driver_id: int, accepted: bool) -> bool:
+        """Зафиксировать ответ водителя на предложение"""
+        future = self._offers.get((order_id, driver_id))
+
+        if future is None or future.done():
+            return False
+
+        future.set_result(accepted)
+        logger.debug(f"Offer {order_id} -> driver {driver_id}: {'accepted' if accepted else 'declined'}")
+        return True
+
+    async def wait_any(self, order_id: int, driver_ids: List[int], timeout: float) -> Optional[int]:
+        """Дождаться первого принятия среди нескольких водителей (None - никто не принял)"""
+        futures = {
+            (self._offers.get((order_id, driver_id)) or self.open_offer(order_id, driver_id)): driver_id
+            for driver_id in driver_ids
+        }
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        pending = set(futures)
+
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                for future in done:
+                    if not future.cancelled() and future.result():
+                        return futures[future]
+
+            return None
+        finally:
+            for driver_id in driver_ids:
+                self.close_offer(order_id, driver_id)
+
+    def pending(self) -> Tuple[Set[int], Set[int]]:
+        """Заказы и водители с ожидающими ответа предложениями"""
+        orders, drivers = set(), set()
+
+        for (order_id, driver_id), future in self._offers.items():
+            if not future.done():
+                orders.add(order_id)
+                drivers.add(driver_id)
+
+        return orders, drivers
+
+    # === ЖИЗНЕННЫЙ ЦИКЛ ПОИСКА ===
+
+    def start_search(self, order_id: int):
+        """Отметить начало поиска водителя по заказу"""
+        self._searching.add(order_id)
+
+    def is_searching(self, order_id: int) -> bool:
+        """Идет ли еще поиск водителя по заказу"""
+        return order_id in self._searching
+
+    def assign_order(self, order_id: int, driver_id: int):
+        """Заказ принят водителем - остальные предложения закрываются"""
+        self.resolve(order_id, driver_id, True)
+        self.stop_search(order_id)
+
+    def stop_search(self, order_id: int):
+        """Остановить поиск водителя по заказу (принят, отменен и т.п.)"""
+        self._searching.discard(order_id)
+
+        for (offer_order_id, driver_id) in list(self._offers):
+            if offer_order_id == order_id:
+                self.resolve(order_id, driver_id, False)
+
+    def finish_search(self, order_id: int):
+        """Освободить состояние заказа после завершения поиска"""
+        self._searching.discard(order_id)
+
+        for (offer_order_id, driver_id) in list(self._offers):
+            if offer_order_id == order_id:
+                self.close_offer(order_id, driver_id)
+
+
+async def rank_by_road_eta(drivers: List[Dict[str, Any]], lat: float, lon: float) -> List[Dict[str, Any]]:
+    """Кандидаты по времени подачи по дорогам (без дорожного графа - порядок по прямой)"""
+    if not routing_engine.ready or len(drivers) < 2:
+        return drivers
+
+    seconds, _ = await asyncio.to_thread(
+        routing_engine.many_to_one,
+        [d['lat'] for d in drivers], [d['lon'] for d in drivers], lat, lon
+    )
+    return [drivers[i] for i in np.argsort(seconds, kind='stable')]
+
+
+async def offer_cancel_reason(order_id: int) -> str:
+    """Причина отзыва предложения, когда поиск остановлен извне: заказ принят или отменен"""
+    status = await Database.get_order_status(order_id)
+    return 'cancelled' if status in (None, 'cancelled', 'failed') else 'taken'
+
+
+async def find_driver_for_order(
+    order_id: int,
+    skip_drivers: Optional[Set[int]] = None,
+    elapsed_sec: float = 0
+):
+    """Алгоритм поиска водителя для заказа.
+
+    skip_drivers и elapsed_sec позволяют продолжить поиск, прерванный перезапуском процесса.
+    """
+
+    order = await Database.get_order_by_id(order_id)
+    if not order:
+        return
+
+    # Заказ мог быть принят или отменен, пока задача ждала в очереди
+    if order['status'] == 'created':
+        await Database.update_order_status(order_id, 'searching_driver')
+    elif order['status'] != 'searching_driver':
+        return
+
+    offers.start_search(order_id)
+
+    lat = order.get('pickup_lat') or 55.7558
+    lon = order.get('pickup_lon') or 37.6176
+
+    start_time = datetime.now() - timedelta(seconds=elapsed_sec)
+    search_radius = settings.DRIVER_SEARCH_RADIUS_KM
+    offered = set(skip_drivers or ())
+    batch_size = settings.DISPATCH_BATCH_SIZE if settings.DISPATCH_MODE == 'batch' else 1
+    lock_ttl = settings.DRIVER_RESPONSE_TIMEOUT_SEC + 5
+
+    try:
+        while (datetime.now() - start_time).total_seconds() < settings.MAX_ORDER_SEARCH_TIME_SEC:
+            # Ищем ближайших водителей
+            drivers = await rank_by_road_eta(await find_nearby_drivers(lat, lon, search_radius), lat, lon)
+
+            candidates = [d['id'] for d in drivers if d['id'] not in offered]
+
+            # В режиме batch заказ уходит сразу нескольким водителям, выигрывает первый принявший
+            for i in range(0, len(candidates), batch_size):
+                # Заказ могли принять или отменить через другой процесс: его heartbeat
+                # узнает об этом с задержкой, а статус в БД - сразу
+                if await Database.get_order_status(order_id) != 'searching_driver':
+                    offers.stop_search(order_id)
+                    return
+
+                # Водителю одновременно предлагается только один заказ - даже из разных процессов
+                batch = await Database.lock_drivers_for_offer(order_id, candidates[i:i + batch_size], lock_ttl)
+                if not batch:
+                    continue
+
+                # Пропускаем дальше только тех, кому заказ действительно предложен: водитель, занятый
+                # чужим предложением, остается кандидатом на следующем круге
+                offered.update(batch)
+                await Database.record_dispatch_offers(order_id, batch)
+
+                # Регистрируем предложения до отправки, чтобы не пропустить быстрый ответ
+                for driver_id in batch:
+                    offers.open_offer(order_id, driver_id)
+
+                await asyncio.gather(*(
+                    manager.send_order_to_driver(
+                        order_id=order_id,
+                        driver_id=driver_id,
+                        order_data=order
+                    )
+                    for driver_id in batch
+                ))
+
+                # Ждем ответа: принятие/отказ приходят через accept_order и WebSocket.
+                # Захват заказа - условный UPDATE в assign_driver_to_order
+                winner = await offers.wait_any(order_id, batch, settings.DRIVER_RESPONSE_TIMEOUT_SEC)
+
+                await Database.release_driver_offer_locks(order_id)
+
+                # Отзываем предложение у остальных водителей пачки
+                if winner is not None:
+                    reason = 'taken'
+                elif offers.is_searching(order_id):
+                    reason = 'timeout'
+                else:
+                    reason = await offer_cancel_reason(order_id)
+
+                await asyncio.gather(*(
+                    manager.send_offer_cancel(order_id, driver_id, reason)
+                    for driver_id in batch if driver_id != winner
+                ))
+
+                if winner is not None or not offers.is_searching(order_id):
+                    return  # Заказ принят или поиск остановлен
+
+            # Увеличиваем радиус поиска
+            search_radius = min(search_radius * 1.5, 50)  # Максимум 50 км
+
+            # Ждем перед следующим кругом поиска
+            await asyncio.sleep(10)
+
+            if not offers.is_searching(order_id):
+                return
+    finally:
+        searching = offers.is_searching(order_id)
+        offers.finish_search(order_id)
+
+    # Если не нашли водителя
+    if searching:
+        # Отменяем, только если заказ все еще ждет водителя: его мог принять водитель другого процесса
+        changes = await Database.update_order_status(order_id, 'cancelled', expected_status='searching_driver')
+        if not changes:
+            return
+
+        surge_engine.order_closed(order_id)
+        await manager.notify_order_update(order_id, 'cancelled', 0, changes)
+
+        logger.warning(f"Order {order_id} cancelled - no drivers found")
+
+
+# Ключ advisory lock: глобальный диспетчер работает только в одном процессе
+DISPATCHER_LOCK_KEY = 7_300_001
+
+
+class GlobalDispatcher:
+    """Глобальное распределение: на каждом тике все заказы в поиске назначаются
+    свободным водителям одной задачей о назначениях с минимальным суммарным ETA подачи"""
+
+    def __init__(self, engine: OfferEngine):
+        self.engine = engine
+        self._task: Optional[asyncio.Task] = None
+        self._leader_conn = None
+        self._offer_tasks: Set[asyncio.Task] = set()
+
+        # order_id -> водители, которые отказались или не ответили
+        self._declined: Dict[int, Set[int]] = {}
+
+        self.last_tick_ms = 0.0
+
+    def start(self):
+        """Запуск цикла диспетчера"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info("Global dispatcher started")
+
+    async def stop(self):
+        """Остановка цикла диспетчера"""
+        tasks = [t for t in [self._task, *self._offer_tasks] if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self._task = None
+        self._offer_tasks.clear()
+
+        if self._leader_conn is not None:
+            await Database.release_advisory_lock(self._leader_conn, DISPATCHER_LOCK_KEY)
+            self._leader_conn = None
+
+    async def _is_leader(self) -> bool:
+        """Захват лидерства: при нескольких процессах тики выполняет только один"""
+        if self._leader_conn is not None and self._leader_conn.is_closed():
+            await Database.release_advisory_lock(self._leader_conn, DISPATCHER_LOCK_KEY)
+            self._leader_conn = None
+            logger.warning("Global dispatcher lost leadership")
+
+        if self._leader_conn is None:
+            self._leader_conn = await Database.try_advisory_lock(DISPATCHER_LOCK_KEY)
+            if self._leader_conn is not None:
+                logger.info("Global dispatcher acquired leadership")
+
+        return self._leader_conn is not None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        interval = settings.DISPATCH_TICK_MS / 1000
+
+        while True:
+            started = loop.time()
+
+            try:
+                if await self._is_leader():
+                    await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Dispatch tick failed: {e}")
+
+            await asyncio.sleep(max(0.0, interval - (loop.time() - started)))
+
+    async def tick(self):
+        """Один тик: сбор заказов и водителей, назначение, рассылка предложений"""
+        orders = await Database.get_searching_orders(settings.DISPATCH_MAX_ORDERS_PER_TICK)
+
+        if len(orders) < settings.DISPATCH_MAX_ORDERS_PER_TICK:
+            active_ids = {o['id'] for o in orders}
+            self._declined = {k: v for k, v in self._declined.items() if k in active_ids}
+
+        busy_orders, busy_drivers = self.engine.pending()
+
+        open_orders = []
+        for order in orders:
+            if order['id'] in busy_orders:
+                continue
+            if order['waiting_sec'] > settings.MAX_ORDER_SEARCH_TIME_SEC:
+                await self._expire(order['id'])
+                continue
+            open_orders.append(order)
+
+        if not open_orders:
+            return
+
+        if driver_index.ready:
+            drivers = driver_index.available_drivers()
+        else:
+            drivers = await Database.get_idle_drivers()
+
+        drivers = [d for d in drivers if d['id'] not in busy_drivers]
+        if not drivers:
+            return
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        # Пары, где водитель уже отказался от заказа (order_id << 32 | driver_id)
+        declined = [(order_id << 32) | driver_id for order_id, ids in self._declined.items() for driver_id in ids]
+
+        # Расчет матрицы и назначения - в отдельном потоке, чтобы не блокировать event loop
+        pairs = await asyncio.to_thread(self._match, open_orders, drivers, declined)
+
+        self.last_tick_ms = (loop.time() - started) * 1000
+        if self.last_tick_ms > settings.DISPATCH_TICK_BUDGET_MS:
+            logger.warning(
+                f"Dispatch matching took {self.last_tick_ms:.0f} ms "
+                f"({len(open_orders)} orders x {len(drivers)} drivers)"
+            )
+
+        for order_idx, driver_idx in pairs:
+            task = asyncio.create_task(self._offer(open_orders[order_idx], drivers[driver_idx]['id']))
+            self._offer_tasks.add(task)
+            task.add_done_callback(self._offer_tasks.discard)
+
+    @staticmethod
+    def _match(
+        orders: List[Dict[str, Any]],
+        drivers: List[Dict[str, Any]],
+        declined: List[int]
+    ) -> List[Tuple[int, int]]:
+        order_coords = np.array([[o['pickup_lat'], o['pickup_lon']] for o in orders], dtype=np.float64)
+        driver_coords = np.array([[d['lat'], d['lon']] for d in drivers], dtype=np.float64)
+
+        rows, cols, costs = matching.build_cost_edges(
+            order_coords,
+            driver_coords,
+            radius_km=settings.DRIVER_SEARCH_RADIUS_KM,
+            max_candidates=settings.DISPATCH_CANDIDATES_PER_ORDER,
+            # Ожидаемая скорость у точки посадки в текущий интервал суток
+            speed_kmh=speed_profile.speeds_kmh(order_coords[:, 0], order_coords[:, 1])
+            if speed_profile.ready else settings.PICKUP_SPEED_KMH
+        )
+
+        # Убираем пары, где водитель уже отказался от заказа
+        if declined and len(rows):
+            order_ids = np.array([o['id'] for o in orders], dtype=np.int64)
+            driver_ids = np.array([d['id'] for d in drivers], dtype=np.int64)
+            keep = ~np.isin((order_ids[rows] << 32) | driver_ids[cols], np.array(declined, dtype=np.int64))
+            rows, cols, costs = rows[keep], cols[keep], costs[keep]
+
+        # Время подачи по дорогам вместо оценки по прямой (где маршрут найден)
+        if routing_engine.ready and len(rows):
+            costs = GlobalDispatcher._road_costs(rows, cols, costs, order_coords, driver_coords)
+
+        return matching.solve_assignment(rows, cols, costs, len(orders), len(drivers))
+
+    @staticmethod
+    def _road_costs(
+        rows: np.ndarray,
+        cols: np.ndarray,
+        costs: np.ndarray,
+        order_coords: np.ndarray,
+        driver_coords: np.ndarray
+    ) -> np.ndarray:
+        """ETA по дорогам для лучших по прямой кандидатов каждого заказа в пределах бюджета времени"""
+        deadline = time.perf_counter() + settings.DISPATCH_ROUTING_BUDGET_MS / 1000
+
+        # Место кандидата среди кандидатов своего заказа по ETA по прямой
+        by_order = np.lexsort((costs, rows))
+        sorted_rows = rows[by_order]
+        starts = np.flatnonzero(np.r_[True, sorted_rows[1:] != sorted_rows[:-1]])
+        place = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+
+        # Сначала лучшие кандидаты всех заказов, потом вторые и т.д. - бюджет тратится на важные пары
+        routed = by_order[place < settings.DISPATCH_ROUTED_CANDIDATES]
+        routed = routed[np.argsort(place[place < settings.DISPATCH_ROUTED_CANDIDATES], kind='stable')]
+
+        seconds, _ = routing_engine.pairs(
+            driver_coords[cols[routed], 0], driver_coords[cols[routed], 1],
+            order_coords[rows[routed], 0], order_coords[rows[routed], 1],
+            deadline=deadline
+        )
+        if speed_profile.ready:
+            seconds = seconds * speed_profile.congestion(order_coords[:, 0], order_coords[:, 1])[rows[routed]]
+
+        found = np.isfinite(seconds)
+        if not found.any():
+            return costs
+
+        # Оценка по прямой занижена относительно дорог - масштабируем остальные пары
+        # на типичное для этого тика отношение, чтобы они не выигрывали у посчитанных
+        ratio = max(float(np.median(seconds[found] / np.maximum(costs[routed][found], 1.0))), 1.0)
+        result = costs * ratio
+        result[routed[found]] = seconds[found]
+        return result
+
+    async def _offer(self, order: Dict[str, Any], driver_id: int):
+        order_id = order['id']
+
+        self.engine.start_search(order_id)
+        self.engine.open_offer(order_id, driver_id)
+
+        try:
+            await manager.send_order_to_driver(order_id=order_id, driver_id=driver_id, order_data=order)
+
+            winner = await self.engine.wait_any(order_id, [driver_id], settings.DRIVER_RESPONSE_TIMEOUT_SEC)
+
+            if winner is None:
+                # Заказ вернется в распределение на следующем тике без этого водителя
+                self._declined.setdefault(order_id, set()).add(driver_id)
+                reason = 'timeout' if self.engine.is_searching(order_id) else await offer_cancel_reason(order_id)
+                await manager.send_offer_cancel(order_id, driver_id, reason)
+        finally:
+            self.engine.finish_search(order_id)
+
+    async def _expire(self, order_id: int):
+        """Отмена заказа, для которого не нашли водителя за отведенное время"""
+        self._declined.pop(order_id, None)
+
+        changes = await Database.update_order_status(order_id, 'cancelled', expected_status='searching_driver')
+        if not changes:
+            return
+
+        surge_engine.order_closed(order_id)
+        await manager.notify_order_update(order_id, 'cancelled', 0, changes)
+
+        logger.warning(f"Order {order_id} cancelled - no drivers found")
+
+offers = OfferEngine()
+dispatcher = GlobalDispatcher(offers)
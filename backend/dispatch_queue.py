@@ -0,0 +1,135 @@
+import asyncio
+import os
+import socket
+import uuid
+from typing import Any, Dict, Optional
+from loguru import logger
+
+from config import settings
+from database import Database
+from websocket_manager import manager
+from dispatch import offers, find_driver_for_order
+from surge import surge_engine
+
+
+class DispatchQueue:
+    """Очередь задач поиска водителя в PostgreSQL.
+    
+    Задачи захватываются через FOR UPDATE SKIP LOCKED с арендой, которую процесс продлевает
+    heartbeat'ом. Если процесс упал, аренда истекает и поиск продолжает другой процесс.
+    """
+    
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        
+        self._task: Optional[asyncio.Task] = None
+        self._jobs: Dict[int, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+    
+    async def enqueue(self, order_id: int):
+        """Поставить заказ в очередь поиска"""
+        await Database.enqueue_dispatch_job(order_id)
+        self._wakeup.set()
+    
+    async def start(self):
+        """Запуск обработчика очереди"""
+        if self._task is not None:
+            return
+        
+        # Заказы, оставшиеся без задачи, тоже должны найти водителя
+        orphaned = await Database.enqueue_orphaned_orders()
+        if orphaned:
+            logger.info(f"Enqueued {orphaned} orphaned orders for dispatch")
+        
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Dispatch queue worker {self.worker_id} started")
+    
+    async def stop(self):
+        """Остановка обработчика. Незавершенные задачи подхватят другие процессы после истечения аренды"""
+        tasks = [t for t in [self._task, *self._jobs.values()] if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        
+        self._task = None
+        self._jobs.clear()
+    
+    async def _run(self):
+        while True:
+            try:
+                free_slots = settings.DISPATCH_QUEUE_CONCURRENCY - len(self._jobs)
+                
+                if free_slots > 0:
+                    jobs = await Database.claim_dispatch_jobs(
+                        self.worker_id, free_slots, settings.DISPATCH_LEASE_SEC
+                    )
+                    
+                    for job in jobs:
+                        task = asyncio.create_task(self._process(job))
+                        self._jobs[job['order_id']] = task
+                        task.add_done_callback(lambda _, order_id=job['order_id']: self._jobs.pop(order_id, None))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Dispatch queue error: {e}")
+            
+            # Новые заказы этого процесса будят обработчик сразу, остальные подхватываются по таймеру
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.DISPATCH_QUEUE_POLL_SEC)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _process(self, job: Dict[str, Any]):
+        try:
+            await self._dispatch(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Задача не завершается: по истечении аренды поиск продолжит этот или другой процесс
+            logger.exception(f"Dispatch job for order {job['order_id']} failed")
+    
+    async def _dispatch(self, job: Dict[str, Any]):
+        order_id = job['order_id']
+        
+        if job['attempts'] > settings.DISPATCH_MAX_ATTEMPTS:
+            logger.error(f"Dispatch job for order {order_id} failed {job['attempts'] - 1} times, giving up")
+            changes = await Database.update_order_status(order_id, 'failed')
+            surge_engine.order_closed(order_id)
+            await manager.notify_order_update(order_id, 'failed', 0, changes)
+            await Database.complete_dispatch_job(order_id, self.worker_id)
+            return
+        
+        if job['attempts'] > 1:
+            logger.info(f"Resuming dispatch for order {order_id} (attempt {job['attempts']})")
+        
+        heartbeat = asyncio.create_task(self._heartbeat(order_id))
+        
+        try:
+            await find_driver_for_order(
+                order_id,
+                skip_drivers=set(job['offered_drivers'] or ()),
+                elapsed_sec=float(job['elapsed_sec'] or 0)
+            )
+        finally:
+            heartbeat.cancel()
+        
+        await Database.complete_dispatch_job(order_id, self.worker_id)
+    
+    async def _heartbeat(self, order_id: int):
+        """Продление аренды, пока идет поиск"""
+        while True:
+            await asyncio.sleep(settings.DISPATCH_LEASE_SEC / 3)
+            
+            try:
+                alive = await Database.heartbeat_dispatch_job(order_id, self.worker_id, settings.DISPATCH_LEASE_SEC)
+            except Exception as e:
+                logger.error(f"Dispatch heartbeat failed for order {order_id}: {e}")
+                continue
+            
+            if not alive:
+                # Заказ принят или отменен через другой процесс - прекращаем поиск здесь
+                offers.stop_search(order_id)
+                return
+
+dispatch_queue = DispatchQueue()
@@ -0,0 +1,252 @@
+import asyncio
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from loguru import logger
+
+from config import settings
+from database import Database
+import geo
+
+KM_PER_DEGREE = geo.KM_PER_DEGREE
+
+
+class DriverIndex:
+    """Индекс текущих координат водителей в памяти процесса (равномерная сетка)"""
+    
+    def __init__(self, cell_km: float = 1.0, stale_sec: int = 120):
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.stale_sec = stale_sec
+        
+        # driver_id -> (lat, lon, время обновления по time.monotonic)
+        self._positions: Dict[int, Tuple[float, float, float]] = {}
+        self._cell_of: Dict[int, Tuple[int, int]] = {}
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+        
+        self._status: Dict[int, str] = {}
+        self._verified: Set[int] = set()
+        
+        # Подписчики на изменения: (driver_id, lat, lon, доступен ли водитель)
+        self._listeners: List[Callable[[int, Optional[float], Optional[float], bool], None]] = []
+        
+        self._task: Optional[asyncio.Task] = None
+        self.ready = False
+    
+    def add_listener(self, listener: Callable[[int, Optional[float], Optional[float], bool], None]):
+        """Подписаться на изменения координат и доступности водителей"""
+        self._listeners.append(listener)
+    
+    def _notify(self, driver_id: int):
+        if not self._listeners:
+            return
+        
+        position = self._positions.get(driver_id)
+        available = (
+            position is not None
+            and self._status.get(driver_id) == 'online'
+            and driver_id in self._verified
+        )
+        lat, lon = (position[0], position[1]) if position else (None, None)
+        
+        for listener in self._listeners:
+            listener(driver_id, lat, lon, available)
+    
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+    
+    # === ОБНОВЛЕНИЕ ===
+    
+    def update_position(self, driver_id: int, lat: float, lon: float, updated_at: Optional[float] = None):
+        """Новые координаты водителя"""
+        updated_at = time.monotonic() if updated_at is None else updated_at
+        
+        current = self._positions.get(driver_id)
+        if current and current[2] > updated_at:
+            return
+        
+        cell = self._cell(lat, lon)
+        old_cell = self._cell_of.get(driver_id)
+        
+        if old_cell != cell:
+            if old_cell is not None:
+                self._discard_from_cell(driver_id, old_cell)
+            self._cells.setdefault(cell, set()).add(driver_id)
+            self._cell_of[driver_id] = cell
+        
+        self._positions[driver_id] = (lat, lon, updated_at)
+        self._notify(driver_id)
+    
+    def set_status(self, driver_id: int, status: str, is_verified: Optional[bool] = None):
+        """Статус водителя (online/busy/...) и признак проверки"""
+        self._status[driver_id] = status
+        
+        if is_verified is True:
+            self._verified.add(driver_id)
+        elif is_verified is False:
+            self._verified.discard(driver_id)
+        
+        self._notify(driver_id)
+    
+    def get_status(self, driver_id: int) -> Optional[str]:
+        """Последний известный статус водителя"""
+        return self._status.get(driver_id)
+    
+    def remove(self, driver_id: int):
+        """Удалить водителя из индекса"""
+        self._positions.pop(driver_id, None)
+        cell = self._cell_of.pop(driver_id, None)
+        if cell is not None:
+            self._discard_from_cell(driver_id, cell)
+        
+        self._notify(driver_id)
+    
+    def _discard_from_cell(self, driver_id: int, cell: Tuple[int, int]):
+        drivers = self._cells.get(cell)
+        if drivers is not None:
+            drivers.discard(driver_id)
+            if not drivers:
+                del self._cells[cell]
+    
+    def purge_stale(self) -> int:
+        """Удалить водителей без свежих координат"""
+        deadline = time.monotonic() - self.stale_sec
+        stale = [driver_id for driver_id, (_, _, ts) in self._positions.items() if ts < deadline]
+        
+        for driver_id in stale:
+            self.remove(driver_id)
+        
+        return len(stale)
+    
+    # === ЗАПРОСЫ ===
+    
+    def _is_available(self, driver_id: int, deadline: float) -> bool:
+        return (
+            self._status.get(driver_id) == 'online'
+            and driver_id in self._verified
+            and self._positions[driver_id][2] >= deadline
+        )
+    
+    def _scan(self, lat: float, lon: float, ring: int, deadline: float) -> List[Tuple[float, int]]:
+        """Доступные водители в клетках кольца ring вокруг точки"""
+        cy, cx = self._cell(lat, lon)
+        
+        # Клетки по долготе сужаются по мере удаления от экватора
+        cos_lat = max(math.cos(math.radians(lat)), 0.01)
+        lon_span = int(math.ceil(ring / cos_lat))
+        inner_lon_span = int(math.ceil((ring - 1) / cos_lat)) if ring > 0 else -1
+        
+        ids, lats, lons = [], [], []
+        for y in range(cy - ring, cy + ring + 1):
+            for x in range(cx - lon_span, cx + lon_span + 1):
+                # Клетки внутренних колец уже просмотрены
+                if abs(y - cy) <= ring - 1 and abs(x - cx) <= inner_lon_span:
+                    continue
+                
+                for driver_id in self._cells.get((y, x), ()):
+                    if self._is_available(driver_id, deadline):
+                        d_lat, d_lon, _ = self._positions[driver_id]
+                        ids.append(driver_id)
+                        lats.append(d_lat)
+                        lons.append(d_lon)
+        
+        if not ids:
+            return []
+        
+        # Расстояния до всех водителей кольца - одним вызовом
+        return list(zip(geo.distances_from(lat, lon, lats, lons).tolist(), ids))
+    
+    def nearby(self, lat: float, lon: float, radius_km: float, limit: int = 10) -> List[Dict[str, Any]]:
+        """k ближайших доступных водителей в радиусе radius_km"""
+        deadline = time.monotonic() - self.stale_sec
+        cell_km = self.cell_deg * KM_PER_DEGREE
+        max_ring = int(math.ceil(radius_km / cell_km))
+        
+        found: List[Tuple[float, int]] = []
+        for ring in range(max_ring + 1):
+            found.extend(d for d in self._scan(lat, lon, ring, deadline) if d[0] <= radius_km)
+            
+            # Все водители за пределами кольца дальше (ring * cell_km) - найденные k ближайших окончательны
+            if len(found) >= limit:
+                found.sort()
+                if found[limit - 1][0] <= ring * cell_km:
+                    break
+        
+        found.sort()
+        return [
+            {
+                'id': driver_id,
+                'lat': self._positions[driver_id][0],
+                'lon': self._positions[driver_id][1],
+                'distance_meters': round(distance_km * 1000, 1)
+            }
+            for distance_km, driver_id in found[:limit]
+        ]
+    
+    def available_drivers(self) -> List[Dict[str, Any]]:
+        """Все доступные водители со свежими координатами"""
+        deadline = time.monotonic() - self.stale_sec
+        return [
+            {'id': driver_id, 'lat': lat, 'lon': lon}
+            for driver_id, (lat, lon, _) in self._positions.items()
+            if self._is_available(driver_id, deadline)
+        ]
+    
+    def get_online_count(self) -> int:
+        """Количество доступных водителей со свежими координатами"""
+        deadline = time.monotonic() - self.stale_sec
+        return sum(1 for driver_id in self._positions if self._is_available(driver_id, deadline))
+    
+    # === СИНХРОНИЗАЦИЯ С БД ===
+    
+    async def load(self):
+        """Загрузка статусов и последних координат из БД"""
+        drivers = await Database.get_driver_index_snapshot()
+        now_wall = time.time()
+        now = time.monotonic()
+        
+        for driver in drivers:
+            self.set_status(driver['id'], driver['status'], driver['is_verified'])
+            
+            if driver['lat'] is not None and driver['updated_at'] is not None:
+                age = max(0.0, now_wall - driver['updated_at'].timestamp())
+                if age < self.stale_sec:
+                    self.update_position(driver['id'], driver['lat'], driver['lon'], now - age)
+        
+        self.ready = True
+    
+    async def start(self):
+        """Первичная загрузка и периодическая синхронизация"""
+        await self.load()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Driver index loaded: {len(self._positions)} positions")
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.DRIVER_INDEX_REFRESH_SEC)
+            
+            try:
+                self.purge_stale()
+                # Подтягиваем изменения, пришедшие через другие процессы и админку
+                await self.load()
+            except Exception as e:
+                logger.error(f"Driver index refresh failed: {e}")
+
+
+driver_index = DriverIndex(
+    cell_km=settings.DRIVER_INDEX_CELL_KM,
+    stale_sec=settings.DRIVER_POSITION_STALE_SEC
+)
+
+
+async def find_nearby_drivers(lat: float, lon: float, radius_km: float = 5, limit: int = 10) -> List[Dict[str, Any]]:
+    """Поиск ближайших водителей: индекс в памяти, PostGIS - если индекс еще не загружен"""
+    if driver_index.ready:
+        return driver_index.nearby(lat, lon, radius_km, limit)
+    
+    return await Database.find_nearby_drivers(lat, lon, radius_km, limit)
@@ -0,0 +1,182 @@
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Iterable, Optional, Tuple
+import aiosqlite
+
+from config import settings
+
+# Отличает отсутствие записи от закэшированного "не найдено" (None)
+MISS = object()
+
+
+def normalize_address(address: str) -> str:
+    """Адрес в каноническом виде: регистр, ё, знаки препинания и пробелы не влияют на ключ"""
+    address = address.lower().replace('ё', 'е')
+    address = re.sub(r'[,.;:"«»()]+', ' ', address)
+    return ' '.join(address.split())
+
+
+class GeocodeCache:
+    """Кэш геокодирования: LRU в памяти поверх SQLite на диске.
+    
+    Прямое геокодирование - по нормализованному адресу, обратное - по координатам,
+    округленным до coord_digits знаков. "Не найдено" тоже кэшируется, но на меньший срок.
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        max_size: int = 20000,
+        ttl_sec: int = 30 * 24 * 3600,
+        negative_ttl_sec: int = 3600,
+        coord_digits: int = 4
+    ):
+        self.path = path
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        self.negative_ttl_sec = negative_ttl_sec
+        self.coord_digits = coord_digits
+        
+        # ключ -> (срок годности по time.time, значение)
+        self._local: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._db: Optional[aiosqlite.Connection] = None
+        
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+    
+    async def open(self):
+        """Открытие базы на диске"""
+        if self._db is not None:
+            return
+        
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = await aiosqlite.connect(self.path)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute("""
+            CREATE TABLE IF NOT EXISTS geocode_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                expires_at REAL NOT NULL
+            )
+        """)
+        await self._db.execute("DELETE FROM geocode_cache WHERE expires_at < ?", (time.time(),))
+        await self._db.commit()
+    
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+    
+    def forward_key(self, address: str) -> str:
+        return f"fwd:{normalize_address(address)}"
+    
+    def reverse_key(self, lat: float, lon: float) -> str:
+        return f"rev:{lat:.{self.coord_digits}f},{lon:.{self.coord_digits}f}"
+    
+    def _set_local(self, key: str, expires_at: float, value: Any):
+        self._local[key] = (expires_at, value)
+        self._local.move_to_end(key)
+        
+        while len(self._local) > self.max_size:
+            self._local.popitem(last=False)
+    
+    async def get(self, key: str) -> Any:
+        """Значение из кэша или MISS"""
+        now = time.time()
+        
+        entry = self._local.get(key)
+        if entry is not None:
+            if entry[0] >= now:
+                self._local.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+            del self._local[key]
+        
+        if self._db is not None:
+            async with self._db.execute(
+                "SELECT value, expires_at FROM geocode_cache WHERE key = ? AND expires_at >= ?", (key, now)
+            ) as cursor:
+                row = await cursor.fetchone()
+            
+            if row is not None:
+                value = json.loads(row[0])
+                self._set_local(key, row[1], value)
+                self.disk_hits += 1
+                return value
+        
+        self.misses += 1
+        return MISS
+    
+    async def set(self, key: str, value: Any):
+        """Сохранить результат (None - "не найдено", хранится negative_ttl_sec)"""
+        expires_at = time.time() + (self.ttl_sec if value is not None else self.negative_ttl_sec)
+        self._set_local(key, expires_at, value)
+        
+        if self._db is not None:
+            await self._db.execute(
+                "INSERT OR REPLACE INTO geocode_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+            await self._db.commit()
+    
+    async def _cached(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = await self.get(key)
+        if value is MISS:
+            # Ошибки запроса не кэшируются - исключение уходит вызывающему
+            value = await fetch()
+            await self.set(key, value)
+        
+        return value
+    
+    async def geocode(self, address: str, fetch: Callable[[], Awaitable[Optional[Tuple[float, float]]]]):
+        """Координаты адреса: из кэша или через fetch"""
+        value = await self._cached(self.forward_key(address), fetch)
+        return tuple(value) if value is not None else None
+    
+    async def reverse(self, lat: float, lon: float, fetch: Callable[[], Awaitable[Optional[str]]]):
+        """Адрес по координатам: из кэша или через fetch"""
+        return await self._cached(self.reverse_key(lat, lon), fetch)
+    
+    async def warm(self, entries: Iterable[Tuple[str, float, float]]) -> int:
+        """Заполнение известными парами адрес-координаты (существующие записи не перезаписываются)"""
+        if self._db is None:
+            return 0
+        
+        expires_at = time.time() + self.ttl_sec
+        rows = []
+        for address, lat, lon in entries:
+            if not address or lat is None or lon is None:
+                continue
+            rows.append((self.forward_key(address), json.dumps([lat, lon]), expires_at))
+            rows.append((self.reverse_key(lat, lon), json.dumps(address, ensure_ascii=False), expires_at))
+        
+        before = self._db.total_changes
+        await self._db.executemany(
+            "INSERT OR IGNORE INTO geocode_cache (key, value, expires_at) VALUES (?, ?, ?)", rows
+        )
+        await self._db.commit()
+        
+        return self._db.total_changes - before
+    
+    def get_stats(self) -> dict:
+        """Счетчики попаданий"""
+        total = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._local),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.memory_hits + self.disk_hits) / total, 3) if total else 0.0
+        }
+
+
+geocode_cache = GeocodeCache(
+    path=settings.GEOCODE_CACHE_PATH,
+    max_size=settings.GEOCODE_CACHE_SIZE,
+    ttl_sec=settings.GEOCODE_CACHE_TTL_SEC,
+    negative_ttl_sec=settings.GEOCODE_CACHE_NEGATIVE_TTL_SEC
+)
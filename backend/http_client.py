@@ -0,0 +1,129 @@
+import asyncio
+from typing import Any, Dict, Hashable, Optional
+import aiohttp
+
+from config import settings
+from resilience import UpstreamGuard
+
+
+class HttpClient:
+    """Общий HTTP-клиент для внешних API.
+    
+    Одна сессия на процесс: keep-alive пул соединений и кэш DNS вместо нового TCP/TLS
+    на каждый запрос. Одинаковые запросы, идущие одновременно, объединяются в один,
+    число одновременных запросов наружу ограничено.
+    """
+    
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        dns_ttl_sec: int = 300,
+        keepalive_sec: float = 30,
+        timeout_sec: float = 5,
+        max_concurrency: int = 20
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl_sec = dns_ttl_sec
+        self.keepalive_sec = keepalive_sec
+        self.timeout_sec = timeout_sec
+        
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # ключ запроса -> задача, результат которой ждут все одинаковые запросы
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        
+        self.requests = 0
+        self.coalesced = 0
+        self.errors = 0
+    
+    async def start(self):
+        """Создание сессии"""
+        if self._session is not None and not self._session.closed:
+            return
+        
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_ttl_sec,
+            keepalive_timeout=self.keepalive_sec
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout_sec)
+        )
+    
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+    
+    async def _fetch_json(self, url: str, params: Optional[dict]) -> Any:
+        # Сессия создается при первом запросе, если процесс не вызвал start (CLI, скрипты)
+        await self.start()
+        
+        async with self._semaphore:
+            self.requests += 1
+            try:
+                async with self._session.get(url, params=params) as response:
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+            except Exception:
+                self.errors += 1
+                raise
+    
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Ошибку забирает каждый ожидающий; здесь - чтобы не было предупреждения, если ждать уже некому
+        if not task.cancelled():
+            task.exception()
+    
+    async def get_json(
+        self,
+        url: str,
+        params: Optional[dict] = None,
+        key: Optional[Hashable] = None,
+        guard: Optional[UpstreamGuard] = None
+    ) -> Any:
+        """GET с разбором JSON; одновременные запросы с одним ключом выполняются один раз.
+        
+        guard добавляет срок, повторные запросы и предохранитель (повторы не объединяются с исходным).
+        """
+        if key is None:
+            key = (url, tuple(sorted((params or {}).items())))
+        
+        task = self._inflight.get(key)
+        if task is None:
+            if guard is None:
+                request = self._fetch_json(url, params)
+            else:
+                request = guard.call(lambda: self._fetch_json(url, params))
+            
+            task = asyncio.create_task(request)
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.coalesced += 1
+        
+        # shield: отмена одного ожидающего не прерывает запрос для остальных
+        return await asyncio.shield(task)
+    
+    def get_stats(self) -> dict:
+        """Счетчики запросов"""
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "in_flight": len(self._inflight)
+        }
+
+
+http_client = HttpClient(
+    limit=settings.HTTP_POOL_SIZE,
+    limit_per_host=settings.HTTP_POOL_PER_HOST,
+    dns_ttl_sec=settings.HTTP_DNS_TTL_SEC,
+    keepalive_sec=settings.HTTP_KEEPALIVE_SEC,
+    timeout_sec=settings.HTTP_TIMEOUT_SEC,
+    max_concurrency=settings.HTTP_MAX_CONCURRENCY
+)
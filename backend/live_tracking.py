@@ -0,0 +1,88 @@
+import time
+from typing import Dict, Optional, Tuple
+from loguru import logger
+
+from config import settings
+from database import Database
+from websocket_manager import manager
+
+# Статусы, в которых пассажир видит машину на карте
+TRACKED_STATUSES = ('driver_assigned', 'driver_arrived', 'in_progress')
+
+
+class LiveTracker:
+    """Координаты назначенного водителя - пассажиру его заказа, не чаще раза в interval_sec.
+    
+    Кадр с ключом схлопывания: если пассажир не успевает принимать, в очереди остается
+    только последняя точка.
+    """
+    
+    def __init__(self, interval_sec: float = 2.0):
+        self.interval_sec = interval_sec
+        
+        # driver_id -> (order_id, passenger_id) и обратно order_id -> driver_id
+        self._trips: Dict[int, Tuple[int, int]] = {}
+        self._order_driver: Dict[int, int] = {}
+        # driver_id -> время последней отправки по time.monotonic
+        self._sent_at: Dict[int, float] = {}
+        
+        self.forwarded = 0
+        self.throttled = 0
+    
+    def order_status(self, order_id: int, status: str, passenger_id: Optional[int], driver_id: Optional[int]):
+        """Смена статуса заказа: начать или закончить трекинг"""
+        # Прежний водитель заказа (завершение, отмена, переназначение) больше не отслеживается
+        previous = self._order_driver.pop(order_id, None)
+        if previous is not None and previous != driver_id:
+            self._trips.pop(previous, None)
+            self._sent_at.pop(previous, None)
+        
+        if status in TRACKED_STATUSES and driver_id and passenger_id:
+            self._trips[driver_id] = (order_id, passenger_id)
+            self._order_driver[order_id] = driver_id
+        elif driver_id is not None and self._trips.get(driver_id, (None,))[0] == order_id:
+            del self._trips[driver_id]
+            self._sent_at.pop(driver_id, None)
+    
+    async def driver_moved(self, driver_id: int, lat: float, lon: float, heading: Optional[float] = None):
+        """Принятая точка водителя"""
+        trip = self._trips.get(driver_id)
+        if trip is None:
+            return
+        
+        now = time.monotonic()
+        if now - self._sent_at.get(driver_id, 0.0) < self.interval_sec:
+            self.throttled += 1
+            return
+        self._sent_at[driver_id] = now
+        
+        order_id, passenger_id = trip
+        message = {
+            "type": "driver_location",
+            "order_id": order_id,
+            "lat": round(lat, 5),
+            "lon": round(lon, 5)
+        }
+        if heading is not None:
+            message["heading"] = round(heading)
+        
+        await manager.send_personal_message('passengers', passenger_id, message, key=f"driver_location:{order_id}")
+        self.forwarded += 1
+    
+    async def start(self):
+        """Поездки, начатые до запуска процесса"""
+        for trip in await Database.get_active_trips():
+            self.order_status(trip['id'], trip['status'], trip['passenger_id'], trip['driver_id'])
+        
+        logger.info(f"Live tracking started: {len(self._trips)} active trips")
+    
+    def get_stats(self) -> dict:
+        """Отслеживаемые поездки и отправленные точки"""
+        return {
+            "trips": len(self._trips),
+            "forwarded": self.forwarded,
+            "throttled": self.throttled
+        }
+
+
+live_tracker = LiveTracker(interval_sec=settings.LIVE_TRACKING_INTERVAL_SEC)
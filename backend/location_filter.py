@@ -0,0 +1,136 @@
+import math
+import time
+from typing import Dict, NamedTuple, Optional
+
+from config import settings
+
+EARTH_RADIUS_M = 6371000.0
+
+
+class FilterProfile(NamedTuple):
+    """Пороги отсева точек для статуса водителя"""
+    min_distance_m: float
+    max_heading_delta: float
+    heartbeat_sec: float
+
+
+class StoredFix(NamedTuple):
+    lat: float
+    lon: float
+    speed: Optional[float]
+    heading: Optional[float]
+    timestamp: float
+
+
+def parse_profile(value: str) -> FilterProfile:
+    """Профиль из строки вида "min_distance_m:max_heading_delta:heartbeat_sec" """
+    distance, heading, heartbeat = (float(part) for part in value.split(':'))
+    return FilterProfile(distance, heading, heartbeat)
+
+
+class LocationFilter:
+    """Отсев GPS-точек, которые не добавляют информации к последней сохраненной.
+    
+    Точка отбрасывается, если она в пределах порога (или точности GPS) от позиции,
+    предсказанной по последней точке, скорости и курсу, курс почти не изменился
+    и с последней сохраненной точки прошло меньше heartbeat_sec.
+    """
+    
+    def __init__(self, profiles: Dict[str, FilterProfile], default: FilterProfile):
+        self.profiles = profiles
+        self.default = default
+        
+        self._last: Dict[int, StoredFix] = {}
+        
+        self.passed = 0
+        self.dropped = 0
+    
+    def should_store(
+        self,
+        driver_id: int,
+        lat: float,
+        lon: float,
+        status: Optional[str] = None,
+        speed: Optional[float] = None,
+        heading: Optional[float] = None,
+        accuracy: Optional[float] = None
+    ) -> bool:
+        """Нужно ли сохранять точку"""
+        now = time.monotonic()
+        last = self._last.get(driver_id)
+        
+        if last is None or self._is_significant(last, lat, lon, heading, accuracy, now, status):
+            self._last[driver_id] = StoredFix(lat, lon, speed, heading, now)
+            self.passed += 1
+            return True
+        
+        self.dropped += 1
+        return False
+    
+    def _is_significant(
+        self,
+        last: StoredFix,
+        lat: float,
+        lon: float,
+        heading: Optional[float],
+        accuracy: Optional[float],
+        now: float,
+        status: Optional[str]
+    ) -> bool:
+        profile = self.profiles.get(status, self.default)
+        elapsed = now - last.timestamp
+        
+        if elapsed >= profile.heartbeat_sec:
+            return True
+        
+        # Счисление пути: где водитель должен быть, если едет с прежней скоростью и курсом (speed в м/с)
+        expected_lat, expected_lon = last.lat, last.lon
+        if last.speed and last.heading is not None:
+            expected_lat, expected_lon = _move(last.lat, last.lon, last.heading, last.speed * elapsed)
+        
+        threshold = max(profile.min_distance_m, accuracy or 0.0)
+        if _distance_m(expected_lat, expected_lon, lat, lon) > threshold:
+            return True
+        
+        if heading is not None and last.heading is not None:
+            delta = abs(heading - last.heading) % 360
+            if min(delta, 360 - delta) > profile.max_heading_delta:
+                return True
+        
+        return False
+    
+    def forget(self, driver_id: int):
+        """Сбросить последнюю точку водителя (следующая будет сохранена)"""
+        self._last.pop(driver_id, None)
+    
+    def get_stats(self) -> dict:
+        """Статистика отсева"""
+        total = self.passed + self.dropped
+        return {
+            "passed": self.passed,
+            "dropped": self.dropped,
+            "drop_ratio": round(self.dropped / total, 3) if total else 0.0
+        }
+
+
+def _distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    # Равнопромежуточное приближение - точности хватает на расстояниях в сотни метров
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_M * math.hypot(x, y)
+
+
+def _move(lat: float, lon: float, heading: float, distance_m: float):
+    bearing = math.radians(heading)
+    d_lat = distance_m * math.cos(bearing) / EARTH_RADIUS_M
+    d_lon = distance_m * math.sin(bearing) / (EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 0.01))
+    return lat + math.degrees(d_lat), lon + math.degrees(d_lon)
+
+
+location_filter = LocationFilter(
+    profiles={
+        'online': parse_profile(settings.LOCATION_FILTER_ONLINE),
+        'busy': parse_profile(settings.LOCATION_FILTER_BUSY),
+    },
+    default=parse_profile(settings.LOCATION_FILTER_DEFAULT)
+)
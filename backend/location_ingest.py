@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from loguru import logger
+
+from config import settings
+from database import Database
+
+# (driver_id, lat, lon, speed, heading, accuracy, recorded_at)
+LocationRecord = Tuple[int, float, float, Optional[float], Optional[int], Optional[float], datetime]
+
+# Предел колонок speed и accuracy - DECIMAL(5,2): большее значение роняет весь пакет
+DECIMAL_5_2_MAX = 999.99
+
+
+class LocationIngest:
+    """Буфер GPS-точек водителей с пакетной записью в БД через COPY"""
+    
+    def __init__(self, max_queue: int = 50000, flush_interval_ms: int = 250, max_batch: int = 10000):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        
+        self.dropped = 0
+        self.written = 0
+    
+    @staticmethod
+    def _record(
+        driver_id: int,
+        lat: float,
+        lon: float,
+        speed: Optional[float] = None,
+        heading: Optional[float] = None,
+        accuracy: Optional[float] = None
+    ) -> LocationRecord:
+        # Скорость вне диапазона - ошибка датчика (или -1 "неизвестно"), точность хуже предела - ограничиваем
+        speed = float(speed) if speed is not None else None
+        if speed is not None and not 0 <= speed <= DECIMAL_5_2_MAX:
+            speed = None
+        accuracy = min(float(accuracy), DECIMAL_5_2_MAX) if accuracy is not None and accuracy >= 0 else None
+        
+        return (
+            driver_id,
+            float(lat),
+            float(lon),
+            speed,
+            int(heading) if heading is not None else None,
+            accuracy,
+            datetime.now(timezone.utc)
+        )
+    
+    def submit(self, driver_id: int, lat: float, lon: float, **fields) -> bool:
+        """Добавить точку без ожидания. False - очередь переполнена"""
+        try:
+            self._queue.put_nowait(self._record(driver_id, lat, lon, **fields))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+    
+    async def put(self, driver_id: int, lat: float, lon: float, timeout: float = 1.0, **fields) -> bool:
+        """Добавить точку, ожидая место в очереди не дольше timeout (обратное давление на отправителя)"""
+        try:
+            await asyncio.wait_for(self._queue.put(self._record(driver_id, lat, lon, **fields)), timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            return False
+    
+    def start(self):
+        """Запуск фоновой записи"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Остановка с записью оставшихся точек"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        
+        while not self._queue.empty():
+            await self._flush(self._drain())
+    
+    def _drain(self) -> List[LocationRecord]:
+        batch = []
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            
+            while not self._queue.empty():
+                await self._flush(self._drain())
+    
+    async def _flush(self, batch: List[LocationRecord]):
+        if not batch:
+            return
+        
+        try:
+            await Database.write_driver_locations(batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            logger.error(f"Error writing {len(batch)} driver locations: {e}")
+    
+    def get_stats(self) -> dict:
+        """Статистика буфера"""
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped
+        }
+
+location_ingest = LocationIngest(
+    max_queue=settings.LOCATION_INGEST_MAX_QUEUE,
+    flush_interval_ms=settings.LOCATION_INGEST_FLUSH_MS,
+    max_batch=settings.LOCATION_INGEST_MAX_BATCH
+)
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -7,7 +8,21 @@ from loguru import logger
 from datetime import datetime
 from config import settings
 from database import Database
-from websocket_manager import ConnectionManager
+from websocket_manager import manager
+from dispatch import offers, dispatcher
+from dispatch_queue import dispatch_queue
+from driver_index import driver_index
+from location_ingest import location_ingest
+from location_filter import location_filter
+from maintenance import location_maintenance
+from routing import routing_engine
+from route_cache import route_cache
+from address_index import address_index
+from geocode_cache import geocode_cache
+from reference_cache import reference_cache
+from surge import surge_engine
+from live_tracking import live_tracker
+from http_client import http_client
 from api import router as api_router
 
 # Настройка логирования
@@ -29,10 +44,70 @@ async def lifespan(app: FastAPI):
     await Database.initialize()
     logger.info("✅ База данных инициализирована")
     
+    # Тарифы и настройки в памяти, сброс по NOTIFY из БД
+    await reference_cache.start()
+    
+    # Дорожный граф для расчета маршрутов (без него - расчет по прямой)
+    if settings.ROUTING_GRAPH_PATH:
+        try:
+            await asyncio.to_thread(routing_engine.load, settings.ROUTING_GRAPH_PATH)
+        except Exception as e:
+            logger.error(f"Failed to load road graph: {e}")
+    
+    # Общий HTTP-клиент для геокодера и других внешних API
+    await http_client.start()
+    
+    # Кэш геокодирования, прогретый сохраненными адресами пользователей
+    try:
+        await geocode_cache.open()
+        known = await Database.get_known_addresses(settings.GEOCODE_CACHE_WARM_LIMIT)
+        warmed = await geocode_cache.warm((a['address'], a['lat'], a['lon']) for a in known)
+        logger.info(f"Geocode cache warmed with {warmed} entries")
+    except Exception as e:
+        logger.error(f"Geocode cache warm-up failed: {e}")
+    
+    # Локальный обратный геокодер по известным адресам
+    try:
+        await address_index.start(settings.ADDRESS_INDEX_DUMP_PATH or None)
+    except Exception as e:
+        logger.error(f"Failed to load address index: {e}")
+    
+    # Индекс координат водителей и пакетная запись точек; свободные водители идут в расчет спроса
+    driver_index.add_listener(surge_engine.driver_update)
+    await driver_index.start()
+    await surge_engine.start()
+    location_ingest.start()
+    location_maintenance.start()
+    
+    # Шина WebSocket-сообщений: доставка в соединения других воркеров
+    await manager.start()
+    
+    # Координаты водителя пассажиру активного заказа
+    manager.add_order_listener(live_tracker.order_status)
+    await live_tracker.start()
+    
+    # Поиск водителей: глобальный диспетчер или очередь задач поиска
+    if settings.DISPATCH_MODE == 'global':
+        dispatcher.start()
+    else:
+        await dispatch_queue.start()
+    
     yield
     
     # Остановка
     logger.info("=== ОСТАНОВКА BACKEND API ===")
+    await dispatcher.stop()
+    await dispatch_queue.stop()
+    await manager.stop()
+    await driver_index.stop()
+    await surge_engine.stop()
+    await location_ingest.stop()
+    await location_maintenance.stop()
+    await address_index.stop()
+    await reference_cache.stop()
+    await route_cache.close()
+    await geocode_cache.close()
+    await http_client.close()
     await Database.close()
 
 # Создание приложения
@@ -55,9 +130,6 @@ app.add_middleware(
 # Подключение маршрутов
 app.include_router(api_router, prefix="/api")
 
-# Менеджер WebSocket соединений
-manager = ConnectionManager()
-
 @app.get("/")
 async def root():
     """Корневой эндпоинт"""
@@ -88,7 +160,11 @@ async def websocket_endpoint(
     user_id: int
 ):
     """WebSocket эндпоинт для реального времени"""
-    await manager.connect(websocket, user_id, user_type)
+    # Приложение водителя подключается к /ws/driver/{id} - тип приводится к группе соединений
+    user_type = await manager.connect(websocket, user_id, user_type)
+    if user_type is None:
+        return
+    await manager.restore_order_subscriptions(user_type, user_id)
     
     try:
         while True:
@@ -107,29 +183,58 @@ async def websocket_endpoint(
                 # Текстовое сообщение
                 await handle_message(user_id, data)
                 
+            elif data.get("type") in ("subscribe", "unsubscribe") and data.get("order_id"):
+                # Слежение за заказом (диспетчер, администратор, повторное подключение участника)
+                if data["type"] == "subscribe":
+                    await manager.subscribe_to_order(int(data["order_id"]), user_type, user_id)
+                else:
+                    await manager.unsubscribe_from_order(int(data["order_id"]), user_type, user_id)
+                
     except WebSocketDisconnect:
-        manager.disconnect(user_id, user_type)
-        logger.info(f"WebSocket disconnected: {user_type} {user_id}")
+        manager.disconnect(user_id, user_type, websocket)
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        manager.disconnect(user_id, user_type)
+        manager.disconnect(user_id, user_type, websocket)
 
 async def handle_location_update(user_id: int, data: dict):
     """Обработка обновления местоположения"""
     lat = data.get("lat")
     lon = data.get("lon")
     
-    if lat and lon:
-        # Сохраняем в базу данных
-        await Database.update_driver_location(
-            driver_id=user_id,
-            lat=lat,
-            lon=lon,
+    # Нулевые и невозможные координаты - сбой GPS, в индекс и историю их не пускаем
+    if lat and lon and -90 <= lat <= 90 and -180 <= lon <= 180:
+        driver_index.update_position(user_id, lat, lon)
+        
+        # Точку - пассажиру, если водитель везет заказ (частоту ограничивает сам трекер)
+        await live_tracker.driver_moved(user_id, lat, lon, data.get("heading"))
+        
+        # Точки стоящего или едущего прямо водителя в БД не пишем
+        if not location_filter.should_store(
+            user_id,
+            lat,
+            lon,
+            status=driver_index.get_status(user_id),
+            speed=data.get("speed"),
+            heading=data.get("heading"),
+            accuracy=data.get("accuracy")
+        ):
+            return
+        
+        # Сохраняем в базу данных пакетом; при переполненной очереди чтение из сокета притормаживает
+        accepted = await location_ingest.put(
+            user_id,
+            lat,
+            lon,
+            timeout=settings.LOCATION_INGEST_PUT_TIMEOUT_SEC,
             speed=data.get("speed"),
-            heading=data.get("heading")
+            heading=data.get("heading"),
+            accuracy=data.get("accuracy")
         )
         
-        logger.debug(f"Location updated for driver {user_id}: {lat}, {lon}")
+        if accepted:
+            logger.debug(f"Location updated for driver {user_id}: {lat}, {lon}")
+        else:
+            logger.warning(f"Location queue is full, dropped fix from driver {user_id}")
 
 async def handle_order_update(user_id: int, data: dict):
     """Обработка обновления заказа"""
@@ -137,20 +242,45 @@ async def handle_order_update(user_id: int, data: dict):
     status = data.get("status")
     
     if order_id and status:
-        # Обновляем статус заказа
-        await Database.update_order_status(order_id, status)
+        # Отказ водителя от предложенного заказа - статус заказа не меняется
+        if status == 'declined':
+            offers.resolve(order_id, user_id, False)
+            return
+        
+        if status == 'driver_assigned':
+            # Принятие заказа водителем: условный UPDATE работает как захват заказа
+            changes = await Database.assign_driver_to_order(order_id, user_id)
+            if not changes:
+                return
+            offers.assign_order(order_id, user_id)
+            surge_engine.order_closed(order_id)
+            await Database.complete_dispatch_job(order_id)
+            await Database.update_driver_status(user_id, 'busy')
+            driver_index.set_status(user_id, 'busy')
+        else:
+            # Обновляем статус заказа
+            changes = await Database.update_order_status(order_id, status)
+            if not changes:
+                return
+            surge_engine.order_status(order_id, status)
+            
+            if status in ('cancelled', 'failed'):
+                offers.stop_search(order_id)
+                await Database.complete_dispatch_job(order_id)
         
         # Уведомляем другую сторону (пассажира/водителя)
-        await manager.notify_order_update(order_id, status, user_id)
+        await manager.notify_order_update(order_id, status, user_id, changes)
 
 async def handle_message(user_id: int, data: dict):
     """Обработка сообщений"""
     message = data.get("message")
     recipient_id = data.get("recipient_id")
+    recipient_type = data.get("recipient_type", "passengers")
     
-    if message and recipient_id:
-        # Отправляем сообщение получателю
+    if message and recipient_id and recipient_type in manager.active_connections:
+        # Отправляем сообщение получателю (в том числе подключенному к другому воркеру)
         await manager.send_personal_message(
+            recipient_type,
             recipient_id,
             {
                 "type": "message",
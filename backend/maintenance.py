@@ -0,0 +1,56 @@
+import asyncio
+from typing import Optional
+from loguru import logger
+
+from config import settings
+from database import Database
+from speed_profile import speed_profile
+
+
+class LocationHistoryMaintenance:
+    """Фоновое обслуживание истории координат: секции вперед, удаление старых, прореживание"""
+    
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Запуск периодического обслуживания"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    async def run_once(self):
+        """Один проход обслуживания"""
+        # Профиль скоростей пересчитывается отдельной batch-задачей - подхватываем новую версию
+        if speed_profile.reload_if_changed(settings.SPEED_PROFILE_PATH):
+            logger.info("Speed profile reloaded")
+        
+        result = await Database.maintain_driver_locations(
+            days_ahead=settings.LOCATION_PARTITIONS_AHEAD_DAYS,
+            retention_days=settings.LOCATION_RETENTION_DAYS,
+            downsample_after_days=settings.LOCATION_DOWNSAMPLE_AFTER_DAYS
+        )
+        
+        if result and any(result.values()):
+            logger.info(
+                f"driver_locations maintenance: {result['created']} partitions created, "
+                f"{result['dropped']} dropped, {result['downsampled']} downsampled"
+            )
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"driver_locations maintenance failed: {e}")
+            
+            await asyncio.sleep(settings.LOCATION_MAINTENANCE_INTERVAL_SEC)
+
+location_maintenance = LocationHistoryMaintenance()
@@ -0,0 +1,87 @@
+import numpy as np
+from typing import List, Tuple
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+from scipy.spatial import cKDTree
+
+import geo
+
+# Штраф за заказ без водителя в этом тике (больше любого реального ETA)
+UNASSIGNED_COST_SEC = 24 * 3600.0
+
+
+def build_cost_edges(
+    order_coords: np.ndarray,
+    driver_coords: np.ndarray,
+    radius_km: float,
+    max_candidates: int,
+    speed_kmh
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Разреженная матрица стоимости: ETA подачи от k ближайших водителей до каждого заказа.
+    
+    order_coords, driver_coords - массивы (N, 2) из [lat, lon].
+    speed_kmh - одна скорость подачи или массив скоростей для каждого заказа.
+    Возвращает (индексы заказов, индексы водителей, ETA в секундах).
+    """
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0))
+    if len(order_coords) == 0 or len(driver_coords) == 0:
+        return empty
+    
+    ref_lat = float(np.mean(order_coords[:, 0]))
+    tree = cKDTree(geo.project_km(driver_coords[:, 0], driver_coords[:, 1], ref_lat))
+    
+    k = min(max_candidates, len(driver_coords))
+    _, idx = tree.query(
+        geo.project_km(order_coords[:, 0], order_coords[:, 1], ref_lat),
+        k=k,
+        distance_upper_bound=radius_km
+    )
+    idx = idx.reshape(len(order_coords), k)
+    
+    # Водители за пределами радиуса возвращаются с индексом len(driver_coords)
+    rows, slots = np.nonzero(idx < len(driver_coords))
+    cols = idx[rows, slots]
+    if len(rows) == 0:
+        return empty
+    
+    distance_km = geo.haversine_km(
+        order_coords[rows, 0], order_coords[rows, 1],
+        driver_coords[cols, 0], driver_coords[cols, 1]
+    )
+    
+    speed_kmh = np.asarray(speed_kmh, dtype=np.float64)
+    if speed_kmh.ndim:
+        speed_kmh = speed_kmh[rows]
+    
+    return rows.astype(np.int64), cols.astype(np.int64), distance_km / speed_kmh * 3600.0
+
+
+def solve_assignment(
+    rows: np.ndarray,
+    cols: np.ndarray,
+    costs: np.ndarray,
+    n_orders: int,
+    n_drivers: int
+) -> List[Tuple[int, int]]:
+    """Назначение заказов водителям с минимальной суммарной стоимостью.
+    
+    Каждому заказу добавляется фиктивный водитель со штрафом UNASSIGNED_COST_SEC,
+    поэтому полное паросочетание существует всегда, а заказы без кандидатов остаются без назначения.
+    """
+    if len(rows) == 0:
+        return []
+    
+    dummy = np.arange(n_orders, dtype=np.int64)
+    graph = csr_matrix(
+        (
+            # +1 - веса не должны быть нулевыми
+            np.concatenate((costs + 1.0, np.full(n_orders, UNASSIGNED_COST_SEC))),
+            (np.concatenate((rows, dummy)), np.concatenate((cols, n_drivers + dummy)))
+        ),
+        shape=(n_orders, n_drivers + n_orders)
+    )
+    
+    order_idx, driver_idx = min_weight_full_bipartite_matching(graph)
+    assigned = driver_idx < n_drivers
+    
+    return list(zip(order_idx[assigned].tolist(), driver_idx[assigned].tolist()))
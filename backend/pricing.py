@@ -0,0 +1,110 @@
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+from reference_cache import ReferenceCache, reference_cache
+
+
+def fares(
+    distance_km,
+    duration_minutes,
+    base_fee,
+    per_km,
+    per_minute,
+    min_price,
+    max_price=None,
+    surge=1.0
+) -> np.ndarray:
+    """Стоимость поездки: подача + км + минуты, умноженные на surge, в пределах min/max цены.
+    
+    Все аргументы - числа или массивы одной формы (max_price: None/NaN - без ограничения).
+    """
+    fare = (
+        np.asarray(base_fee, dtype=np.float64)
+        + np.asarray(distance_km, dtype=np.float64) * per_km
+        + np.asarray(duration_minutes, dtype=np.float64) * per_minute
+    ) * surge
+    
+    fare = np.maximum(fare, min_price)
+    if max_price is not None:
+        max_price = np.asarray(max_price, dtype=np.float64)
+        fare = np.where(np.isnan(max_price), fare, np.minimum(fare, max_price))
+    
+    return np.round(fare, 2)
+
+
+class PricingEngine:
+    """Расчет цен по тарифам из кэша справочников без обращения к БД"""
+    
+    def __init__(self, cache: ReferenceCache):
+        self.cache = cache
+        
+        # Колонки тарифов для расчета всех тарифов одним проходом
+        self._source: Optional[List[Dict[str, Any]]] = None
+        self._tariffs: List[Dict[str, Any]] = []
+        self._columns: Dict[str, np.ndarray] = {}
+    
+    def _table(self) -> Dict[str, np.ndarray]:
+        tariffs = self.cache.get_tariffs()
+        
+        # Кэш заменяет список целиком при перезагрузке - достаточно сравнить объект
+        if tariffs is not self._source:
+            def column(name: str, default: float) -> np.ndarray:
+                return np.array(
+                    [default if t.get(name) is None else t[name] for t in tariffs], dtype=np.float64
+                )
+            
+            self._columns = {
+                'base_fee': column('base_fee', 0.0),
+                'per_km_fee': column('per_km_fee', 0.0),
+                'per_minute_fee': column('per_minute_fee', 0.0),
+                'min_price': column('min_price', 0.0),
+                'max_price': column('max_price', np.nan),
+                'surge_multiplier': column('surge_multiplier', 1.0)
+            }
+            self._tariffs = tariffs
+            self._source = tariffs
+        
+        return self._columns
+    
+    def quote(self, distance_km: float, duration_minutes: float, tariff: Dict[str, Any], surge: float = 1.0) -> float:
+        """Цена поездки по одному тарифу"""
+        return float(fares(
+            distance_km,
+            duration_minutes,
+            tariff['base_fee'],
+            tariff['per_km_fee'],
+            tariff['per_minute_fee'],
+            tariff['min_price'],
+            np.nan if tariff.get('max_price') is None else tariff['max_price'],
+            (tariff.get('surge_multiplier') or 1.0) * surge
+        ))
+    
+    def quote_all(self, distance_km: float, duration_minutes: float, surge: float = 1.0) -> List[Dict[str, Any]]:
+        """Цены поездки по всем активным тарифам"""
+        columns = self._table()
+        if not self._tariffs:
+            return []
+        
+        prices = fares(
+            distance_km,
+            duration_minutes,
+            columns['base_fee'],
+            columns['per_km_fee'],
+            columns['per_minute_fee'],
+            columns['min_price'],
+            columns['max_price'],
+            columns['surge_multiplier'] * surge
+        )
+        
+        return [
+            {
+                'tariff_id': tariff['id'],
+                'name': tariff['name'],
+                'icon': tariff.get('icon'),
+                'price': price
+            }
+            for tariff, price in zip(self._tariffs, prices.tolist())
+        ]
+
+
+pricing_engine = PricingEngine(reference_cache)
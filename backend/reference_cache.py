@@ -0,0 +1,159 @@
+import asyncio
+import time
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Set
+import asyncpg
+from loguru import logger
+
+from config import settings
+from database import Database
+
+# Канал pg_notify из триггеров на tariffs и settings (payload - имя таблицы)
+CHANNEL = 'reference_data_changed'
+TABLES = ('tariffs', 'settings')
+
+
+class ReferenceCache:
+    """Тарифы и системные настройки в памяти процесса.
+    
+    Загружаются при старте и перечитываются по уведомлению из триггера в БД (LISTEN/NOTIFY),
+    поэтому изменение тарифа сразу видно всем процессам. Периодическая перезагрузка -
+    страховка на случай потерянного соединения для LISTEN.
+    """
+    
+    def __init__(self, refresh_sec: int = 300):
+        self.refresh_sec = refresh_sec
+        
+        self._tariffs: List[Dict[str, Any]] = []
+        self._tariffs_by_id: Dict[int, Dict[str, Any]] = {}
+        self._tariffs_by_name: Dict[str, Dict[str, Any]] = {}
+        self._settings: Dict[str, Any] = {}
+        
+        self._listener: Optional[asyncpg.Connection] = None
+        self._changed = asyncio.Event()
+        self._pending: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        
+        self.ready = False
+        self.reloads = 0
+        self.notifications = 0
+        self.loaded_at: Optional[float] = None
+    
+    # === ЧТЕНИЕ ===
+    
+    def get_tariffs(self) -> List[Dict[str, Any]]:
+        """Активные тарифы (по возрастанию base_fee)"""
+        return self._tariffs
+    
+    def get_tariff(self, tariff_id: int) -> Optional[Dict[str, Any]]:
+        """Активный тариф по id"""
+        return self._tariffs_by_id.get(tariff_id)
+    
+    def get_tariff_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """Активный тариф по названию (без учета регистра)"""
+        return self._tariffs_by_name.get(name.lower())
+    
+    def get_setting(self, key: str, default: Any = None) -> Any:
+        """Значение из таблицы settings"""
+        return self._settings.get(key, default)
+    
+    # === ЗАГРУЗКА ===
+    
+    async def load(self, tables: Iterable[str] = TABLES):
+        """Перечитать указанные справочники из БД"""
+        tables = set(tables)
+        
+        if 'tariffs' in tables:
+            tariffs = [
+                {k: float(v) if isinstance(v, Decimal) else v for k, v in tariff.items()}
+                for tariff in await Database.get_tariffs()
+            ]
+            # Сбой чтения - исключение (кэш остается прежним), пустой список - все тарифы отключены
+            self._tariffs = tariffs
+            self._tariffs_by_id = {t['id']: t for t in tariffs}
+            self._tariffs_by_name = {t['name'].lower(): t for t in tariffs}
+        
+        if 'settings' in tables:
+            self._settings = await Database.get_settings()
+        
+        self.reloads += 1
+        self.loaded_at = time.time()
+        self.ready = True
+    
+    def _on_notify(self, connection, pid: int, channel: str, payload: str):
+        self.notifications += 1
+        self._pending.add(payload if payload in TABLES else 'tariffs')
+        self._changed.set()
+    
+    def _on_listener_lost(self, connection):
+        # Уведомления могли потеряться - перечитываем все после переподключения
+        self._pending.update(TABLES)
+        self._changed.set()
+    
+    async def _ensure_listener(self):
+        if self._listener is not None and not self._listener.is_closed():
+            return
+        
+        self._listener = await Database.listen(CHANNEL, self._on_notify)
+        self._listener.add_termination_listener(self._on_listener_lost)
+    
+    async def start(self):
+        """Первичная загрузка, подписка на изменения"""
+        try:
+            await self.load()
+        except Exception as e:
+            # Фоновый цикл повторит загрузку
+            logger.error(f"Reference data load failed: {e}")
+            self._pending.update(TABLES)
+            self._changed.set()
+        
+        try:
+            await self._ensure_listener()
+        except Exception as e:
+            logger.error(f"Reference data listener failed to start: {e}")
+        
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Reference data loaded: {len(self._tariffs)} tariffs, {len(self._settings)} settings")
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+    
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=self.refresh_sec)
+            except asyncio.TimeoutError:
+                self._pending.update(TABLES)
+            
+            self._changed.clear()
+            tables, self._pending = self._pending, set()
+            
+            try:
+                await self._ensure_listener()
+                await self.load(tables)
+            except Exception as e:
+                logger.error(f"Reference data reload failed: {e}")
+                self._pending.update(tables)
+                await asyncio.sleep(5)
+                self._changed.set()
+    
+    def get_stats(self) -> dict:
+        """Состояние кэша"""
+        return {
+            "tariffs": len(self._tariffs),
+            "settings": len(self._settings),
+            "reloads": self.reloads,
+            "notifications": self.notifications,
+            "listening": self._listener is not None and not self._listener.is_closed(),
+            "loaded_at": self.loaded_at
+        }
+
+
+reference_cache = ReferenceCache(refresh_sec=settings.REFERENCE_CACHE_REFRESH_SEC)
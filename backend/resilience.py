@@ -0,0 +1,218 @@
+import asyncio
+import bisect
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, List, Optional
+
+from config import settings
+
+
+class CircuitOpenError(Exception):
+    """Внешний сервис отключен предохранителем - вызов не выполнялся"""
+
+
+class LatencyHistogram:
+    """Гистограмма задержек по фиксированным корзинам и квантили по последним замерам"""
+    
+    BUCKETS_MS = (25, 50, 100, 200, 400, 800, 1600, 3200)
+    
+    def __init__(self, window: int = 500):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self._recent: deque = deque(maxlen=window)
+    
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+        self._recent.append(ms)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Квантиль в мс по окну последних замеров (None - замеров нет)"""
+        if not self._recent:
+            return None
+        
+        ordered = sorted(self._recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    
+    def __len__(self) -> int:
+        return len(self._recent)
+    
+    def to_dict(self) -> dict:
+        buckets = {f"le_{le}ms": count for le, count in zip(self.BUCKETS_MS, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        
+        quantiles = {f"p{int(q * 100)}_ms": self.quantile(q) for q in (0.5, 0.95, 0.99)}
+        return {"buckets": buckets, **{k: round(v, 1) if v is not None else None for k, v in quantiles.items()}}
+
+
+class CircuitBreaker:
+    """Предохранитель: после failure_threshold ошибок подряд вызовы отклоняются reset_timeout_sec,
+    затем пропускается один пробный вызов
+    """
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout_sec: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_sec = reset_timeout_sec
+        
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+    
+    def allow(self) -> bool:
+        """Можно ли выполнить вызов сейчас"""
+        if self.state == 'closed':
+            return True
+        
+        if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout_sec:
+            self.state = 'half_open'
+        
+        if self.state == 'half_open' and not self._probing:
+            self._probing = True
+            return True
+        
+        return False
+    
+    def release_probe(self):
+        """Пробный вызов отменен без результата"""
+        self._probing = False
+    
+    def record_success(self):
+        self.state = 'closed'
+        self.failures = 0
+        self._probing = False
+    
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+
+
+class UpstreamGuard:
+    """Вызовы внешнего сервиса с общим сроком, хеджированием и предохранителем.
+    
+    Если ответа нет дольше p95 обычной задержки, параллельно отправляется повторный запрос
+    (до max_hedges штук) и берется первый успешный ответ. Ошибка попытки запускает повтор сразу.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        deadline_sec: float = 2.0,
+        max_hedges: int = 1,
+        hedge_min_delay_sec: float = 0.1,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.name = name
+        self.deadline_sec = deadline_sec
+        self.max_hedges = max_hedges
+        self.hedge_min_delay_sec = hedge_min_delay_sec
+        self.breaker = breaker or CircuitBreaker()
+        
+        # Задержка всего вызова и отдельных успешных попыток (для порога хеджирования)
+        self.latency = LatencyHistogram()
+        self.attempt_latency = LatencyHistogram()
+        
+        self.calls = 0
+        self.hedges = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.rejected = 0
+    
+    def hedge_delay(self) -> float:
+        """Через сколько секунд без ответа отправлять повторный запрос"""
+        if len(self.attempt_latency) < 20:
+            return self.deadline_sec / 2
+        
+        p95 = self.attempt_latency.quantile(0.95) / 1000
+        return min(max(p95, self.hedge_min_delay_sec), self.deadline_sec / 2)
+    
+    async def _attempt(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        result = await fn()
+        self.attempt_latency.observe(time.monotonic() - started)
+        return result
+    
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполнить fn с учетом предохранителя, срока и хеджирования"""
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        
+        self.calls += 1
+        started = time.monotonic()
+        deadline = started + self.deadline_sec
+        attempts: List[asyncio.Task] = []
+        next_attempt_at = started
+        last_error: Optional[BaseException] = None
+        
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    self.timeouts += 1
+                    raise asyncio.TimeoutError(f"{self.name} did not respond in {self.deadline_sec}s")
+                
+                if len(attempts) <= self.max_hedges and now >= next_attempt_at:
+                    if attempts:
+                        self.hedges += 1
+                    attempts.append(asyncio.create_task(self._attempt(fn)))
+                    next_attempt_at = now + self.hedge_delay()
+                
+                pending = [task for task in attempts if not task.done()]
+                if not pending:
+                    # Все попытки завершились ошибкой, повторов не осталось
+                    raise last_error
+                
+                wake_at = deadline if len(attempts) > self.max_hedges else min(deadline, next_attempt_at)
+                done, _ = await asyncio.wait(pending, timeout=wake_at - now, return_when=asyncio.FIRST_COMPLETED)
+                
+                for task in done:
+                    if task.exception() is None:
+                        self.latency.observe(time.monotonic() - started)
+                        self.breaker.record_success()
+                        return task.result()
+                    
+                    last_error = task.exception()
+                    next_attempt_at = time.monotonic()
+        except asyncio.CancelledError:
+            # Вызывающий отменил запрос - это не сбой сервиса
+            self.breaker.release_probe()
+            raise
+        except Exception:
+            self.failures += 1
+            self.breaker.record_failure()
+            raise
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+                    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    
+    def get_stats(self) -> dict:
+        """Состояние предохранителя, счетчики и задержки"""
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+            "latency": self.latency.to_dict()
+        }
+
+
+geocoder_guard = UpstreamGuard(
+    name="geocoder",
+    deadline_sec=settings.GEOCODER_DEADLINE_SEC,
+    max_hedges=settings.GEOCODER_MAX_HEDGES,
+    hedge_min_delay_sec=settings.GEOCODER_HEDGE_MIN_DELAY_SEC,
+    breaker=CircuitBreaker(
+        failure_threshold=settings.GEOCODER_BREAKER_FAILURES,
+        reset_timeout_sec=settings.GEOCODER_BREAKER_RESET_SEC
+    )
+)
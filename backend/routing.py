@@ -0,0 +1,449 @@
+"""Маршрутизация по дорожному графу: contraction hierarchies поверх CSR-массивов.
+
+Граф готовится заранее из выгрузки дорожной сети (узлы и ребра в CSV):
+    
+    python routing.py build nodes.csv edges.csv graph.npz
+
+nodes.csv: id,lat,lon
+edges.csv: from,to,length_m,speed_kmh,oneway
+"""
+import csv
+import heapq
+import sys
+import time
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+from scipy.spatial import cKDTree
+
+from config import settings
+import geo
+
+INF = float('inf')
+
+# Пределы поиска свидетелей при контракции: больше - меньше лишних shortcut'ов, но дольше подготовка
+WITNESS_SETTLED_LIMIT = 1000
+WITNESS_HOP_LIMIT = 16
+
+# Скорость на участке от точки до ближайшего узла графа
+ACCESS_SPEED_KMH = 15.0
+
+# Пространство поиска: узел -> (время в секундах, длина в метрах)
+SearchSpace = Dict[int, Tuple[float, float]]
+
+
+# === ПОДГОТОВКА ГРАФА ===
+
+def contract(
+    n_nodes: int,
+    edge_from: np.ndarray,
+    edge_to: np.ndarray,
+    edge_time: np.ndarray,
+    edge_length: np.ndarray
+) -> Tuple[np.ndarray, List[Tuple[int, int, float, float]]]:
+    """Построение иерархии: порядок узлов (rank) и все ребра с shortcut'ами"""
+    out_edges: List[Dict[int, Tuple[float, float]]] = [{} for _ in range(n_nodes)]
+    in_edges: List[Dict[int, Tuple[float, float]]] = [{} for _ in range(n_nodes)]
+    
+    for u, v, t, length in zip(edge_from.tolist(), edge_to.tolist(), edge_time.tolist(), edge_length.tolist()):
+        if u == v:
+            continue
+        # Из параллельных ребер остается самое быстрое
+        if v not in out_edges[u] or t < out_edges[u][v][0]:
+            out_edges[u][v] = (t, length)
+            in_edges[v][u] = (t, length)
+    
+    all_edges = {(u, v): w for u in range(n_nodes) for v, w in out_edges[u].items()}
+    
+    rank = np.full(n_nodes, -1, dtype=np.int64)
+    contracted_neighbors = [0] * n_nodes
+    level = [0] * n_nodes
+    
+    def witness_distances(source: int, skip: int, max_time: float) -> Dict[int, float]:
+        dist = {source: 0.0}
+        hops = {source: 0}
+        heap = [(0.0, source)]
+        settled = 0
+        
+        while heap and settled < WITNESS_SETTLED_LIMIT:
+            d, node = heapq.heappop(heap)
+            if d > dist[node] or d > max_time:
+                continue
+            settled += 1
+            if hops[node] >= WITNESS_HOP_LIMIT:
+                continue
+            
+            for nxt, (t, _) in out_edges[node].items():
+                if nxt == skip:
+                    continue
+                nd = d + t
+                if nd < dist.get(nxt, INF):
+                    dist[nxt] = nd
+                    hops[nxt] = hops[node] + 1
+                    heapq.heappush(heap, (nd, nxt))
+        
+        return dist
+    
+    def shortcuts_for(v: int) -> List[Tuple[int, int, float, float]]:
+        shortcuts = []
+        targets = out_edges[v]
+        if not targets:
+            return shortcuts
+        
+        max_out = max(t for t, _ in targets.values())
+        for u, (t_uv, l_uv) in in_edges[v].items():
+            dist = witness_distances(u, v, t_uv + max_out)
+            for w, (t_vw, l_vw) in targets.items():
+                if w == u:
+                    continue
+                need = t_uv + t_vw
+                # Shortcut нужен, только если нет пути не хуже в обход v
+                if dist.get(w, INF) > need:
+                    shortcuts.append((u, w, need, l_uv + l_vw))
+        
+        return shortcuts
+    
+    def priority(v: int, shortcuts: List[Tuple[int, int, float, float]]) -> int:
+        # Разность ребер (сколько shortcut'ов добавит контракция против удаляемых ребер),
+        # плюс равномерность: соседи уже стянутых узлов и глубина иерархии откладываются
+        edge_difference = len(shortcuts) - len(in_edges[v]) - len(out_edges[v])
+        return 2 * edge_difference + contracted_neighbors[v] + level[v]
+    
+    heap = [(priority(v, shortcuts_for(v)), v) for v in range(n_nodes)]
+    heapq.heapify(heap)
+    
+    order = 0
+    while heap:
+        _, v = heapq.heappop(heap)
+        if rank[v] >= 0:
+            continue
+        
+        # Ленивое обновление: приоритет мог устареть после контракции соседей
+        shortcuts = shortcuts_for(v)
+        current = priority(v, shortcuts)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, v))
+            continue
+        
+        for u, w, t, length in shortcuts:
+            if w not in out_edges[u] or t < out_edges[u][w][0]:
+                out_edges[u][w] = (t, length)
+                in_edges[w][u] = (t, length)
+                if t < all_edges.get((u, w), (INF, 0.0))[0]:
+                    all_edges[(u, w)] = (t, length)
+        
+        for u in in_edges[v]:
+            del out_edges[u][v]
+            contracted_neighbors[u] += 1
+            level[u] = max(level[u], level[v] + 1)
+        for w in out_edges[v]:
+            del in_edges[w][v]
+            contracted_neighbors[w] += 1
+            level[w] = max(level[w], level[v] + 1)
+        out_edges[v].clear()
+        in_edges[v].clear()
+        
+        rank[v] = order
+        order += 1
+    
+    return rank, [(u, v, t, length) for (u, v), (t, length) in all_edges.items()]
+
+
+def _csr(n_nodes: int, sources: np.ndarray, targets: np.ndarray, times: np.ndarray, lengths: np.ndarray):
+    order = np.argsort(sources, kind='stable')
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n_nodes), out=indptr[1:])
+    return indptr, targets[order].astype(np.int32), times[order].astype(np.float32), lengths[order].astype(np.float32)
+
+
+def build_graph(node_lat: np.ndarray, node_lon: np.ndarray, edges: np.ndarray, path: str):
+    """Контракция графа и сохранение в .npz.
+    
+    edges - массив (E, 4): from, to, время в секундах, длина в метрах (направленные ребра).
+    """
+    n_nodes = len(node_lat)
+    rank, all_edges = contract(
+        n_nodes,
+        edges[:, 0].astype(np.int64),
+        edges[:, 1].astype(np.int64),
+        edges[:, 2],
+        edges[:, 3]
+    )
+    
+    ch = np.array(all_edges, dtype=np.float64)
+    u, v = ch[:, 0].astype(np.int64), ch[:, 1].astype(np.int64)
+    
+    # Прямой поиск идет только вверх по иерархии, обратный - вверх по перевернутым ребрам
+    up = rank[v] > rank[u]
+    up_indptr, up_to, up_time, up_len = _csr(n_nodes, u[up], v[up], ch[up, 2], ch[up, 3])
+    down_indptr, down_to, down_time, down_len = _csr(n_nodes, v[~up], u[~up], ch[~up, 2], ch[~up, 3])
+    
+    np.savez_compressed(
+        path,
+        node_lat=node_lat.astype(np.float64),
+        node_lon=node_lon.astype(np.float64),
+        up_indptr=up_indptr, up_to=up_to, up_time=up_time, up_len=up_len,
+        down_indptr=down_indptr, down_to=down_to, down_time=down_time, down_len=down_len
+    )
+
+
+def read_csv_extract(nodes_path: str, edges_path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Чтение выгрузки дорожной сети: координаты узлов и направленные ребра (from, to, время, длина)"""
+    index: Dict[str, int] = {}
+    lats, lons = [], []
+    
+    with open(nodes_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            index[row['id']] = len(lats)
+            lats.append(float(row['lat']))
+            lons.append(float(row['lon']))
+    
+    edges = []
+    with open(edges_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row['from'] not in index or row['to'] not in index:
+                continue
+            
+            u, v = index[row['from']], index[row['to']]
+            length = float(row['length_m'])
+            seconds = length / (float(row['speed_kmh']) / 3.6)
+            
+            edges.append((u, v, seconds, length))
+            if row.get('oneway', '0') not in ('1', 'true', 'yes'):
+                edges.append((v, u, seconds, length))
+    
+    return np.array(lats), np.array(lons), np.array(edges, dtype=np.float64).reshape(-1, 4)
+
+
+# === ЗАПРОСЫ ===
+
+class _Adjacency:
+    """CSR-смежность в виде списков Python: в цикле поиска они быстрее обращений к numpy"""
+    
+    def __init__(self, indptr: np.ndarray, to: np.ndarray, times: np.ndarray, lengths: np.ndarray):
+        self.indptr = indptr.tolist()
+        self.to = to.tolist()
+        self.times = times.tolist()
+        self.lengths = lengths.tolist()
+        
+        # Ребра противоположного направления (в узел сверху) - для stall-on-demand
+        self.opposite: Optional['_Adjacency'] = None
+    
+    def upward_search(self, source: int) -> SearchSpace:
+        """Дейкстра только по ребрам вверх по иерархии (все достижимые узлы)"""
+        indptr, to, times, lengths = self.indptr, self.to, self.times, self.lengths
+        stall_indptr, stall_to, stall_times = self.opposite.indptr, self.opposite.to, self.opposite.times
+        
+        space: SearchSpace = {}
+        best = {source: 0.0}
+        heap = [(0.0, 0.0, source)]
+        
+        while heap:
+            d, length, node = heapq.heappop(heap)
+            if node in space or d > best[node]:
+                continue
+            
+            # Stall-on-demand: если в узел можно прийти быстрее сверху, кратчайший путь
+            # через него не проходит - такой узел не раскрываем
+            stalled = False
+            for i in range(stall_indptr[node], stall_indptr[node + 1]):
+                if best.get(stall_to[i], INF) + stall_times[i] < d:
+                    stalled = True
+                    break
+            if stalled:
+                continue
+            
+            space[node] = (d, length)
+            
+            for i in range(indptr[node], indptr[node + 1]):
+                nxt = to[i]
+                nd = d + times[i]
+                if nd < best.get(nxt, INF):
+                    best[nxt] = nd
+                    heapq.heappush(heap, (nd, length + lengths[i], nxt))
+        
+        return space
+
+
+def _meet(forward: SearchSpace, backward: SearchSpace) -> Tuple[float, float]:
+    """Лучший путь через общий узел двух пространств поиска: (секунды, метры)"""
+    if len(forward) > len(backward):
+        forward, backward = backward, forward
+    
+    best_time, best_length = INF, INF
+    for node, (t1, l1) in forward.items():
+        other = backward.get(node)
+        if other is not None and t1 + other[0] < best_time:
+            best_time, best_length = t1 + other[0], l1 + other[1]
+    
+    return best_time, best_length
+
+
+def _bidirectional(up: _Adjacency, down: _Adjacency, source: int, target: int) -> Tuple[float, float]:
+    """Точка-точка: встречный поиск вверх по иерархии с остановкой, как только
+    минимумы обеих очередей не меньше найденного пути"""
+    sides = (
+        (up, {source: 0.0}, {}, [(0.0, 0.0, source)]),
+        (down, {target: 0.0}, {}, [(0.0, 0.0, target)])
+    )
+    best_time, best_length = INF, INF
+    
+    while True:
+        forward_top = sides[0][3][0][0] if sides[0][3] else INF
+        backward_top = sides[1][3][0][0] if sides[1][3] else INF
+        if min(forward_top, backward_top) >= best_time:
+            return best_time, best_length
+        
+        side = 0 if forward_top <= backward_top else 1
+        adjacency, best, settled, heap = sides[side]
+        other_settled = sides[1 - side][2]
+        
+        d, length, node = heapq.heappop(heap)
+        if node in settled or d > best[node]:
+            continue
+        
+        opposite = adjacency.opposite
+        stalled = False
+        for i in range(opposite.indptr[node], opposite.indptr[node + 1]):
+            if best.get(opposite.to[i], INF) + opposite.times[i] < d:
+                stalled = True
+                break
+        if stalled:
+            continue
+        
+        settled[node] = (d, length)
+        
+        other = other_settled.get(node)
+        if other is not None and d + other[0] < best_time:
+            best_time, best_length = d + other[0], length + other[1]
+        
+        indptr, to, times, lengths = adjacency.indptr, adjacency.to, adjacency.times, adjacency.lengths
+        for i in range(indptr[node], indptr[node + 1]):
+            nxt = to[i]
+            nd = d + times[i]
+            if nd < best.get(nxt, INF):
+                best[nxt] = nd
+                heapq.heappush(heap, (nd, length + lengths[i], nxt))
+
+
+class RoutingEngine:
+    """Время и расстояние по дорогам между координатами (CH-граф из файла)"""
+    
+    def __init__(self, max_snap_km: float = 1.0):
+        self.max_snap_km = max_snap_km
+        
+        self._up: Optional[_Adjacency] = None
+        self._down: Optional[_Adjacency] = None
+        self._tree: Optional[cKDTree] = None
+        self._ref_lat = 0.0
+        
+        self.ready = False
+        self.queries = 0
+        self.deadline_hits = 0
+    
+    def load(self, path: str):
+        """Загрузка подготовленного графа"""
+        started = time.perf_counter()
+        data = np.load(path)
+        
+        self._up = _Adjacency(data['up_indptr'], data['up_to'], data['up_time'], data['up_len'])
+        self._down = _Adjacency(data['down_indptr'], data['down_to'], data['down_time'], data['down_len'])
+        self._up.opposite, self._down.opposite = self._down, self._up
+        
+        node_lat, node_lon = data['node_lat'], data['node_lon']
+        self._ref_lat = float(np.mean(node_lat))
+        self._tree = cKDTree(geo.project_km(node_lat, node_lon, self._ref_lat))
+        
+        self.ready = True
+        logger.info(
+            f"Road graph loaded from {path}: {len(node_lat)} nodes, "
+            f"{len(self._up.to) + len(self._down.to)} edges in {time.perf_counter() - started:.1f}s"
+        )
+    
+    def snap(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """Ближайшие узлы графа и расстояние до них в км (-1, если дальше max_snap_km)"""
+        distance, nodes = self._tree.query(
+            geo.project_km(np.atleast_1d(lats), np.atleast_1d(lons), self._ref_lat),
+            distance_upper_bound=self.max_snap_km
+        )
+        nodes = np.where(np.isfinite(distance), nodes, -1)
+        return nodes.astype(np.int64), distance
+    
+    def pairs(self, src_lats, src_lons, dst_lats, dst_lons, deadline: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Поэлементно для пар точек: (время в секундах, расстояние в км), inf - нет маршрута.
+        
+        deadline (по time.perf_counter) - пары, до которых очередь не дошла к сроку, остаются inf:
+        важные пары стоит передавать первыми.
+        """
+        src_nodes, src_offset = self.snap(src_lats, src_lons)
+        dst_nodes, dst_offset = self.snap(dst_lats, dst_lons)
+        self.queries += len(src_nodes)
+        
+        # Пространства поиска считаются один раз на узел, даже если точек в нем несколько
+        forward: Dict[int, SearchSpace] = {}
+        backward: Dict[int, SearchSpace] = {}
+        
+        seconds = np.full(len(src_nodes), INF)
+        meters = np.full(len(src_nodes), INF)
+        for i, (s, d) in enumerate(zip(src_nodes.tolist(), dst_nodes.tolist())):
+            if s < 0 or d < 0:
+                continue
+            if deadline is not None and time.perf_counter() > deadline:
+                self.deadline_hits += 1
+                break
+            if s == d:
+                seconds[i], meters[i] = 0.0, 0.0
+                continue
+            
+            up = forward.get(s)
+            if up is None:
+                up = forward[s] = self._up.upward_search(s)
+            down = backward.get(d)
+            if down is None:
+                down = backward[d] = self._down.upward_search(d)
+            seconds[i], meters[i] = _meet(up, down)
+        
+        # Подъезд от точки до графа и от графа до точки
+        access_km = src_offset + dst_offset
+        return seconds + access_km / ACCESS_SPEED_KMH * 3600, meters / 1000 + access_km
+    
+    def one_to_many(self, lat: float, lon: float, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """От одной точки до многих"""
+        n = len(lats)
+        return self.pairs(np.full(n, lat), np.full(n, lon), lats, lons)
+    
+    def many_to_one(self, lats, lons, lat: float, lon: float) -> Tuple[np.ndarray, np.ndarray]:
+        """От многих точек до одной (подача водителей к точке посадки)"""
+        n = len(lats)
+        return self.pairs(lats, lons, np.full(n, lat), np.full(n, lon))
+    
+    def route(self, lat1: float, lon1: float, lat2: float, lon2: float) -> Optional[Tuple[float, float]]:
+        """Маршрут между двумя точками: (время в секундах, расстояние в км) или None"""
+        if not self.ready:
+            return None
+        
+        (source, target), offsets = self.snap([lat1, lat2], [lon1, lon2])
+        if source < 0 or target < 0:
+            return None
+        
+        self.queries += 1
+        seconds, meters = _bidirectional(self._up, self._down, int(source), int(target))
+        if seconds == INF:
+            return None
+        
+        access_km = float(offsets[0] + offsets[1])
+        return seconds + access_km / ACCESS_SPEED_KMH * 3600, meters / 1000 + access_km
+
+
+routing_engine = RoutingEngine(max_snap_km=settings.ROUTING_MAX_SNAP_KM)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 5 or sys.argv[1] != 'build':
+        print(__doc__)
+        sys.exit(1)
+    
+    started = time.perf_counter()
+    lats, lons, edges = read_csv_extract(sys.argv[2], sys.argv[3])
+    build_graph(lats, lons, edges, sys.argv[4])
+    print(f"{len(lats)} nodes, {len(edges)} edges contracted in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,245 @@
+"""Профиль скоростей: медианная скорость водителей по клеткам сетки и 15-минутным интервалам суток.
+
+Таблица строится пакетно из driver_locations и хранится как .npy (открывается через memmap)
+с метаданными в .json:
+    
+    python speed_profile.py build
+"""
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+import warnings
+import numpy as np
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo
+from loguru import logger
+
+from config import settings
+from database import Database
+import geo
+
+
+def _paths(base: str) -> Tuple[str, str, str]:
+    return f"{base}.npy", f"{base}.freeflow.npy", f"{base}.json"
+
+
+async def build_profile(
+    base_path: str,
+    days: int = 28,
+    cell_km: float = 1.0,
+    slot_minutes: int = 15,
+    tz: str = "Europe/Moscow",
+    max_cells: int = 250000
+) -> Optional[dict]:
+    """Пересчет профиля по истории координат. None - нет данных"""
+    # Границы по перцентилям: единичные сбойные точки (например, 0,0) не раздувают сетку
+    bounds = await Database.get_driver_locations_bounds(days)
+    if not bounds:
+        return None
+    
+    cell_lat = cell_km / geo.KM_PER_DEGREE
+    mid_lat = (bounds['min_lat'] + bounds['max_lat']) / 2
+    cell_lon = cell_km / (geo.KM_PER_DEGREE * max(math.cos(math.radians(mid_lat)), 0.01))
+    
+    rows = int((bounds['max_lat'] - bounds['min_lat']) / cell_lat) + 1
+    cols = int((bounds['max_lon'] - bounds['min_lon']) / cell_lon) + 1
+    slots = 24 * 60 // slot_minutes
+    
+    if rows * cols > max_cells:
+        raise ValueError(
+            f"Speed profile grid {rows}x{cols} exceeds {max_cells} cells: "
+            f"bounds {bounds} look wrong, check driver_locations or raise SPEED_PROFILE_MAX_CELLS"
+        )
+    
+    cells = await Database.aggregate_driver_speeds(
+        days, bounds['min_lat'], bounds['min_lon'], cell_lat, cell_lon, slot_minutes, tz
+    )
+    
+    # (строка, столбец, будни/выходные, интервал суток), NaN - нет данных
+    speeds = np.full((rows, cols, 2, slots), np.nan, dtype=np.float32)
+    weights = np.zeros((2, slots))
+    weighted = np.zeros((2, slots))
+    
+    for cell in cells:
+        if 0 <= cell['row'] < rows and 0 <= cell['col'] < cols:
+            speeds[cell['row'], cell['col'], cell['weekend'], cell['slot']] = cell['speed_kmh']
+            weights[cell['weekend'], cell['slot']] += cell['samples']
+            weighted[cell['weekend'], cell['slot']] += cell['samples'] * cell['speed_kmh']
+    
+    # Средняя по городу - для клеток без данных в этом интервале
+    with np.errstate(invalid='ignore', divide='ignore'):
+        city = weighted / weights
+    
+    # Скорость свободного движения клетки - для поправки времени по дорожному графу
+    with warnings.catch_warnings():
+        # Клетки без данных дают NaN - это ожидаемо
+        warnings.simplefilter('ignore', RuntimeWarning)
+        freeflow = np.nanpercentile(speeds.reshape(rows, cols, -1), 95, axis=2).astype(np.float32)
+    
+    metadata = {
+        'origin_lat': bounds['min_lat'],
+        'origin_lon': bounds['min_lon'],
+        'cell_lat': cell_lat,
+        'cell_lon': cell_lon,
+        'rows': rows,
+        'cols': cols,
+        'slot_minutes': slot_minutes,
+        'timezone': tz,
+        'city': [[None if np.isnan(v) else round(float(v), 2) for v in day] for day in city],
+        'city_freeflow': float(np.nanpercentile(city, 95)) if np.isfinite(city).any() else None,
+        'days': days,
+        'cells': len(cells),
+        'built_at': datetime.now(timezone.utc).isoformat()
+    }
+    
+    # Запись через временные файлы, чтобы процессы не открыли наполовину записанный профиль
+    speeds_path, freeflow_path, meta_path = _paths(base_path)
+    os.makedirs(os.path.dirname(os.path.abspath(base_path)), exist_ok=True)
+    
+    np.save(speeds_path + '.tmp.npy', speeds)
+    np.save(freeflow_path + '.tmp.npy', freeflow)
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(metadata, f)
+    
+    os.replace(speeds_path + '.tmp.npy', speeds_path)
+    os.replace(freeflow_path + '.tmp.npy', freeflow_path)
+    os.replace(meta_path + '.tmp', meta_path)
+    
+    return metadata
+
+
+class SpeedProfile:
+    """Поиск ожидаемой скорости по координатам и времени без обращения к БД"""
+    
+    def __init__(self, default_speed_kmh: float = geo.AVERAGE_SPEED_KMH):
+        self.default_speed_kmh = default_speed_kmh
+        
+        self._speeds: Optional[np.ndarray] = None
+        self._freeflow: Optional[np.ndarray] = None
+        self._meta: dict = {}
+        self._city: Optional[np.ndarray] = None
+        self._tz = None
+        self._loaded_mtime = 0.0
+        
+        self.ready = False
+    
+    def load(self, base_path: str):
+        """Открытие профиля (таблица скоростей - через memmap)"""
+        speeds_path, freeflow_path, meta_path = _paths(base_path)
+        
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        
+        self._speeds = np.load(speeds_path, mmap_mode='r')
+        self._freeflow = np.load(freeflow_path, mmap_mode='r')
+        self._city = np.array(
+            [[np.nan if v is None else v for v in day] for day in meta['city']], dtype=np.float64
+        )
+        self._tz = ZoneInfo(meta['timezone'])
+        self._meta = meta
+        self._loaded_mtime = os.path.getmtime(meta_path)
+        
+        self.ready = True
+        logger.info(f"Speed profile loaded: {meta['rows']}x{meta['cols']} cells, built {meta['built_at']}")
+    
+    def reload_if_changed(self, base_path: str) -> bool:
+        """Перечитать профиль, если batch-задача его обновила"""
+        meta_path = _paths(base_path)[2]
+        if not os.path.exists(meta_path) or os.path.getmtime(meta_path) <= self._loaded_mtime:
+            return False
+        
+        self.load(base_path)
+        return True
+    
+    def _slot(self, at: Optional[datetime]) -> Tuple[int, int]:
+        local = (at or datetime.now(timezone.utc)).astimezone(self._tz)
+        slot = (local.hour * 60 + local.minute) // self._meta['slot_minutes']
+        return int(local.isoweekday() >= 6), slot
+    
+    def _cells(self, lats, lons) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        meta = self._meta
+        rows = np.floor((geo.as_array(lats) - meta['origin_lat']) / meta['cell_lat']).astype(np.int64)
+        cols = np.floor((geo.as_array(lons) - meta['origin_lon']) / meta['cell_lon']).astype(np.int64)
+        inside = (rows >= 0) & (rows < meta['rows']) & (cols >= 0) & (cols < meta['cols'])
+        return np.atleast_1d(rows), np.atleast_1d(cols), np.atleast_1d(inside)
+    
+    def speeds_kmh(self, lats, lons, at: Optional[datetime] = None) -> np.ndarray:
+        """Ожидаемая скорость в км/ч для точек (клетка -> город в этом интервале -> значение по умолчанию)"""
+        if not self.ready:
+            return np.full(np.size(lats), self.default_speed_kmh)
+        
+        rows, cols, inside = self._cells(lats, lons)
+        speeds = np.full(len(rows), np.nan)
+        
+        day, slot = self._slot(at)
+        speeds[inside] = self._speeds[rows[inside], cols[inside], day, slot]
+        
+        missing = np.isnan(speeds)
+        speeds[missing] = self._city[day, slot]
+        speeds[np.isnan(speeds)] = self.default_speed_kmh
+        
+        return speeds
+    
+    def speed_kmh(self, lat: float, lon: float, at: Optional[datetime] = None) -> float:
+        """Ожидаемая скорость в точке"""
+        return float(self.speeds_kmh(lat, lon, at)[0])
+    
+    def congestion(self, lats, lons, at: Optional[datetime] = None) -> np.ndarray:
+        """Во сколько раз сейчас медленнее свободного движения (не меньше 1)"""
+        speeds = self.speeds_kmh(lats, lons, at)
+        if not self.ready:
+            return np.ones(len(speeds))
+        
+        rows, cols, inside = self._cells(lats, lons)
+        freeflow = np.full(len(speeds), self._meta.get('city_freeflow') or np.nan)
+        freeflow[inside] = np.where(
+            np.isnan(self._freeflow[rows[inside], cols[inside]]),
+            freeflow[inside],
+            self._freeflow[rows[inside], cols[inside]]
+        )
+        
+        with np.errstate(invalid='ignore'):
+            return np.where(np.isnan(freeflow), 1.0, np.maximum(freeflow / speeds, 1.0))
+    
+    def traffic_level(self, lat: float, lon: float, at: Optional[datetime] = None) -> float:
+        """Уровень трафика для calculate_eta: средняя городская скорость / ожидаемая"""
+        return geo.AVERAGE_SPEED_KMH / self.speed_kmh(lat, lon, at)
+
+
+speed_profile = SpeedProfile()
+
+
+async def main():
+    await Database.initialize()
+    try:
+        started = time.perf_counter()
+        metadata = await build_profile(
+            settings.SPEED_PROFILE_PATH,
+            days=settings.SPEED_PROFILE_DAYS,
+            cell_km=settings.SPEED_PROFILE_CELL_KM,
+            slot_minutes=settings.SPEED_PROFILE_SLOT_MIN,
+            tz=settings.TIMEZONE,
+            max_cells=settings.SPEED_PROFILE_MAX_CELLS
+        )
+        
+        if metadata is None:
+            print("No driver speeds in the selected period")
+        else:
+            print(
+                f"Speed profile {metadata['rows']}x{metadata['cols']} cells, {metadata['cells']} values "
+                f"written to {settings.SPEED_PROFILE_PATH} in {time.perf_counter() - started:.1f}s"
+            )
+    finally:
+        await Database.close()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['build']:
+        print(__doc__)
+        sys.exit(1)
+    
+    asyncio.run(main())
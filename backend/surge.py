@@ -0,0 +1,254 @@
+import asyncio
+import json
+import math
+import time
+from typing import Dict, Optional, Tuple
+import redis.asyncio as redis
+from loguru import logger
+
+from config import settings
+from database import Database
+import geo
+
+Cell = Tuple[int, int]
+
+# Заказы, которые еще ждут водителя
+OPEN_ORDER_STATUSES = ('created', 'searching_driver')
+
+# Ключ Redis с коэффициентами для бота (bot/surge.py читает тот же формат)
+SURGE_KEY = 'surge:multipliers'
+
+
+class RedisSurgeStore:
+    """Публикация коэффициентов в Redis: бот создает заказы сам и спрос не считает.
+    
+    Ключ живет ttl_sec - если backend перестал пересчитывать, бот возвращается к цене без surge.
+    При нескольких воркерах побеждает последний записавший, их счетчики сходятся через resync.
+    """
+    
+    def __init__(self, host: str, port: int, db: int = 0, password: Optional[str] = None, ttl_sec: int = 60):
+        self._redis = redis.Redis(host=host, port=port, db=db, password=password, socket_timeout=0.2)
+        self.ttl_sec = ttl_sec
+    
+    async def save(self, cell_deg: float, multipliers: Dict[Cell, float]):
+        payload = json.dumps({
+            'cell_deg': cell_deg,
+            'cells': {f"{y}:{x}": value for (y, x), value in multipliers.items()}
+        })
+        await self._redis.set(SURGE_KEY, payload, ex=self.ttl_sec)
+    
+    async def close(self):
+        await self._redis.close()
+
+
+class SurgeEngine:
+    """Повышающий коэффициент по сетке спроса и предложения.
+    
+    Счетчики открытых заказов и свободных водителей по клеткам обновляются на каждое событие
+    за O(1). Коэффициенты пересчитываются раз в tick_sec по окрестности 3x3 клеток
+    и сглаживаются, чтобы цена не скакала от одного заказа.
+    """
+    
+    def __init__(
+        self,
+        cell_km: float = 1.0,
+        tick_sec: float = 10,
+        alpha: float = 0.3,
+        sensitivity: float = 0.5,
+        max_multiplier: float = 3.0,
+        min_orders: int = 2,
+        order_ttl_sec: int = 900,
+        resync_sec: int = 60,
+        store: Optional[RedisSurgeStore] = None
+    ):
+        self.cell_deg = cell_km / geo.KM_PER_DEGREE
+        self.tick_sec = tick_sec
+        self.alpha = alpha
+        self.sensitivity = sensitivity
+        self.max_multiplier = max_multiplier
+        self.min_orders = min_orders
+        self.order_ttl_sec = order_ttl_sec
+        self.resync_sec = resync_sec
+        self.store = store
+        
+        # Свободные водители и открытые заказы по клеткам
+        self._supply: Dict[Cell, int] = {}
+        self._demand: Dict[Cell, int] = {}
+        self._driver_cell: Dict[int, Cell] = {}
+        # order_id -> (клетка, время создания по time.time)
+        self._orders: Dict[int, Tuple[Cell, float]] = {}
+        
+        # Сглаженные коэффициенты (клетки без повышения не хранятся)
+        self._multipliers: Dict[Cell, float] = {}
+        
+        self._task: Optional[asyncio.Task] = None
+        self.events = 0
+        self.ticks = 0
+        self.last_tick_ms = 0.0
+    
+    def _cell(self, lat: float, lon: float) -> Cell:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+    
+    @staticmethod
+    def _add(counts: Dict[Cell, int], cell: Cell, delta: int):
+        value = counts.get(cell, 0) + delta
+        if value > 0:
+            counts[cell] = value
+        else:
+            counts.pop(cell, None)
+    
+    # === СОБЫТИЯ ===
+    
+    def driver_update(self, driver_id: int, lat: Optional[float], lon: Optional[float], available: bool):
+        """Координаты или доступность водителя изменились"""
+        self.events += 1
+        old = self._driver_cell.get(driver_id)
+        new = self._cell(lat, lon) if available and lat is not None else None
+        
+        if old == new:
+            return
+        
+        if old is not None:
+            self._add(self._supply, old, -1)
+            del self._driver_cell[driver_id]
+        
+        if new is not None:
+            self._add(self._supply, new, 1)
+            self._driver_cell[driver_id] = new
+    
+    def order_opened(self, order_id: int, lat: float, lon: float, created_at: Optional[float] = None):
+        """Новый заказ ждет водителя"""
+        self.events += 1
+        if order_id in self._orders:
+            return
+        
+        cell = self._cell(lat, lon)
+        self._orders[order_id] = (cell, time.time() if created_at is None else created_at)
+        self._add(self._demand, cell, 1)
+    
+    def order_closed(self, order_id: int):
+        """Заказ больше не ждет водителя"""
+        self.events += 1
+        entry = self._orders.pop(order_id, None)
+        if entry is not None:
+            self._add(self._demand, entry[0], -1)
+    
+    def order_status(self, order_id: int, status: str):
+        """Смена статуса заказа"""
+        if status not in OPEN_ORDER_STATUSES:
+            self.order_closed(order_id)
+    
+    # === КОЭФФИЦИЕНТЫ ===
+    
+    def multiplier(self, lat: float, lon: float) -> float:
+        """Текущий коэффициент для точки подачи"""
+        return self._multipliers.get(self._cell(lat, lon), 1.0)
+    
+    def _window(self, counts: Dict[Cell, int], cell: Cell) -> int:
+        y, x = cell
+        return sum(counts.get((y + dy, x + dx), 0) for dy in (-1, 0, 1) for dx in (-1, 0, 1))
+    
+    def recompute(self):
+        """Пересчет коэффициентов по текущим счетчикам"""
+        started = time.perf_counter()
+        
+        # Заказы, закрытые мимо событий (другой процесс, сбой), выпадают по сроку
+        expired_before = time.time() - self.order_ttl_sec
+        for order_id in [o for o, (_, created_at) in self._orders.items() if created_at < expired_before]:
+            self.order_closed(order_id)
+        
+        # Коэффициент может измениться в клетках со спросом рядом и в клетках, где он еще не вернулся к 1
+        cells = set(self._multipliers)
+        for y, x in self._demand:
+            cells.update((y + dy, x + dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1))
+        
+        multipliers = {}
+        for cell in cells:
+            demand = self._window(self._demand, cell)
+            supply = self._window(self._supply, cell)
+            
+            target = 1.0
+            if demand >= self.min_orders:
+                target = 1.0 + self.sensitivity * (demand / max(supply, 1) - 1.0)
+                target = min(max(target, 1.0), self.max_multiplier)
+            
+            current = self._multipliers.get(cell, 1.0)
+            value = current + self.alpha * (target - current)
+            if value >= 1.01:
+                multipliers[cell] = round(value, 2)
+        
+        self._multipliers = multipliers
+        self.ticks += 1
+        self.last_tick_ms = (time.perf_counter() - started) * 1000
+    
+    # === ФОНОВЫЙ ПЕРЕСЧЕТ ===
+    
+    async def resync_orders(self):
+        """Открытые заказы из БД (в том числе созданные другими процессами)"""
+        orders = await Database.get_open_order_points()
+        
+        self._orders.clear()
+        self._demand.clear()
+        for order in orders:
+            created_at = order['created_at'].timestamp() if order['created_at'] else None
+            self.order_opened(order['id'], order['lat'], order['lon'], created_at)
+    
+    async def start(self):
+        """Загрузка открытых заказов и периодический пересчет"""
+        await self.resync_orders()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Surge engine started: {len(self._orders)} open orders")
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        
+        if self.store is not None:
+            await self.store.close()
+    
+    async def _run(self):
+        last_resync = time.monotonic()
+        
+        while True:
+            await asyncio.sleep(self.tick_sec)
+            
+            try:
+                if time.monotonic() - last_resync >= self.resync_sec:
+                    await self.resync_orders()
+                    last_resync = time.monotonic()
+                
+                self.recompute()
+                if self.store is not None:
+                    await self.store.save(self.cell_deg, self._multipliers)
+            except Exception as e:
+                logger.error(f"Surge recompute failed: {e}")
+    
+    def get_stats(self) -> dict:
+        """Счетчики и текущие коэффициенты"""
+        return {
+            "open_orders": len(self._orders),
+            "idle_drivers": len(self._driver_cell),
+            "surge_cells": len(self._multipliers),
+            "max_multiplier": max(self._multipliers.values(), default=1.0),
+            "events": self.events,
+            "ticks": self.ticks,
+            "last_tick_ms": round(self.last_tick_ms, 2)
+        }
+
+
+surge_engine = SurgeEngine(
+    cell_km=settings.SURGE_CELL_KM,
+    tick_sec=settings.SURGE_TICK_SEC,
+    alpha=settings.SURGE_ALPHA,
+    sensitivity=settings.SURGE_SENSITIVITY,
+    max_multiplier=settings.SURGE_MAX_MULTIPLIER,
+    min_orders=settings.SURGE_MIN_ORDERS,
+    order_ttl_sec=settings.SURGE_ORDER_TTL_SEC,
+    resync_sec=settings.SURGE_RESYNC_SEC,
+    store=RedisSurgeStore(
+        settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_DB, settings.REDIS_PASSWORD,
+        ttl_sec=max(int(settings.SURGE_TICK_SEC * 6), 60)
+    ) if settings.SURGE_REDIS else None
+)
@@ -0,0 +1,186 @@
+import asyncio
+import itertools
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, UpstreamGuard
+
+
+class Clock:
+    """Подменяемое time.monotonic для предохранителя"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, 'monotonic', clock)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout_sec=30)
+    
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == 'closed' and breaker.allow()
+    
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    
+    assert breaker.state == 'closed'
+
+
+def test_breaker_lets_one_probe_through_after_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_sec=30)
+    breaker.record_failure()
+    
+    clock.now += 29
+    assert not breaker.allow()
+    
+    clock.now += 1
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    assert not breaker.allow()
+    
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
+
+
+def test_failed_probe_reopens_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout_sec=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    
+    breaker.record_failure()
+    
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+
+def test_released_probe_can_be_retried(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_sec=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    
+    breaker.release_probe()
+    
+    assert breaker.state == 'half_open'
+    assert breaker.allow()
+
+
+def scripted(*steps):
+    """fn для UpstreamGuard: каждая попытка берет следующий шаг (задержка, результат или исключение)"""
+    calls = itertools.count()
+    
+    async def fn():
+        delay, outcome = steps[min(next(calls), len(steps) - 1)]
+        await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    
+    return fn
+
+
+def test_guard_returns_first_response():
+    guard = UpstreamGuard('test', deadline_sec=1.0)
+    
+    assert asyncio.run(guard.call(scripted((0, 'ok')))) == 'ok'
+    assert guard.calls == 1 and guard.hedges == 0
+    assert guard.breaker.state == 'closed'
+
+
+def test_guard_hedges_a_slow_attempt():
+    guard = UpstreamGuard('test', deadline_sec=0.4, max_hedges=1)
+    
+    # Без истории задержек повтор уходит через половину срока
+    result = asyncio.run(guard.call(scripted((5, 'slow'), (0, 'hedged'))))
+    
+    assert result == 'hedged'
+    assert guard.hedges == 1
+
+
+def test_guard_retries_failed_attempt_at_once():
+    guard = UpstreamGuard('test', deadline_sec=10.0, max_hedges=1)
+    
+    async def call():
+        started = asyncio.get_running_loop().time()
+        result = await guard.call(scripted((0, ConnectionError('reset')), (0, 'ok')))
+        return result, asyncio.get_running_loop().time() - started
+    
+    result, elapsed = asyncio.run(call())
+    
+    assert result == 'ok'
+    assert elapsed < 1.0
+    assert guard.failures == 0
+
+
+def test_guard_raises_last_error_when_all_attempts_fail():
+    guard = UpstreamGuard('test', deadline_sec=1.0, max_hedges=1)
+    
+    with pytest.raises(ConnectionError):
+        asyncio.run(guard.call(scripted((0, ConnectionError('first')), (0, ConnectionError('second')))))
+    
+    assert guard.failures == 1
+    assert guard.breaker.failures == 1
+
+
+def test_guard_times_out_at_deadline():
+    guard = UpstreamGuard('test', deadline_sec=0.2, max_hedges=1)
+    
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(guard.call(scripted((5, 'never'))))
+    
+    assert guard.timeouts == 1
+    assert guard.breaker.failures == 1
+
+
+def test_open_breaker_rejects_without_calling_upstream():
+    guard = UpstreamGuard('test', breaker=CircuitBreaker(failure_threshold=1, reset_timeout_sec=60))
+    guard.breaker.record_failure()
+    called = []
+    
+    async def fn():
+        called.append(True)
+    
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(guard.call(fn))
+    
+    assert not called
+    assert guard.rejected == 1
+
+
+def test_cancelled_probe_is_not_a_failure():
+    guard = UpstreamGuard('test', deadline_sec=5.0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout_sec=0))
+    guard.breaker.record_failure()
+    
+    async def cancel_probe():
+        task = asyncio.create_task(guard.call(scripted((5, 'slow'))))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    
+    asyncio.run(cancel_probe())
+    
+    assert guard.failures == 0
+    assert guard.breaker.state == 'half_open'
+    assert guard.breaker.allow()
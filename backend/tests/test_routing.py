@@ -0,0 +1,112 @@
+import time
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+import geo
+from dispatch import GlobalDispatcher
+from routing import RoutingEngine, build_graph
+
+# Шаг сетки улиц в км
+STEP_KM = 0.2
+
+
+def grid(side: int, seed: int = 1):
+    """Сетка side x side: улицы со случайным временем проезда, часть улиц односторонние"""
+    rng = np.random.default_rng(seed)
+    step = STEP_KM / geo.KM_PER_DEGREE
+    ys, xs = np.divmod(np.arange(side * side), side)
+    node_lat = 55.75 + ys * step
+    node_lon = 37.60 + xs * step / np.cos(np.radians(55.75))
+    
+    edges = []
+    for node in range(side * side):
+        y, x = divmod(node, side)
+        for other in ((node + 1) if x + 1 < side else None, (node + side) if y + 1 < side else None):
+            if other is None:
+                continue
+            seconds = rng.uniform(10, 60)
+            edges.append((node, other, seconds, STEP_KM * 1000))
+            if rng.random() < 0.8:
+                edges.append((other, node, seconds * rng.uniform(0.8, 1.5), STEP_KM * 1000))
+    
+    return node_lat, node_lon, np.array(edges)
+
+
+@pytest.fixture(scope='module')
+def graph(tmp_path_factory):
+    node_lat, node_lon, edges = grid(8)
+    path = str(tmp_path_factory.mktemp('graph') / 'graph.npz')
+    build_graph(node_lat, node_lon, edges, path)
+    
+    engine = RoutingEngine(max_snap_km=0.5)
+    engine.load(path)
+    
+    n = len(node_lat)
+    matrix = csr_matrix((edges[:, 2], (edges[:, 0].astype(int), edges[:, 1].astype(int))), shape=(n, n))
+    return engine, node_lat, node_lon, dijkstra(matrix, directed=True)
+
+
+def test_pairs_match_dijkstra(graph):
+    engine, node_lat, node_lon, expected = graph
+    src, dst = np.meshgrid(np.arange(len(node_lat)), np.arange(len(node_lat)), indexing='ij')
+    src, dst = src.ravel(), dst.ravel()
+    
+    seconds, _ = engine.pairs(node_lat[src], node_lon[src], node_lat[dst], node_lon[dst])
+    
+    reachable = np.isfinite(expected[src, dst])
+    assert np.array_equal(np.isfinite(seconds), reachable)
+    np.testing.assert_allclose(seconds[reachable], expected[src, dst][reachable], rtol=1e-4, atol=0.01)
+
+
+def test_route_matches_pairs(graph):
+    engine, node_lat, node_lon, expected = graph
+    
+    seconds, km = engine.route(node_lat[0], node_lon[0], node_lat[-1], node_lon[-1])
+    
+    assert seconds == pytest.approx(expected[0, -1], rel=1e-4)
+    assert km >= 14 * STEP_KM - 1e-6
+
+
+def test_point_off_graph_is_unreachable(graph):
+    engine, node_lat, node_lon, _ = graph
+    
+    seconds, _ = engine.pairs([node_lat[0]], [node_lon[0]], [node_lat[0] + 1.0], [node_lon[0]])
+    
+    assert not np.isfinite(seconds[0])
+    assert engine.route(node_lat[0], node_lon[0], node_lat[0] + 1.0, node_lon[0]) is None
+
+
+def test_expired_deadline_leaves_pairs_unrouted(graph):
+    engine, node_lat, node_lon, _ = graph
+    hits = engine.deadline_hits
+    
+    seconds, _ = engine.pairs(node_lat[:3], node_lon[:3], node_lat[-3:], node_lon[-3:], deadline=time.perf_counter() - 1)
+    
+    assert not np.isfinite(seconds).any()
+    assert engine.deadline_hits == hits + 1
+
+
+def test_road_costs_route_best_candidates_and_rescale_the_rest(graph, monkeypatch):
+    engine, node_lat, node_lon, expected = graph
+    monkeypatch.setattr('dispatch.routing_engine', engine)
+    monkeypatch.setattr('dispatch.settings.DISPATCH_ROUTED_CANDIDATES', 1)
+    monkeypatch.setattr('dispatch.settings.DISPATCH_ROUTING_BUDGET_MS', 1000)
+    
+    # Два заказа, по два кандидата с маршрутом до заказа; у каждого заказа первым идет более дешевый по прямой
+    orders = [27, 36]
+    drivers = [d for order in orders for d in np.argsort(expected[:, order])[1:3]]
+    order_coords = np.column_stack((node_lat[orders], node_lon[orders]))
+    driver_coords = np.column_stack((node_lat[drivers], node_lon[drivers]))
+    rows = np.array([0, 0, 1, 1])
+    cols = np.array([0, 1, 2, 3])
+    costs = np.array([100.0, 300.0, 150.0, 400.0])
+    
+    result = GlobalDispatcher._road_costs(rows, cols, costs, order_coords, driver_coords)
+    
+    routed = [expected[drivers[0], orders[0]], expected[drivers[2], orders[1]]]
+    assert result[[0, 2]] == pytest.approx(routed, rel=1e-4)
+    ratio = max(np.median(np.array(routed) / costs[[0, 2]]), 1.0)
+    assert result[[1, 3]] == pytest.approx(costs[[1, 3]] * ratio)
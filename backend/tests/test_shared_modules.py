@@ -0,0 +1,26 @@
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+
+# Backend и бот запускаются каждый из своей папки и импортируют config и database по имени,
+# поэтому общие модули лежат копиями в обоих. Правка вносится в обе копии
+SHARED_MODULES = (
+    'address_index',
+    'geo',
+    'geocode_cache',
+    'http_client',
+    'pricing',
+    'reference_cache',
+    'resilience',
+    'route_cache',
+)
+
+
+@pytest.mark.parametrize('module', SHARED_MODULES)
+def test_bot_copy_matches_backend(module):
+    backend = (ROOT / 'backend' / f'{module}.py').read_bytes()
+    bot = (ROOT / 'bot' / f'{module}.py').read_bytes()
+    
+    assert bot == backend, f"bot/{module}.py разошелся с backend/{module}.py"
@@ -0,0 +1,187 @@
+import asyncio
+import json
+
+from websocket_manager import ConnectionManager, order_topic
+
+
+class FakeWebSocket:
+    """Соединение-заглушка: send_text ждет, пока тест не откроет gate"""
+    
+    def __init__(self, open_gate: bool = True, fail: bool = False):
+        self.gate = asyncio.Event()
+        if open_gate:
+            self.gate.set()
+        self.fail = fail
+        self.frames = []
+        self.closed_code = None
+    
+    async def accept(self):
+        pass
+    
+    async def send_text(self, text: str):
+        await self.gate.wait()
+        if self.fail:
+            raise ConnectionResetError("peer gone")
+        self.frames.append(json.loads(text))
+    
+    async def close(self, code: int = 1000):
+        self.closed_code = code
+
+
+async def settle():
+    """Дать задачам отправки и закрытия отработать"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def run(scenario):
+    asyncio.run(scenario())
+
+
+def test_singular_user_type_is_mapped_to_its_group():
+    async def scenario():
+        manager = ConnectionManager()
+        websocket = FakeWebSocket()
+        
+        assert await manager.connect(websocket, 7, 'driver') == 'drivers'
+        await settle()
+        
+        assert 'drivers:7' in manager.active_connections['drivers']
+        assert websocket.frames[0]['type'] == 'connected'
+        
+        manager.disconnect(7, 'driver')
+        assert not manager.active_connections['drivers']
+    
+    run(scenario)
+
+
+def test_unknown_user_type_is_closed_with_policy_violation():
+    async def scenario():
+        manager = ConnectionManager()
+        websocket = FakeWebSocket()
+        
+        assert await manager.connect(websocket, 7, 'courier') is None
+        
+        assert websocket.closed_code == 1008
+        assert not any(manager.active_connections.values())
+        manager.disconnect(7, 'courier')
+    
+    run(scenario)
+
+
+def test_drop_oldest_keeps_newest_frames():
+    async def scenario():
+        manager = ConnectionManager(max_queue=3, overflow_policy='drop_oldest')
+        websocket = FakeWebSocket(open_gate=False)
+        await manager.connect(websocket, 1, 'drivers')
+        # Отправка приветствия висит на закрытом gate, очередь пуста
+        await settle()
+        
+        for i in range(5):
+            await manager.send_personal_message('drivers', 1, {'n': i})
+        
+        connection = manager.active_connections['drivers']['drivers:1']
+        assert connection.queued == 3
+        assert connection.dropped == 2
+        
+        websocket.gate.set()
+        await settle()
+        assert [frame.get('n') for frame in websocket.frames[1:]] == [2, 3, 4]
+    
+    run(scenario)
+
+
+def test_coalesce_replaces_pending_frame_with_same_key():
+    async def scenario():
+        manager = ConnectionManager(max_queue=10, overflow_policy='coalesce')
+        websocket = FakeWebSocket(open_gate=False)
+        await manager.connect(websocket, 1, 'passengers')
+        await settle()
+        
+        await manager.send_personal_message('passengers', 1, {'lat': 1}, key='driver_location:5')
+        await manager.send_personal_message('passengers', 1, {'status': 'driver_arrived'})
+        await manager.send_personal_message('passengers', 1, {'lat': 2}, key='driver_location:5')
+        
+        connection = manager.active_connections['passengers']['passengers:1']
+        assert connection.queued == 2
+        assert connection.coalesced == 1
+        
+        websocket.gate.set()
+        await settle()
+        assert websocket.frames[1:] == [{'lat': 2}, {'status': 'driver_arrived'}]
+    
+    run(scenario)
+
+
+def test_disconnect_policy_evicts_on_overflow():
+    async def scenario():
+        manager = ConnectionManager(max_queue=2, overflow_policy='disconnect')
+        websocket = FakeWebSocket(open_gate=False)
+        await manager.connect(websocket, 1, 'drivers')
+        await manager.subscribe(order_topic(9), 'drivers', 1)
+        await settle()
+        
+        for i in range(3):
+            await manager.send_personal_message('drivers', 1, {'n': i})
+        await settle()
+        
+        assert not manager.active_connections['drivers']
+        assert order_topic(9) not in manager._topics
+        assert manager.evicted == 1
+        assert websocket.closed_code == 1013
+    
+    run(scenario)
+
+
+def test_failed_send_evicts_connection():
+    async def scenario():
+        manager = ConnectionManager()
+        websocket = FakeWebSocket(fail=True)
+        await manager.connect(websocket, 1, 'drivers')
+        await settle()
+        
+        assert not manager.active_connections['drivers']
+        assert websocket.closed_code == 1013
+    
+    run(scenario)
+
+
+def test_watchdog_evicts_stalled_connection():
+    async def scenario():
+        manager = ConnectionManager(send_timeout_sec=0.1)
+        stalled = FakeWebSocket(open_gate=False)
+        healthy = FakeWebSocket()
+        await manager.connect(stalled, 1, 'drivers')
+        await manager.connect(healthy, 2, 'drivers')
+        
+        # Сторож проверяет соединения раз в max(send_timeout_sec / 2, 0.5) с
+        await asyncio.sleep(0.7)
+        await settle()
+        
+        assert list(manager.active_connections['drivers']) == ['drivers:2']
+        assert stalled.closed_code == 1013
+        await manager.stop()
+    
+    run(scenario)
+
+
+def test_reconnect_replaces_connection_and_keeps_topics():
+    async def scenario():
+        manager = ConnectionManager()
+        first, second = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(first, 1, 'passengers')
+        await manager.subscribe_to_order(42, 'passengers', 1)
+        
+        await manager.connect(second, 1, 'passengers')
+        await manager.publish(order_topic(42), {'type': 'order_update', 'order_id': 42})
+        await settle()
+        
+        assert first.closed_code == 1000
+        assert second.frames[-1] == {'type': 'order_update', 'order_id': 42}
+        assert not any(frame.get('type') == 'order_update' for frame in first.frames)
+        
+        # Отключение прежнего сокета не трогает новое соединение
+        manager.disconnect(1, 'passengers', first)
+        assert 'passengers:1' in manager.active_connections['passengers']
+    
+    run(scenario)
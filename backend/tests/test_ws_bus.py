@@ -0,0 +1,140 @@
+import asyncio
+import json
+
+from websocket_manager import ConnectionManager, order_topic
+from ws_bus import MemoryBus
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+        self.closed_code = None
+    
+    async def accept(self):
+        pass
+    
+    async def send_text(self, text: str):
+        self.frames.append(json.loads(text))
+    
+    async def close(self, code: int = 1000):
+        self.closed_code = code
+    
+    def received(self, frame_type: str):
+        return [frame for frame in self.frames if frame.get('type') == frame_type]
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def cluster(scenario):
+    """Два процесса (менеджера) на общей шине в памяти"""
+    async def run():
+        hub = []
+        first, second = ConnectionManager(bus=MemoryBus(hub)), ConnectionManager(bus=MemoryBus(hub))
+        await first.start()
+        await second.start()
+        try:
+            await scenario(first, second)
+        finally:
+            await first.stop()
+            await second.stop()
+    
+    asyncio.run(run())
+
+
+def test_personal_message_reaches_connection_on_other_worker():
+    async def scenario(first, second):
+        websocket = FakeWebSocket()
+        await second.connect(websocket, 5, 'drivers')
+        
+        await first.send_order_to_driver(77, 5, {'id': 77})
+        await settle()
+        
+        assert [frame['order_id'] for frame in websocket.received('new_order')] == [77]
+    
+    cluster(scenario)
+
+
+def test_local_connection_is_not_echoed_back_through_bus():
+    async def scenario(first, second):
+        websocket = FakeWebSocket()
+        await first.connect(websocket, 5, 'drivers')
+        
+        await first.broadcast_to_drivers({'type': 'surge'})
+        await settle()
+        
+        # Свой конверт шина возвращает и первому процессу, он его пропускает
+        assert len(websocket.received('surge')) == 1
+    
+    cluster(scenario)
+
+
+def test_broadcast_reaches_drivers_on_all_workers_except_excluded():
+    async def scenario(first, second):
+        local, remote, excluded = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await first.connect(local, 1, 'drivers')
+        await second.connect(remote, 2, 'drivers')
+        await second.connect(excluded, 3, 'drivers')
+        
+        await first.broadcast_to_drivers({'type': 'surge'}, exclude=[3])
+        await settle()
+        
+        assert len(local.received('surge')) == 1
+        assert len(remote.received('surge')) == 1
+        assert not excluded.received('surge')
+    
+    cluster(scenario)
+
+
+def test_remote_subscription_and_topic_publish():
+    async def scenario(first, second):
+        passenger, driver = FakeWebSocket(), FakeWebSocket()
+        await first.connect(passenger, 1, 'passengers')
+        await second.connect(driver, 2, 'drivers')
+        
+        # Второй процесс подписывает пассажира, чье соединение в первом
+        await second.subscribe_to_order(9, 'passengers', 1)
+        await second.subscribe_to_order(9, 'drivers', 2)
+        assert order_topic(9) in first._topics
+        
+        await second.publish(order_topic(9), {'type': 'order_update', 'order_id': 9}, exclude='drivers:2')
+        await settle()
+        
+        assert len(passenger.received('order_update')) == 1
+        assert not driver.received('order_update')
+    
+    cluster(scenario)
+
+
+def test_closing_topic_drops_subscriptions_on_all_workers():
+    async def scenario(first, second):
+        passenger = FakeWebSocket()
+        await first.connect(passenger, 1, 'passengers')
+        await second.subscribe_to_order(9, 'passengers', 1)
+        
+        await second.publish(order_topic(9), {'type': 'order_update', 'status': 'completed'}, close=True)
+        await second.publish(order_topic(9), {'type': 'order_update', 'status': 'late'})
+        await settle()
+        
+        assert order_topic(9) not in first._topics
+        assert [frame['status'] for frame in passenger.received('order_update')] == ['completed']
+    
+    cluster(scenario)
+
+
+def test_order_listeners_hear_updates_from_other_worker():
+    async def scenario(first, second):
+        heard = []
+        # Слушатели регистрируются в каждом процессе при старте (main.py)
+        first.add_order_listener(lambda *event: None)
+        second.add_order_listener(lambda *event: heard.append(event))
+        # Снимок с тем же водителем: обновление идет дельтой, без запроса в БД
+        first._order_snapshots[9] = {'passenger_id': 1, 'driver_id': 2, 'status': 'accepted'}
+        
+        await first.notify_order_update(9, 'in_progress', 2, changes={'driver_id': 2, 'status': 'in_progress'})
+        
+        assert heard == [(9, 'in_progress', 1, 2)]
+    
+    cluster(scenario)
@@ -1,11 +1,32 @@
 import math
 from datetime import datetime
 from typing import Tuple, Optional
-import aiohttp
 import asyncio
 from loguru import logger
 
 from config import settings
+from address_index import address_index
+from geocode_cache import geocode_cache
+from http_client import http_client
+from resilience import CircuitOpenError, geocoder_guard
+from routing import routing_engine
+from speed_profile import speed_profile
+import geo
+import pricing
+
+async def _yandex_geocode(geocode: str, **params) -> Optional[dict]:
+    """Первый найденный объект геокодера Яндекс.Карт. None - ничего не найдено, сбои - исключения"""
+    url = "https://geocode-maps.yandex.ru/1.x/"
+    params.update({
+        "apikey": settings.YANDEX_GEOCODER_API_KEY,
+        "geocode": geocode,
+        "format": "json",
+        "lang": "ru_RU"
+    })
+    
+    data = await http_client.get_json(url, params=params, guard=geocoder_guard)
+    members = data['response']['GeoObjectCollection']['featureMember']
+    return members[0]['GeoObject'] if members else None
 
 async def geocode_address(address: str) -> Optional[Tuple[float, float]]:
     """Геокодирование адреса с помощью Яндекс.Карт"""
@@ -13,92 +34,85 @@ async def geocode_address(address: str) -> Optional[Tuple[float, float]]:
         logger.warning("Yandex Geocoder API key not set")
         return None
     
-    url = "https://geocode-maps.yandex.ru/1.x/"
-    params = {
-        "apikey": settings.YANDEX_GEOCODER_API_KEY,
-        "geocode": address,
-        "format": "json",
-        "lang": "ru_RU"
-    }
+    async def fetch() -> Optional[Tuple[float, float]]:
+        geo_object = await _yandex_geocode(address)
+        if geo_object is None:
+            return None
+        
+        lon, lat = map(float, geo_object['Point']['pos'].split())
+        return lat, lon
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    # Парсим координаты
-                    try:
-                        pos = data['response']['GeoObjectCollection']['featureMember'][0]['GeoObject']['Point']['pos']
-                        lon, lat = map(float, pos.split())
-                        return lat, lon
-                    except (KeyError, IndexError, ValueError):
-                        logger.error(f"Failed to parse geocoding response: {data}")
-                        return None
-                else:
-                    logger.error(f"Geocoding failed: {response.status}")
-                    return None
+        return await geocode_cache.geocode(address, fetch)
+    except CircuitOpenError:
+        return None
     except Exception as e:
         logger.error(f"Geocoding error: {e}")
         return None
 
 async def reverse_geocode(lat: float, lon: float) -> Optional[str]:
-    """Обратное геокодирование координат в адрес"""
+    """Обратное геокодирование координат в адрес (сначала по известным адресам рядом)"""
+    if address_index.ready:
+        address = address_index.nearest(lat, lon)
+        if address:
+            return address
+    
     if not settings.YANDEX_GEOCODER_API_KEY:
         logger.warning("Yandex Geocoder API key not set")
         return None
     
-    url = "https://geocode-maps.yandex.ru/1.x/"
-    params = {
-        "apikey": settings.YANDEX_GEOCODER_API_KEY,
-        "geocode": f"{lon},{lat}",
-        "format": "json",
-        "lang": "ru_RU",
-        "kind": "house"
-    }
+    async def fetch() -> Optional[str]:
+        geo_object = await _yandex_geocode(f"{lon},{lat}", kind="house")
+        if geo_object is None:
+            return None
+        
+        return geo_object['metaDataProperty']['GeocoderMetaData']['text']
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    try:
-                        address = data['response']['GeoObjectCollection']['featureMember'][0]['GeoObject']['metaDataProperty']['GeocoderMetaData']['text']
-                        return address
-                    except (KeyError, IndexError):
-                        logger.error(f"Failed to parse reverse geocoding response")
-                        return f"{lat:.6f}, {lon:.6f}"
-                else:
-                    logger.error(f"Reverse geocoding failed: {response.status}")
-                    return f"{lat:.6f}, {lon:.6f}"
+        address = await geocode_cache.reverse(lat, lon, fetch)
+    except CircuitOpenError:
+        # Геокодер недоступен - сразу отдаем координаты строкой
+        address = None
     except Exception as e:
         logger.error(f"Reverse geocoding error: {e}")
-        return f"{lat:.6f}, {lon:.6f}"
+        address = None
+    
+    return address or f"{lat:.6f}, {lon:.6f}"
 
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Расчет расстояния между двумя точками в км"""
-    R = 6371.0  # Радиус Земли в км
+    return round(float(geo.haversine_km(lat1, lon1, lat2, lon2)), 2)
+
+def calculate_eta(distance_km: float, traffic_level: float = 1.0) -> int:
+    """Расчет времени прибытия в минутах"""
+    return int(geo.eta_minutes(distance_km, traffic_level))
+
+def calculate_route(
+    lat1: float,
+    lon1: float,
+    lat2: float,
+    lon2: float,
+    traffic_level: Optional[float] = None
+) -> Tuple[float, int]:
+    """Расстояние в км и время в минутах по дорогам (по прямой, если граф не загружен).
     
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
+    Без traffic_level загрузка дорог берется из профиля скоростей для середины маршрута.
+    """
+    route = routing_engine.route(lat1, lon1, lat2, lon2)
+    mid_lat, mid_lon = (lat1 + lat2) / 2, (lon1 + lon2) / 2
     
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
+    if route is None:
+        distance = calculate_distance(lat1, lon1, lat2, lon2)
+        if traffic_level is None:
+            traffic_level = speed_profile.traffic_level(mid_lat, mid_lon) if speed_profile.ready else 1.0
+        return distance, calculate_eta(distance, traffic_level)
     
-    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    # Время по графу - при свободных дорогах, профиль добавляет текущую загрузку
+    if traffic_level is None:
+        traffic_level = float(speed_profile.congestion(mid_lat, mid_lon)[0])
     
-    return round(R * c, 2)
-
-def calculate_eta(distance_km: float, traffic_level: float = 1.0) -> int:
-    """Расчет времени прибытия в минутах"""
-    average_speed_kmh = 40.0 / traffic_level
-    time_hours = distance_km / average_speed_kmh
-    eta_minutes = int(math.ceil(time_hours * 60))
-    return max(3, eta_minutes)
+    seconds, distance = route
+    return round(distance, 2), max(3, int(math.ceil(seconds * traffic_level / 60)))
 
 def format_duration(seconds: int) -> str:
     """Форматирование длительности"""
@@ -125,15 +139,14 @@ def calculate_fare(
     min_price: float = 100.0,
     surge: float = 1.0
 ) -> float:
-    """Расчет стоимости поездки"""
-    fare = base_fee + (distance_km * per_km) + (duration_minutes * per_minute)
-    fare *= surge
-    fare = max(fare, min_price)
-    return math.ceil(fare)
+    """Расчет стоимости поездки (формула движка цен)"""
+    return float(pricing.fares(distance_km, duration_minutes, base_fee, per_km, per_minute, min_price, surge=surge))
 
 async def get_traffic_level(lat: float, lon: float) -> float:
-    """Получить уровень трафика (заглушка)"""
-    # В реальном проекте можно использовать API Яндекс.Пробки
+    """Получить уровень трафика (по профилю скоростей, без профиля - по часу суток)"""
+    if speed_profile.ready:
+        return speed_profile.traffic_level(lat, lon)
+    
     hour = datetime.now().hour
     
     if 7 <= hour < 10 or 17 <= hour < 20:
@@ -1,70 +1,471 @@
-from typing import Dict, List, Optional
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Set
 from fastapi import WebSocket, WebSocketDisconnect
 import json
 from loguru import logger
 import asyncio
+import time
+import uuid
+
+from config import settings
+from ws_bus import MemoryBus, PostgresBus, RedisBus
+
+# Политики переполнения очереди отправки
+OVERFLOW_POLICIES = ('drop_oldest', 'coalesce', 'disconnect')
+
+# Тип пользователя из URL (/ws/driver/5 в приложении водителя) -> группа соединений
+USER_TYPES = {
+    'driver': 'drivers',
+    'drivers': 'drivers',
+    'passenger': 'passengers',
+    'passengers': 'passengers',
+    'admin': 'admins',
+    'admins': 'admins'
+}
+
+# После этих статусов снимок заказа больше не нужен
+FINAL_ORDER_STATUSES = ('completed', 'cancelled', 'failed')
+
+
+def order_topic(order_id: int) -> str:
+    """Тема обновлений заказа"""
+    return f"order:{order_id}"
+
+
+def encode(message: dict) -> str:
+    """JSON-кадр для отправки (даты и Decimal - строкой)"""
+    return json.dumps(message, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+class ClientConnection:
+    """Соединение с очередью исходящих сообщений и своей задачей отправки.
+    
+    Медленный клиент копит очередь только у себя и не задерживает остальных.
+    При переполнении: drop_oldest - выбросить самое старое сообщение, coalesce - заменить
+    ожидающее сообщение с тем же ключом (иначе как drop_oldest), disconnect - отключить клиента.
+    """
+    
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_key: str,
+        max_queue: int = 256,
+        policy: str = 'coalesce',
+        send_timeout_sec: float = 5.0,
+        on_evict: Optional[Callable[['ClientConnection', str], None]] = None
+    ):
+        self.websocket = websocket
+        self.user_key = user_key
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout_sec = send_timeout_sec
+        self.on_evict = on_evict
+        
+        # Элементы очереди - [ключ, текст], чтобы coalesce мог заменить текст на месте
+        self._queue: Deque[list] = deque()
+        self._by_key: Dict[str, list] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+        # Темы, на которые подписано соединение (для отписки при отключении)
+        self.topics: Set[str] = set()
+        # Начало текущей отправки (time.monotonic) - по нему сторож находит зависших клиентов
+        self.sending_since: Optional[float] = None
+        
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+    
+    def start(self):
+        self._task = asyncio.create_task(self._writer())
+    
+    def close(self):
+        """Остановить отправку (соединение закрывает вызывающий)"""
+        self.closed = True
+        if self._task:
+            self._task.cancel()
+            self._task = None
+    
+    def send(self, text: str, key: Optional[str] = None) -> bool:
+        """Поставить кадр в очередь без ожидания сети. False - кадр не принят"""
+        if self.closed:
+            return False
+        
+        if key is not None and self.policy == 'coalesce':
+            entry = self._by_key.get(key)
+            if entry is not None:
+                # Последнее значение побеждает, место в очереди сохраняется
+                entry[1] = text
+                self.coalesced += 1
+                return True
+        
+        if len(self._queue) >= self.max_queue:
+            if self.policy == 'disconnect':
+                self._evict("send queue overflow")
+                return False
+            
+            oldest = self._queue.popleft()
+            if oldest[0] is not None and self._by_key.get(oldest[0]) is oldest:
+                del self._by_key[oldest[0]]
+            self.dropped += 1
+        
+        entry = [key, text]
+        self._queue.append(entry)
+        if key is not None:
+            self._by_key[key] = entry
+        
+        self._wakeup.set()
+        return True
+    
+    def stalled(self, now: float) -> bool:
+        """Кадр отправляется дольше send_timeout_sec"""
+        return self.sending_since is not None and now - self.sending_since > self.send_timeout_sec
+    
+    def _evict(self, reason: str):
+        if self.closed:
+            return
+        
+        self.close()
+        if self.on_evict:
+            self.on_evict(self, reason)
+    
+    async def _writer(self):
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            
+            key, text = entry = self._queue.popleft()
+            if key is not None and self._by_key.get(key) is entry:
+                del self._by_key[key]
+            
+            # Без wait_for: он создает задачу на каждый кадр, срок отправки проверяет сторож менеджера
+            self.sending_since = time.monotonic()
+            try:
+                await self.websocket.send_text(text)
+                self.sent += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._task = None
+                self._evict(f"send failed: {e!r}")
+                return
+            finally:
+                self.sending_since = None
+    
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
 
 class ConnectionManager:
-    """Менеджер WebSocket соединений"""
+    """Менеджер WebSocket соединений.
+    
+    Сообщение пользователю, чье соединение в другом процессе, уходит через шину (bus),
+    и его доставляет тот процесс, который держит соединение. Рассылки идут
+    в свои соединения и в шину - так можно запускать несколько воркеров.
+    """
     
-    def __init__(self):
+    def __init__(
+        self,
+        max_queue: int = 256,
+        overflow_policy: str = 'coalesce',
+        send_timeout_sec: float = 5.0,
+        bus=None,
+        order_snapshot_limit: int = 10000
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.send_timeout_sec = send_timeout_sec
+        self.bus = bus if bus is not None else MemoryBus()
+        # Свои сообщения, вернувшиеся из шины, пропускаем
+        self.worker_id = uuid.uuid4().hex[:12]
+        
         # Словарь для хранения активных соединений
-        self.active_connections: Dict[str, Dict[str, WebSocket]] = {
+        self.active_connections: Dict[str, Dict[str, ClientConnection]] = {
             'drivers': {},
             'passengers': {},
             'admins': {}
         }
         
-        # Словарь для подписок на обновления заказов
-        self.order_subscriptions: Dict[int, List[str]] = {}
+        # Подписчики тем этого процесса: тема -> соединения
+        self._topics: Dict[str, Set[ClientConnection]] = {}
+        
+        # Последнее отправленное состояние активных заказов - уведомления несут только отличия от него
+        self.order_snapshot_limit = order_snapshot_limit
+        self._order_snapshots: OrderedDict = OrderedDict()
+        self.full_updates = 0
+        self.delta_updates = 0
+        # Подписчики смены статусов заказов во всех процессах: (order_id, status, passenger_id, driver_id)
+        self._order_listeners: List[Callable[[int, str, Optional[int], Optional[int]], None]] = []
+        
+        self._watchdog: Optional[asyncio.Task] = None
+        self.evicted = 0
+        self.published = 0
+        self.received = 0
+        self.bus_errors = 0
     
-    async def connect(self, websocket: WebSocket, user_id: int, user_type: str):
-        """Подключение пользователя"""
+    def add_order_listener(self, listener: Callable[[int, str, Optional[int], Optional[int]], None]):
+        """Подписаться на смену статусов заказов (в том числе из других процессов)"""
+        self._order_listeners.append(listener)
+    
+    def _emit_order(self, order_id: int, status: str, passenger_id: Optional[int], driver_id: Optional[int]):
+        for listener in self._order_listeners:
+            try:
+                listener(order_id, status, passenger_id, driver_id)
+            except Exception as e:
+                logger.error(f"Order listener failed: {e}")
+    
+    async def start(self):
+        """Подписка на шину"""
+        await self.bus.start(self._on_bus_message)
+        logger.info(f"WebSocket bus started: {type(self.bus).__name__}, worker {self.worker_id}")
+    
+    async def stop(self):
+        await self.bus.stop()
+        
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            await asyncio.gather(self._watchdog, return_exceptions=True)
+            self._watchdog = None
+        
+        for connections in self.active_connections.values():
+            for connection in connections.values():
+                connection.close()
+    
+    async def connect(self, websocket: WebSocket, user_id: int, user_type: str) -> Optional[str]:
+        """Подключение пользователя (возвращает группу соединений, None - неизвестный тип)"""
         await websocket.accept()
         
+        user_type = USER_TYPES.get(user_type)
+        if user_type is None:
+            # 1008 - нарушение протокола
+            await self._close_socket(websocket, 1008)
+            return None
+        
         user_key = f"{user_type}:{user_id}"
-        self.active_connections[user_type][user_key] = websocket
+        connection = ClientConnection(
+            websocket,
+            user_key,
+            max_queue=self.max_queue,
+            policy=self.overflow_policy,
+            send_timeout_sec=self.send_timeout_sec,
+            on_evict=self._on_evict
+        )
+        
+        # Повторное подключение того же пользователя заменяет прежнее вместе с подписками
+        previous = self.active_connections[user_type].get(user_key)
+        if previous is not None:
+            topics = list(previous.topics)
+            self._remove(previous)
+            asyncio.create_task(self._close_socket(previous.websocket, 1000))
+            for topic in topics:
+                self._subscribe_local(topic, connection)
+        
+        self.active_connections[user_type][user_key] = connection
+        connection.start()
+        
+        if self._watchdog is None:
+            self._watchdog = asyncio.create_task(self._watch())
         
         logger.info(f"WebSocket connected: {user_type} {user_id}")
         
         # Отправляем приветственное сообщение
-        await websocket.send_json({
+        connection.send(encode({
             "type": "connected",
             "user_id": user_id,
             "user_type": user_type,
             "message": "WebSocket connection established"
-        })
+        }))
+        
+        return user_type
     
-    def disconnect(self, user_id: int, user_type: str):
-        """Отключение пользователя"""
+    def disconnect(self, user_id: int, user_type: str, websocket: Optional[WebSocket] = None):
+        """Отключение пользователя (websocket - только если зарегистрировано именно это соединение)"""
+        user_type = USER_TYPES.get(user_type)
+        if user_type is None:
+            return
+        
         user_key = f"{user_type}:{user_id}"
-        if user_key in self.active_connections[user_type]:
-            del self.active_connections[user_type][user_key]
+        connection = self.active_connections[user_type].get(user_key)
+        
+        if connection is not None and (websocket is None or connection.websocket is websocket):
+            self._remove(connection)
             logger.info(f"WebSocket disconnected: {user_type} {user_id}")
     
-    async def send_personal_message(self, user_type: str, user_id: int, message: dict):
-        """Отправка личного сообщения пользователю"""
-        user_key = f"{user_type}:{user_id}"
-        if user_key in self.active_connections[user_type]:
-            websocket = self.active_connections[user_type][user_key]
-            try:
-                await websocket.send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending message to {user_key}: {e}")
-                self.disconnect(user_id, user_type)
+    def _remove(self, connection: ClientConnection):
+        """Убрать соединение из реестра и из всех тем"""
+        connection.close()
+        
+        user_type = connection.user_key.split(':')[0]
+        if self.active_connections[user_type].get(connection.user_key) is connection:
+            del self.active_connections[user_type][connection.user_key]
+        
+        for topic in list(connection.topics):
+            self._unsubscribe_local(topic, connection)
     
-    async def broadcast_to_drivers(self, message: dict, exclude: Optional[List[int]] = None):
-        """Трансляция сообщения всем водителям"""
-        exclude = exclude or []
+    def _on_evict(self, connection: ClientConnection, reason: str):
+        self._remove(connection)
+        
+        self.evicted += 1
+        logger.warning(f"WebSocket evicted: {connection.user_key} ({reason})")
         
-        for user_key, websocket in self.active_connections['drivers'].items():
-            user_id = int(user_key.split(':')[1])
+        # 1013 - "попробуйте позже": клиент переподключится
+        asyncio.create_task(self._close_socket(connection.websocket, 1013))
+    
+    async def _watch(self):
+        """Отключение клиентов, которые не принимают кадр дольше send_timeout_sec"""
+        while True:
+            await asyncio.sleep(max(self.send_timeout_sec / 2, 0.5))
             
-            if user_id not in exclude:
-                try:
-                    await websocket.send_json(message)
-                except Exception as e:
-                    logger.error(f"Error broadcasting to driver {user_id}: {e}")
+            now = time.monotonic()
+            for connections in self.active_connections.values():
+                for connection in [c for c in connections.values() if c.stalled(now)]:
+                    connection._evict("send timeout")
+    
+    async def _close_socket(self, websocket: WebSocket, code: int):
+        try:
+            await asyncio.wait_for(websocket.close(code=code), self.send_timeout_sec)
+        except Exception:
+            pass
+    
+    # === ШИНА МЕЖДУ ПРОЦЕССАМИ ===
+    
+    async def _publish(self, envelope: dict):
+        envelope['w'] = self.worker_id
+        try:
+            await self.bus.publish(encode(envelope))
+            self.published += 1
+        except Exception as e:
+            self.bus_errors += 1
+            logger.error(f"WebSocket bus publish failed: {e}")
+    
+    async def _on_bus_message(self, payload: str):
+        try:
+            envelope = json.loads(payload)
+        except ValueError:
+            self.bus_errors += 1
+            return
+        
+        if envelope.get('w') == self.worker_id:
+            return
+        
+        self.received += 1
+        if 'to' in envelope:
+            user_type, user_id = envelope['to'].split(':')
+            self._send(user_type, int(user_id), envelope['m'], envelope.get('k'))
+        elif 'all' in envelope:
+            self._broadcast_local(envelope['all'], envelope['m'], envelope.get('x'))
+        elif 'topic' in envelope:
+            self._publish_local(envelope['topic'], envelope['m'], envelope.get('k'), envelope.get('x'))
+            if envelope.get('close'):
+                self._close_topic(envelope['topic'])
+        elif 'sub' in envelope:
+            connection = self._connection(envelope['sub'])
+            if connection is not None:
+                self._subscribe_local(envelope['s'], connection)
+        elif 'unsub' in envelope:
+            connection = self._connection(envelope['unsub'])
+            if connection is not None:
+                self._unsubscribe_local(envelope['s'], connection)
+        elif 'order' in envelope:
+            self._emit_order(envelope['order'], envelope['status'], envelope.get('p'), envelope.get('d'))
+    
+    # === ТЕМЫ ===
+    
+    def _connection(self, user_key: str) -> Optional[ClientConnection]:
+        return self.active_connections[user_key.split(':')[0]].get(user_key)
+    
+    def _subscribe_local(self, topic: str, connection: ClientConnection):
+        self._topics.setdefault(topic, set()).add(connection)
+        connection.topics.add(topic)
+    
+    def _unsubscribe_local(self, topic: str, connection: ClientConnection):
+        connection.topics.discard(topic)
+        subscribers = self._topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self._topics[topic]
+    
+    def _close_topic(self, topic: str):
+        for connection in self._topics.pop(topic, ()):
+            connection.topics.discard(topic)
+    
+    def _publish_local(self, topic: str, text: str, key: Optional[str] = None, exclude: Optional[str] = None):
+        # Копия: при переполнении соединение может быть отключено и убрано из темы
+        for connection in list(self._topics.get(topic, ())):
+            if connection.user_key != exclude:
+                connection.send(text, key)
+    
+    async def subscribe(self, topic: str, user_type: str, user_id: int):
+        """Подписать пользователя на тему (в том процессе, который держит его соединение)"""
+        user_key = f"{user_type}:{user_id}"
+        connection = self._connection(user_key)
+        if connection is not None:
+            self._subscribe_local(topic, connection)
+        else:
+            await self._publish({'sub': user_key, 's': topic})
+    
+    async def unsubscribe(self, topic: str, user_type: str, user_id: int):
+        """Отписать пользователя от темы"""
+        user_key = f"{user_type}:{user_id}"
+        connection = self._connection(user_key)
+        if connection is not None:
+            self._unsubscribe_local(topic, connection)
+        else:
+            await self._publish({'unsub': user_key, 's': topic})
+    
+    async def publish(
+        self,
+        topic: str,
+        message: dict,
+        key: Optional[str] = None,
+        exclude: Optional[str] = None,
+        close: bool = False
+    ):
+        """Сообщение подписчикам темы во всех процессах (exclude - ключ пользователя, close - удалить тему)"""
+        text = encode(message)
+        self._publish_local(topic, text, key, exclude)
+        if close:
+            self._close_topic(topic)
+        
+        await self._publish({'topic': topic, 'm': text, 'k': key, 'x': exclude, 'close': close})
+    
+    # === ОТПРАВКА ===
+    
+    def _send(self, user_type: str, user_id: int, text: str, key: Optional[str] = None) -> bool:
+        connection = self.active_connections[user_type].get(f"{user_type}:{user_id}")
+        return connection.send(text, key) if connection is not None else False
+    
+    async def _route(self, user_type: str, user_id: int, text: str, key: Optional[str] = None):
+        """В свое соединение, если оно здесь, иначе через шину в процесс, который его держит"""
+        if f"{user_type}:{user_id}" in self.active_connections[user_type]:
+            self._send(user_type, user_id, text, key)
+        else:
+            await self._publish({'to': f"{user_type}:{user_id}", 'm': text, 'k': key})
+    
+    def _broadcast_local(self, user_type: str, text: str, exclude: Optional[List[int]] = None):
+        exclude = set(exclude or [])
+        
+        # Копия: соединение может быть отключено во время обхода
+        for user_key, connection in list(self.active_connections[user_type].items()):
+            if not exclude or int(user_key.split(':')[1]) not in exclude:
+                connection.send(text)
+    
+    async def send_personal_message(self, user_type: str, user_id: int, message: dict, key: Optional[str] = None):
+        """Отправка личного сообщения пользователю (key - ключ для схлопывания устаревших сообщений)"""
+        await self._route(user_type, user_id, encode(message), key)
+    
+    async def broadcast_to_drivers(self, message: dict, exclude: Optional[List[int]] = None):
+        """Трансляция сообщения всем водителям: постановка в очереди, без ожидания сети"""
+        text = encode(message)
+        self._broadcast_local('drivers', text, exclude)
+        await self._publish({'all': 'drivers', 'm': text, 'x': list(exclude) if exclude else None})
     
     async def send_order_to_driver(self, order_id: int, driver_id: int, order_data: dict):
         """Отправить заказ конкретному водителю"""
@@ -77,65 +478,152 @@ class ConnectionManager:
         
         await self.send_personal_message('drivers', driver_id, message)
     
-    async def notify_order_update(self, order_id: int, status: str, user_id: int):
-        """Уведомление об обновлении статуса заказа"""
-        # Получаем информацию о заказе
+    async def send_offer_cancel(self, order_id: int, driver_id: int, reason: str):
+        """Отозвать предложение заказа у водителя (reason: taken - принят другим,
+        timeout - время на ответ вышло, cancelled - заказ отменен)"""
+        message = {
+            "type": "offer_cancelled",
+            "order_id": order_id,
+            "reason": reason
+        }
+        
+        await self.send_personal_message('drivers', driver_id, message)
+    
+    async def notify_order_update(self, order_id: int, status: str, user_id: int, changes: Optional[dict] = None):
+        """Уведомление об обновлении статуса заказа (changes - измененные поля из RETURNING)"""
+        # Без снимка клиент знает заказ с момента создания, водителя в нем еще нет
+        snapshot = self._order_snapshots.get(order_id, {})
+        # Участники подписываются на тему заказа, когда процесс впервые видит их в заказе
+        new_participants = not snapshot
+        update = {
+            "type": "order_update",
+            "order_id": order_id,
+            "status": status
+        }
+        
+        if changes is None or changes.get('driver_id') != snapshot.get('driver_id'):
+            # Полный заказ: новый водитель (нужны имя и машина) или нет измененных полей
+            from database import Database
+            order = await Database.get_order_by_id(order_id)
+            
+            if not order:
+                return
+            
+            snapshot = order
+            update["order"] = order
+            new_participants = True
+            self.full_updates += 1
+        else:
+            delta = {k: v for k, v in changes.items() if snapshot.get(k) != v}
+            snapshot.update(delta)
+            update["changes"] = delta
+            self.delta_updates += 1
+        
+        final = status in FINAL_ORDER_STATUSES
+        if final:
+            self._order_snapshots.pop(order_id, None)
+        else:
+            self._order_snapshots[order_id] = snapshot
+            self._order_snapshots.move_to_end(order_id)
+            while len(self._order_snapshots) > self.order_snapshot_limit:
+                self._order_snapshots.popitem(last=False)
+        
+        passenger_id, driver_id = snapshot.get('passenger_id'), snapshot.get('driver_id')
+        self._emit_order(order_id, status, passenger_id, driver_id)
+        if self._order_listeners:
+            await self._publish({'order': order_id, 'status': status, 'p': passenger_id, 'd': driver_id})
+        
+        topic = order_topic(order_id)
+        if new_participants:
+            if snapshot.get('passenger_id'):
+                await self.subscribe(topic, 'passengers', snapshot['passenger_id'])
+            if snapshot.get('driver_id'):
+                await self.subscribe(topic, 'drivers', snapshot['driver_id'])
+        
+        # Пассажиру, водителю и всем, кто следит за заказом, кроме автора изменения; завершенный заказ закрывает тему
+        await self.publish(topic, update, exclude=f"drivers:{user_id}", close=final)
+    
+    async def restore_order_subscriptions(self, user_type: str, user_id: int):
+        """Подписки на темы незавершенных заказов пользователя после подключения.
+        
+        Отключение снимает все подписки, а подписка на тему, пришедшая, пока пользователь
+        был офлайн, теряется - без этого вернувшийся посреди поездки пассажир не получит обновлений.
+        """
         from database import Database
-        order = await Database.get_order_by_id(order_id)
+        try:
+            order_ids = await Database.get_active_order_ids(user_type, user_id)
+        except Exception as e:
+            logger.error(f"Failed to restore order subscriptions for {user_type} {user_id}: {e}")
+            return
         
-        if not order:
+        connection = self._connection(f"{user_type}:{user_id}")
+        if connection is None:
             return
         
-        # Уведомляем пассажира
-        if order.get('passenger_id'):
-            message = {
-                "type": "order_update",
-                "order_id": order_id,
-                "status": status,
-                "order": order
-            }
-            await self.send_personal_message('passengers', order['passenger_id'], message)
-        
-        # Уведомляем водителя
-        if order.get('driver_id') and order['driver_id'] != user_id:
-            message = {
-                "type": "order_update",
-                "order_id": order_id,
-                "status": status,
-                "order": order
-            }
-            await self.send_personal_message('drivers', order['driver_id'], message)
+        for order_id in order_ids:
+            self._subscribe_local(order_topic(order_id), connection)
     
     async def subscribe_to_order(self, order_id: int, user_type: str, user_id: int):
         """Подписка на обновления заказа"""
-        if order_id not in self.order_subscriptions:
-            self.order_subscriptions[order_id] = []
-        
-        user_key = f"{user_type}:{user_id}"
-        if user_key not in self.order_subscriptions[order_id]:
-            self.order_subscriptions[order_id].append(user_key)
+        await self.subscribe(order_topic(order_id), user_type, user_id)
     
     async def unsubscribe_from_order(self, order_id: int, user_type: str, user_id: int):
         """Отписка от обновлений заказа"""
-        if order_id in self.order_subscriptions:
-            user_key = f"{user_type}:{user_id}"
-            if user_key in self.order_subscriptions[order_id]:
-                self.order_subscriptions[order_id].remove(user_key)
+        await self.unsubscribe(order_topic(order_id), user_type, user_id)
     
     def get_online_drivers_count(self) -> int:
         """Получить количество онлайн-водителей"""
         return len(self.active_connections['drivers'])
     
     async def ping_all(self):
-        """Пинг всех подключенных клиентов"""
-        for user_type in self.active_connections:
-            for user_key, websocket in self.active_connections[user_type].items():
-                try:
-                    await websocket.send_json({"type": "ping"})
-                except Exception as e:
-                    logger.error(f"Error pinging {user_key}: {e}")
-                    # Удаляем отключенное соединение
-                    user_id = int(user_key.split(':')[1])
-                    self.disconnect(user_id, user_type.split(':')[0])
-
-manager = ConnectionManager()
\ No newline at end of file
+        """Пинг всех подключенных клиентов (непрочитанный пинг заменяется новым)"""
+        text = encode({"type": "ping"})
+        
+        for connections in self.active_connections.values():
+            for connection in list(connections.values()):
+                connection.send(text, key="ping")
+    
+    def get_stats(self) -> dict:
+        """Соединения и очереди отправки"""
+        connections = [c for group in self.active_connections.values() for c in group.values()]
+        return {
+            "connections": {user_type: len(group) for user_type, group in self.active_connections.items()},
+            "queued": sum(c.queued for c in connections),
+            "max_queued": max((c.queued for c in connections), default=0),
+            "dropped": sum(c.dropped for c in connections),
+            "coalesced": sum(c.coalesced for c in connections),
+            "evicted": self.evicted,
+            "topics": len(self._topics),
+            "subscriptions": sum(len(subscribers) for subscribers in self._topics.values()),
+            "order_snapshots": len(self._order_snapshots),
+            "full_updates": self.full_updates,
+            "delta_updates": self.delta_updates,
+            "worker_id": self.worker_id,
+            "bus": type(self.bus).__name__,
+            "published": self.published,
+            "received": self.received,
+            "bus_errors": self.bus_errors
+        }
+
+
+def create_bus(kind: str):
+    """Шина по имени из настроек: memory (один процесс), postgres, redis"""
+    if kind == 'postgres':
+        return PostgresBus(settings.WS_BUS_CHANNEL)
+    if kind == 'redis':
+        return RedisBus(
+            settings.WS_BUS_CHANNEL,
+            settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_DB, settings.REDIS_PASSWORD
+        )
+    if kind == 'memory':
+        return MemoryBus()
+    raise ValueError(f"Unknown WebSocket bus: {kind}")
+
+
+manager = ConnectionManager(
+    max_queue=settings.WS_SEND_QUEUE_SIZE,
+    overflow_policy=settings.WS_OVERFLOW_POLICY,
+    send_timeout_sec=settings.WS_SEND_TIMEOUT_SEC,
+    bus=create_bus(settings.WS_BUS),
+    order_snapshot_limit=settings.WS_ORDER_SNAPSHOT_LIMIT
+)
@@ -0,0 +1,135 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+import asyncpg
+import redis.asyncio as redis
+from loguru import logger
+
+from database import Database
+
+# Обработчик сообщения шины (payload - строка JSON)
+Handler = Callable[[str], Awaitable[None]]
+
+# Предел размера payload у pg_notify
+PG_NOTIFY_MAX_BYTES = 7900
+
+
+class MemoryBus:
+    """Шина в памяти: один процесс или несколько менеджеров с общим hub (для тестов)"""
+    
+    def __init__(self, hub: Optional[List['MemoryBus']] = None):
+        self.hub = hub if hub is not None else []
+        self._handler: Optional[Handler] = None
+    
+    async def start(self, handler: Handler):
+        self._handler = handler
+        self.hub.append(self)
+    
+    async def stop(self):
+        if self in self.hub:
+            self.hub.remove(self)
+        self._handler = None
+    
+    async def publish(self, payload: str):
+        for bus in list(self.hub):
+            if bus._handler is not None:
+                await bus._handler(payload)
+
+
+class PostgresBus:
+    """Шина через LISTEN/NOTIFY (без дополнительной инфраструктуры, payload до 8 КБ)"""
+    
+    def __init__(self, channel: str, reconnect_sec: float = 1.0):
+        self.channel = channel
+        self.reconnect_sec = reconnect_sec
+        
+        self._handler: Optional[Handler] = None
+        self._listener: Optional[asyncpg.Connection] = None
+        self._lost = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+    
+    def _on_notify(self, connection, pid: int, channel: str, payload: str):
+        asyncio.create_task(self._handler(payload))
+    
+    def _on_listener_lost(self, connection):
+        self._lost.set()
+    
+    async def _connect(self):
+        self._listener = await Database.listen(self.channel, self._on_notify)
+        self._listener.add_termination_listener(self._on_listener_lost)
+    
+    async def start(self, handler: Handler):
+        self._handler = handler
+        await self._connect()
+        self._task = asyncio.create_task(self._reconnect())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+    
+    async def _reconnect(self):
+        while True:
+            await self._lost.wait()
+            self._lost.clear()
+            logger.warning("WebSocket bus listener lost, reconnecting")
+            
+            while True:
+                try:
+                    await self._connect()
+                    break
+                except Exception as e:
+                    logger.error(f"WebSocket bus reconnect failed: {e}")
+                    await asyncio.sleep(self.reconnect_sec)
+    
+    async def publish(self, payload: str):
+        if len(payload.encode()) > PG_NOTIFY_MAX_BYTES:
+            raise ValueError(f"Bus message too large for NOTIFY: {len(payload)} chars")
+        
+        await Database.notify(self.channel, payload)
+
+
+class RedisBus:
+    """Шина через Redis pub/sub"""
+    
+    def __init__(self, channel: str, host: str, port: int, db: int = 0, password: Optional[str] = None, reconnect_sec: float = 1.0):
+        self.channel = channel
+        self.reconnect_sec = reconnect_sec
+        self._redis = redis.Redis(host=host, port=port, db=db, password=password)
+        
+        self._handler: Optional[Handler] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    async def start(self, handler: Handler):
+        self._handler = handler
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        
+        await self._redis.close()
+    
+    async def _run(self):
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    await self._handler(message['data'].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket bus subscription failed: {e}")
+                await asyncio.sleep(self.reconnect_sec)
+            finally:
+                await pubsub.close()
+    
+    async def publish(self, payload: str):
+        await self._redis.publish(self.channel, payload)
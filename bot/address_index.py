@@ -0,0 +1,174 @@
+import asyncio
+import csv
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+
+from config import settings
+from database import Database
+import geo
+
+
+class AddressIndex:
+    """Локальный обратный геокодер: ближайший известный адрес по сетке в памяти процесса.
+    
+    Наполняется сохраненными адресами из user_addresses (и, при наличии, выгрузкой адресов в CSV),
+    затем дополняется новыми адресами из БД без полной перезагрузки. Дополнение перечитывает
+    последние overlap_sec до отметки: строка, закоммиченная позже, чем записано ее время, не теряется.
+    """
+    
+    def __init__(
+        self,
+        radius_m: float = 50,
+        refresh_sec: int = 60,
+        limit: int = 200000,
+        coord_digits: int = 5,
+        overlap_sec: int = 300
+    ):
+        self.radius_km = radius_m / 1000
+        self.refresh_sec = refresh_sec
+        self.overlap = timedelta(seconds=overlap_sec)
+        self.limit = limit
+        self.coord_digits = coord_digits
+        self.cell_deg = self.radius_km / geo.KM_PER_DEGREE
+        
+        # клетка -> {округленные координаты: (lat, lon, адрес)}
+        self._cells: Dict[Tuple[int, int], Dict[Tuple[float, float], Tuple[float, float, str]]] = {}
+        self._size = 0
+        self._watermark: Optional[datetime] = None
+        
+        self._task: Optional[asyncio.Task] = None
+        self.ready = False
+        
+        self.hits = 0
+        self.misses = 0
+    
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+    
+    def add(self, lat: float, lon: float, address: str, replace: bool = True):
+        """Добавить адрес (replace=False - не заменять уже известный адрес этой точки)"""
+        if not address or lat is None or lon is None:
+            return
+        
+        cell = self._cells.setdefault(self._cell(lat, lon), {})
+        key = (round(lat, self.coord_digits), round(lon, self.coord_digits))
+        
+        if key not in cell:
+            self._size += 1
+        elif not replace:
+            return
+        
+        cell[key] = (lat, lon, address)
+    
+    def nearest(self, lat: float, lon: float, radius_km: Optional[float] = None) -> Optional[str]:
+        """Ближайший известный адрес в радиусе (None - такого нет)"""
+        radius_km = self.radius_km if radius_km is None else radius_km
+        cy, cx = self._cell(lat, lon)
+        
+        # Клетки по долготе сужаются по мере удаления от экватора
+        lat_span = int(math.ceil(radius_km / (self.cell_deg * geo.KM_PER_DEGREE)))
+        lon_span = int(math.ceil(lat_span / max(math.cos(math.radians(lat)), 0.01)))
+        
+        candidates: List[Tuple[float, float, str]] = []
+        for y in range(cy - lat_span, cy + lat_span + 1):
+            for x in range(cx - lon_span, cx + lon_span + 1):
+                cell = self._cells.get((y, x))
+                if cell:
+                    candidates.extend(cell.values())
+        
+        if candidates:
+            lats, lons, addresses = zip(*candidates)
+            distances = geo.distances_from(lat, lon, lats, lons)
+            best = int(distances.argmin())
+            
+            if distances[best] <= radius_km:
+                self.hits += 1
+                return addresses[best]
+        
+        self.misses += 1
+        return None
+    
+    def load_dump(self, path: str) -> int:
+        """Импорт выгрузки адресов (CSV с колонками address, lat, lon)"""
+        count = 0
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                try:
+                    self.add(float(row['lat']), float(row['lon']), row['address'], replace=False)
+                    count += 1
+                except (KeyError, TypeError, ValueError):
+                    continue
+        
+        return count
+    
+    def _apply(self, rows: Iterable[dict], replace: bool):
+        for row in rows:
+            self.add(row['lat'], row['lon'], row['address'], replace=replace)
+            if row['used_at'] is not None and (self._watermark is None or row['used_at'] > self._watermark):
+                self._watermark = row['used_at']
+    
+    # === СИНХРОНИЗАЦИЯ С БД ===
+    
+    async def load(self, dump_path: Optional[str] = None):
+        """Первичная загрузка: адреса из БД (новые первыми), затем выгрузка"""
+        rows = await Database.get_known_addresses(self.limit)
+        # Строки идут от новых к старым - у точки остается самый свежий адрес
+        self._apply(rows, replace=False)
+        
+        if dump_path:
+            imported = await asyncio.to_thread(self.load_dump, dump_path)
+            logger.info(f"Address dump imported: {imported} rows from {dump_path}")
+        
+        self.ready = True
+    
+    async def refresh(self) -> int:
+        """Адреса, появившиеся после последней загрузки (с перекрытием overlap)"""
+        since = self._watermark - self.overlap if self._watermark is not None else None
+        rows = await Database.get_known_addresses(self.limit, since=since)
+        # Новые строки перекрывают прежний адрес точки
+        self._apply(reversed(rows), replace=True)
+        return len(rows)
+    
+    async def start(self, dump_path: Optional[str] = None):
+        """Первичная загрузка и периодическое дополнение"""
+        started = time.perf_counter()
+        await self.load(dump_path)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Address index loaded: {self._size} addresses in {time.perf_counter() - started:.1f}s")
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_sec)
+            
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Address index refresh failed: {e}")
+    
+    def get_stats(self) -> dict:
+        """Размер индекса и счетчики попаданий"""
+        total = self.hits + self.misses
+        return {
+            "size": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "watermark": self._watermark.isoformat() if self._watermark else None
+        }
+
+
+address_index = AddressIndex(
+    radius_m=settings.ADDRESS_INDEX_RADIUS_M,
+    refresh_sec=settings.ADDRESS_INDEX_REFRESH_SEC,
+    limit=settings.ADDRESS_INDEX_LIMIT,
+    overlap_sec=settings.ADDRESS_INDEX_REFRESH_OVERLAP_SEC
+)
@@ -56,6 +56,52 @@ class Settings(BaseSettings):
     MAX_ORDER_SEARCH_TIME: int = Field(120, env="MAX_ORDER_SEARCH_TIME")
     DRIVER_RESPONSE_TIMEOUT: int = Field(30, env="DRIVER_RESPONSE_TIMEOUT")
     
+    # === ROUTE CACHE ===
+    ROUTE_CACHE_SIZE: int = Field(10000, env="ROUTE_CACHE_SIZE")
+    ROUTE_CACHE_TTL_SEC: int = Field(1800, env="ROUTE_CACHE_TTL_SEC")
+    ROUTE_CACHE_PRECISION: int = Field(7, env="ROUTE_CACHE_PRECISION")
+    ROUTE_CACHE_BUCKET_MIN: int = Field(15, env="ROUTE_CACHE_BUCKET_MIN")
+    ROUTE_CACHE_REDIS: bool = Field(False, env="ROUTE_CACHE_REDIS")
+    # Бот считает расстояние по прямой, поэтому только читает маршруты по дорогам, посчитанные backend
+    ROUTE_CACHE_PUBLISH: bool = Field(False, env="ROUTE_CACHE_PUBLISH")
+    
+    # === SURGE ===
+    # Коэффициенты публикует backend (SURGE_REDIS=true там же), без них цены бота без surge
+    SURGE_REDIS: bool = Field(False, env="SURGE_REDIS")
+    SURGE_REFRESH_SEC: float = Field(10, env="SURGE_REFRESH_SEC")
+    
+    # === GEOCODE CACHE ===
+    GEOCODE_CACHE_PATH: str = Field("data/geocode_cache.sqlite3", env="GEOCODE_CACHE_PATH")
+    GEOCODE_CACHE_SIZE: int = Field(20000, env="GEOCODE_CACHE_SIZE")
+    GEOCODE_CACHE_TTL_SEC: int = Field(30 * 24 * 3600, env="GEOCODE_CACHE_TTL_SEC")
+    GEOCODE_CACHE_NEGATIVE_TTL_SEC: int = Field(3600, env="GEOCODE_CACHE_NEGATIVE_TTL_SEC")
+    GEOCODE_CACHE_WARM_LIMIT: int = Field(50000, env="GEOCODE_CACHE_WARM_LIMIT")
+    
+    # === HTTP CLIENT ===
+    HTTP_POOL_SIZE: int = Field(100, env="HTTP_POOL_SIZE")
+    HTTP_POOL_PER_HOST: int = Field(20, env="HTTP_POOL_PER_HOST")
+    HTTP_DNS_TTL_SEC: int = Field(300, env="HTTP_DNS_TTL_SEC")
+    HTTP_KEEPALIVE_SEC: float = Field(30, env="HTTP_KEEPALIVE_SEC")
+    HTTP_TIMEOUT_SEC: float = Field(5, env="HTTP_TIMEOUT_SEC")
+    HTTP_MAX_CONCURRENCY: int = Field(20, env="HTTP_MAX_CONCURRENCY")
+    
+    # === REFERENCE CACHE ===
+    REFERENCE_CACHE_REFRESH_SEC: int = Field(300, env="REFERENCE_CACHE_REFRESH_SEC")
+    
+    # === ADDRESS INDEX ===
+    ADDRESS_INDEX_RADIUS_M: float = Field(50, env="ADDRESS_INDEX_RADIUS_M")
+    ADDRESS_INDEX_REFRESH_SEC: int = Field(60, env="ADDRESS_INDEX_REFRESH_SEC")
+    ADDRESS_INDEX_REFRESH_OVERLAP_SEC: int = Field(300, env="ADDRESS_INDEX_REFRESH_OVERLAP_SEC")
+    ADDRESS_INDEX_LIMIT: int = Field(200000, env="ADDRESS_INDEX_LIMIT")
+    ADDRESS_INDEX_DUMP_PATH: str = Field("", env="ADDRESS_INDEX_DUMP_PATH")
+    
+    # === GEOCODER RESILIENCE ===
+    GEOCODER_DEADLINE_SEC: float = Field(2.0, env="GEOCODER_DEADLINE_SEC")
+    GEOCODER_MAX_HEDGES: int = Field(1, env="GEOCODER_MAX_HEDGES")
+    GEOCODER_HEDGE_MIN_DELAY_SEC: float = Field(0.1, env="GEOCODER_HEDGE_MIN_DELAY_SEC")
+    GEOCODER_BREAKER_FAILURES: int = Field(5, env="GEOCODER_BREAKER_FAILURES")
+    GEOCODER_BREAKER_RESET_SEC: float = Field(30, env="GEOCODER_BREAKER_RESET_SEC")
+    
     # Конфигурация для Pydantic 2.5+
     if SettingsConfigDict:
         model_config = SettingsConfigDict(
@@ -1,9 +1,15 @@
 import asyncpg
+import json
 from loguru import logger
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from config import settings
 
+# Заглушки бота вместо геокодирования (bot/handlers.py): подпись геопозиции и тестовые координаты.
+# Такие адреса не годятся для прогрева геокодера
+PLACEHOLDER_ADDRESSES = ['Текущее местоположение']
+PLACEHOLDER_POINTS = [(55.7558, 37.6176), (55.7602, 37.6185)]
+
 class Database:
     """Класс для работы с базой данных (асинхронный)"""
     
@@ -195,18 +201,62 @@ class Database:
     
     @classmethod
     async def get_tariffs(cls) -> List[Dict[str, Any]]:
-        """Получить все тарифы"""
+        """Получить все активные тарифы (ошибка БД пробрасывается - кэш справочников оставит прежние)"""
+        pool = await cls.get_pool()
+        async with pool.acquire() as conn:
+            tariffs = await conn.fetch("""
+                SELECT * FROM tariffs 
+                WHERE is_active = TRUE 
+                ORDER BY base_fee
+            """)
+            return [dict(tariff) for tariff in tariffs]
+    
+    @classmethod
+    async def get_settings(cls) -> Dict[str, Any]:
+        """Системные настройки из таблицы settings (ключ -> значение)"""
+        pool = await cls.get_pool()
+        async with pool.acquire() as conn:
+            rows = await conn.fetch("SELECT key, value FROM settings")
+            return {row['key']: json.loads(row['value']) for row in rows}
+    
+    @classmethod
+    async def listen(cls, channel: str, callback) -> asyncpg.Connection:
+        """Отдельное соединение (вне пула), подписанное на LISTEN channel"""
+        conn = await asyncpg.connect(
+            dsn=settings.database_url,
+            server_settings={'application_name': 'taxi-bot-listener'}
+        )
+        await conn.add_listener(channel, callback)
+        return conn
+    
+    # === GEOCODING ===
+    
+    @classmethod
+    async def get_known_addresses(cls, limit: int = 50000, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Сохраненные адреса с координатами без заглушек бота, новые первыми (since - только более поздние).
+        
+        Адреса заказов не берутся: их координаты не проходят через геокодер.
+        """
         try:
             pool = await cls.get_pool()
             async with pool.acquire() as conn:
-                tariffs = await conn.fetch("""
-                    SELECT * FROM tariffs 
-                    WHERE is_active = TRUE 
-                    ORDER BY base_fee
-                """)
-                return [dict(tariff) for tariff in tariffs]
+                rows = await conn.fetch("""
+                    SELECT address, ST_Y(location) as lat, ST_X(location) as lon, updated_at as used_at
+                    FROM user_addresses
+                    WHERE location IS NOT NULL
+                      AND address <> ALL($3::text[])
+                      AND NOT EXISTS (
+                          SELECT 1 FROM unnest($4::float8[], $5::float8[]) AS p(lat, lon)
+                          WHERE abs(ST_Y(location) - p.lat) < 0.00001 AND abs(ST_X(location) - p.lon) < 0.00001
+                      )
+                      AND ($2::timestamptz IS NULL OR updated_at > $2)
+                    ORDER BY updated_at DESC
+                    LIMIT $1
+                """, limit, since, PLACEHOLDER_ADDRESSES,
+                    [lat for lat, _ in PLACEHOLDER_POINTS], [lon for _, lon in PLACEHOLDER_POINTS])
+                return [dict(row) for row in rows]
         except Exception as e:
-            logger.error(f"❌ Ошибка получения тарифов: {e}")
+            logger.error(f"❌ Ошибка получения адресов: {e}")
             return []
     
     # === STATISTICS ===
@@ -0,0 +1,108 @@
+import numpy as np
+from typing import Tuple
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = np.pi / 180 * EARTH_RADIUS_KM
+
+# Средняя скорость в городе для оценки времени в пути
+AVERAGE_SPEED_KMH = 40.0
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def as_array(values) -> np.ndarray:
+    """Непрерывный float64-массив без копирования, если он уже такой"""
+    array = np.asarray(values, dtype=np.float64)
+    return array if array.flags.c_contiguous else np.ascontiguousarray(array)
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Расстояние по дуге большого круга в км (поэлементно, с broadcasting)"""
+    lat1, lon1, lat2, lon2 = (np.radians(as_array(v)) for v in (lat1, lon1, lat2, lon2))
+    
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def distances_from(lat: float, lon: float, lats, lons) -> np.ndarray:
+    """Расстояния в км от одной точки до массива точек"""
+    return haversine_km(lat, lon, lats, lons)
+
+
+def distance_matrix(lats1, lons1, lats2, lons2) -> np.ndarray:
+    """Матрица расстояний в км (N, M) между двумя наборами точек"""
+    lat1 = np.radians(as_array(lats1))[:, None]
+    lon1 = np.radians(as_array(lons1))[:, None]
+    lat2 = np.radians(as_array(lats2))[None, :]
+    lon2 = np.radians(as_array(lons2))[None, :]
+    
+    # Косинусы считаются один раз на точку, а не на пару
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """Прямоугольник (min_lat, max_lat, min_lon, max_lon), содержащий круг радиуса radius_km"""
+    d_lat = radius_km / KM_PER_DEGREE
+    d_lon = radius_km / (KM_PER_DEGREE * max(np.cos(np.radians(lat)), 0.01))
+    return lat - d_lat, lat + d_lat, lon - d_lon, lon + d_lon
+
+
+def in_bounding_box(lat: float, lon: float, lats, lons, radius_km: float) -> np.ndarray:
+    """Маска точек внутри ограничивающего прямоугольника круга (дешевый отбор до haversine)"""
+    lats, lons = as_array(lats), as_array(lons)
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    return (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+
+
+def within_radius(lat: float, lon: float, lats, lons, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Индексы точек в радиусе radius_km, отсортированные по расстоянию, и расстояния до них в км"""
+    lats, lons = as_array(lats), as_array(lons)
+    
+    candidates = np.flatnonzero(in_bounding_box(lat, lon, lats, lons, radius_km))
+    distances = haversine_km(lat, lon, lats[candidates], lons[candidates])
+    
+    inside = distances <= radius_km
+    candidates, distances = candidates[inside], distances[inside]
+    
+    order = np.argsort(distances, kind='stable')
+    return candidates[order], distances[order]
+
+
+def project_km(lats, lons, ref_lat: float) -> np.ndarray:
+    """Равнопромежуточная проекция в км (N, 2) - для KD-деревьев в пределах города"""
+    lats, lons = as_array(lats), as_array(lons)
+    return np.column_stack((lons * KM_PER_DEGREE * np.cos(np.radians(ref_lat)), lats * KM_PER_DEGREE))
+
+
+def eta_minutes(distance_km, traffic_level: float = 1.0, min_minutes: int = 3) -> np.ndarray:
+    """Время в пути в минутах при средней городской скорости"""
+    speed_kmh = AVERAGE_SPEED_KMH / traffic_level
+    minutes = np.ceil(as_array(distance_km) / speed_kmh * 60)
+    return np.maximum(minutes, min_minutes).astype(np.int64)
+
+
+def geohash(lat: float, lon: float, precision: int = 7) -> str:
+    """Geohash точки (7 символов - клетка около 150 x 150 м)"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    
+    while len(chars) < precision:
+        # Биты чередуются: четные - долгота, нечетные - широта
+        current, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (current[0] + current[1]) / 2
+        
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            current[0] = middle
+        else:
+            current[1] = middle
+        
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    
+    return ''.join(chars)
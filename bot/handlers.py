@@ -6,7 +6,11 @@ from aiogram.fsm.state import State, StatesGroup
 from loguru import logger
 
 from database import Database
-from utils import calculate_distance, calculate_eta, calculate_price, format_price
+from utils import calculate_route, format_price
+from route_cache import route_cache
+from reference_cache import reference_cache
+from pricing import pricing_engine
+from surge import surge_multipliers
 from keyboards import (
     get_main_keyboard, 
     get_location_keyboard,
@@ -20,6 +24,14 @@ from keyboards import (
 
 router = Router()
 
+# Кнопки выбора тарифа -> названия тарифов в БД
+TARIFF_NAMES = {
+    "economy": "Эконом",
+    "comfort": "Комфорт",
+    "business": "Бизнес",
+    "delivery": "Доставка"
+}
+
 # === STATES ===
 class OrderStates(StatesGroup):
     waiting_location = State()
@@ -181,8 +193,9 @@ async def handle_destination(message: Message, state: FSMContext):
     destination_lon = 37.6185
     
     # Расчет расстояния и времени
-    distance = calculate_distance(pickup_lat, pickup_lon, destination_lat, destination_lon)
-    duration = calculate_eta(distance)
+    distance, duration = await route_cache.route(
+        pickup_lat, pickup_lon, destination_lat, destination_lon, calculate_route
+    )
     
     await state.update_data(
         destination_address=destination,
@@ -208,22 +221,20 @@ async def handle_tariff_selection(callback: CallbackQuery, state: FSMContext):
     """Обработка выбора тарифа"""
     tariff_type = callback.data.split("_")[1]
     
-    tariffs = {
-        "economy": {"name": "🚗 Эконом", "base_fee": 50, "per_km": 15, "per_minute": 5},
-        "comfort": {"name": "🚙 Комфорт", "base_fee": 100, "per_km": 25, "per_minute": 8},
-        "business": {"name": "⭐ Бизнес", "base_fee": 200, "per_km": 40, "per_minute": 12},
-        "delivery": {"name": "🚐 Доставка", "base_fee": 150, "per_km": 20, "per_minute": 6}
-    }
-    
-    tariff = tariffs.get(tariff_type, tariffs["economy"])
+    # Тариф из кэша справочников
+    tariff = reference_cache.get_tariff_by_name(TARIFF_NAMES.get(tariff_type, TARIFF_NAMES["economy"]))
+    if not tariff:
+        await callback.answer("❌ Тариф временно недоступен", show_alert=True)
+        return
     
     # Получаем данные из состояния
     data = await state.get_data()
     distance = data.get('distance_km', 5)
     duration = data.get('duration_minutes', 15)
     
-    # Расчет цены
-    price = calculate_price(distance, duration, tariff)
+    # Расчет цены с коэффициентом спроса, который считает backend
+    surge = await surge_multipliers.multiplier(data.get('pickup_lat'), data.get('pickup_lon'))
+    price = pricing_engine.quote(distance, duration, tariff, surge=surge)
     
     await state.update_data(
         tariff_name=tariff["name"],
@@ -236,8 +247,9 @@ async def handle_tariff_selection(callback: CallbackQuery, state: FSMContext):
         f"📍 Куда: {data.get('destination_address', 'Адрес назначения')}\n"
         f"📏 Расстояние: {distance:.1f} км\n"
         f"⏱ Время: ~{duration} мин\n"
-        f"🚗 Тариф: {tariff['name']}\n"
-        f"💰 Стоимость: {format_price(price)}\n\n"
+        f"🚗 Тариф: {tariff.get('icon') or ''} {tariff['name']}\n"
+        + (f"⚡ Повышенный спрос: x{surge:g}\n" if surge > 1 else "")
+        + f"💰 Стоимость: {format_price(price)}\n\n"
         f"Подтверждаете заказ?",
         reply_markup=get_order_confirmation_keyboard()
     )
@@ -16,6 +16,12 @@ from aiogram.client.default import DefaultBotProperties
 from config import settings
 from database import Database
 from handlers import router
+from route_cache import route_cache
+from surge import surge_multipliers
+from address_index import address_index
+from geocode_cache import geocode_cache
+from reference_cache import reference_cache
+from http_client import http_client
 
 # Настройка логирования
 logger.add(
@@ -104,6 +110,30 @@ class TaxiBot:
             logger.error("❌ Не удалось подключиться ко всем сервисам")
             return False
         
+        # Тарифы и настройки в памяти, сброс по NOTIFY из БД
+        try:
+            await reference_cache.start()
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки тарифов и настроек: {e}")
+        
+        # Общий HTTP-клиент для геокодера
+        await http_client.start()
+        
+        # Кэш геокодирования, прогретый сохраненными адресами пользователей
+        try:
+            await geocode_cache.open()
+            known = await Database.get_known_addresses(settings.GEOCODE_CACHE_WARM_LIMIT)
+            warmed = await geocode_cache.warm((a['address'], a['lat'], a['lon']) for a in known)
+            logger.info(f"✅ Кэш геокодирования прогрет: {warmed} записей")
+        except Exception as e:
+            logger.error(f"❌ Ошибка прогрева кэша геокодирования: {e}")
+        
+        # Локальный обратный геокодер по известным адресам
+        try:
+            await address_index.start(settings.ADDRESS_INDEX_DUMP_PATH or None)
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки индекса адресов: {e}")
+        
         # Отправка уведомления администраторам
         await self.notify_admins("🤖 Такси-бот запущен и готов к работе!")
         
@@ -116,6 +146,12 @@ class TaxiBot:
         
         # Закрытие пула соединений с БД
         await Database.close_pool()
+        await route_cache.close()
+        await surge_multipliers.close()
+        await geocode_cache.close()
+        await address_index.stop()
+        await reference_cache.stop()
+        await http_client.close()
         
         # Отправка уведомления администраторам
         await self.notify_admins("⚠️ Такси-бот остановлен")
@@ -0,0 +1,175 @@
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+import redis.asyncio as redis
+from loguru import logger
+
+from config import settings
+import geo
+
+# (расстояние в км, время в минутах)
+RouteResult = Tuple[float, int]
+
+
+class RedisRouteStore:
+    """Общее хранилище маршрутов в Redis (для нескольких процессов и бота)"""
+    
+    def __init__(self, host: str, port: int, db: int = 0, password: Optional[str] = None):
+        self._redis = redis.Redis(host=host, port=port, db=db, password=password, socket_timeout=0.2)
+    
+    async def get(self, key: str) -> Optional[RouteResult]:
+        value = await self._redis.get(key)
+        if value is None:
+            return None
+        
+        distance, duration = value.decode().split(':')
+        return float(distance), int(duration)
+    
+    async def set(self, key: str, value: RouteResult, ttl_sec: int):
+        await self._redis.set(key, f"{value[0]}:{value[1]}", ex=ttl_sec)
+    
+    async def close(self):
+        await self._redis.close()
+
+
+class RouteCache:
+    """Кэш расстояний и времени в пути: LRU в памяти процесса и общее хранилище.
+    
+    Ключ - geohash точек отправления и назначения и интервал времени суток,
+    поэтому поездки из одного здания (аэропорт, вокзал) в одно место попадают в один ключ.
+    """
+    
+    def __init__(
+        self,
+        max_size: int = 50000,
+        ttl_sec: int = 1800,
+        precision: int = 7,
+        bucket_minutes: int = 15,
+        store: Optional[RedisRouteStore] = None,
+        publish: bool = True
+    ):
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        self.precision = precision
+        self.bucket_minutes = bucket_minutes
+        self.store = store
+        # False - только читать общее хранилище (результаты процесса хуже общих)
+        self.publish = publish
+        
+        # ключ -> (срок годности по time.monotonic, результат)
+        self._local: "OrderedDict[str, Tuple[float, RouteResult]]" = OrderedDict()
+        
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.store_errors = 0
+    
+    def key(self, lat1: float, lon1: float, lat2: float, lon2: float, at: Optional[datetime] = None) -> str:
+        """Ключ кэша для пары точек"""
+        at = at or datetime.now()
+        bucket = (at.hour * 60 + at.minute) // self.bucket_minutes
+        
+        return (
+            f"route:{geo.geohash(lat1, lon1, self.precision)}:"
+            f"{geo.geohash(lat2, lon2, self.precision)}:{bucket}"
+        )
+    
+    def _get_local(self, key: str) -> Optional[RouteResult]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._local[key]
+            return None
+        
+        self._local.move_to_end(key)
+        return value
+    
+    def _set_local(self, key: str, value: RouteResult):
+        self._local[key] = (time.monotonic() + self.ttl_sec, value)
+        self._local.move_to_end(key)
+        
+        while len(self._local) > self.max_size:
+            self._local.popitem(last=False)
+    
+    async def get(self, key: str) -> Optional[RouteResult]:
+        """Результат из кэша (сначала память процесса, затем общее хранилище)"""
+        value = self._get_local(key)
+        if value is not None:
+            self.local_hits += 1
+            return value
+        
+        if self.store:
+            try:
+                value = await self.store.get(key)
+            except Exception as e:
+                self.store_errors += 1
+                logger.warning(f"Route cache store read failed: {e}")
+            
+            if value is not None:
+                self.shared_hits += 1
+                self._set_local(key, value)
+                return value
+        
+        self.misses += 1
+        return None
+    
+    async def set(self, key: str, value: RouteResult):
+        """Сохранить результат"""
+        self._set_local(key, value)
+        
+        if self.store and self.publish:
+            try:
+                await self.store.set(key, value, self.ttl_sec)
+            except Exception as e:
+                self.store_errors += 1
+                logger.warning(f"Route cache store write failed: {e}")
+    
+    async def route(
+        self,
+        lat1: float,
+        lon1: float,
+        lat2: float,
+        lon2: float,
+        compute: Callable[[float, float, float, float], RouteResult]
+    ) -> RouteResult:
+        """Расстояние и время в пути: из кэша или через compute"""
+        key = self.key(lat1, lon1, lat2, lon2)
+        
+        value = await self.get(key)
+        if value is None:
+            value = compute(lat1, lon1, lat2, lon2)
+            await self.set(key, value)
+        
+        return value
+    
+    async def close(self):
+        if self.store:
+            await self.store.close()
+    
+    def get_stats(self) -> dict:
+        """Счетчики попаданий"""
+        total = self.local_hits + self.shared_hits + self.misses
+        return {
+            "size": len(self._local),
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "store_errors": self.store_errors,
+            "hit_ratio": round((self.local_hits + self.shared_hits) / total, 3) if total else 0.0
+        }
+
+
+route_cache = RouteCache(
+    max_size=settings.ROUTE_CACHE_SIZE,
+    ttl_sec=settings.ROUTE_CACHE_TTL_SEC,
+    precision=settings.ROUTE_CACHE_PRECISION,
+    bucket_minutes=settings.ROUTE_CACHE_BUCKET_MIN,
+    store=RedisRouteStore(
+        settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_DB, settings.REDIS_PASSWORD
+    ) if settings.ROUTE_CACHE_REDIS else None,
+    publish=settings.ROUTE_CACHE_PUBLISH
+)
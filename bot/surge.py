@@ -0,0 +1,81 @@
+import json
+import math
+import time
+from typing import Dict, Optional, Tuple
+import redis.asyncio as redis
+from loguru import logger
+
+from config import settings
+
+# Ключ Redis, в который backend публикует коэффициенты (backend/surge.py)
+SURGE_KEY = 'surge:multipliers'
+
+
+class SurgeMultipliers:
+    """Коэффициенты surge, посчитанные backend, - чтобы цена в боте совпадала с ценой приложения.
+    
+    Спрос и предложение бот не считает. Без общего Redis (или пока backend ничего
+    не опубликовал) коэффициент равен 1.
+    """
+    
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: int = 6379,
+        db: int = 0,
+        password: Optional[str] = None,
+        refresh_sec: float = 10
+    ):
+        self._redis = redis.Redis(host=host, port=port, db=db, password=password, socket_timeout=0.2) if host else None
+        self.refresh_sec = refresh_sec
+        
+        self._cell_deg: Optional[float] = None
+        self._cells: Dict[Tuple[int, int], float] = {}
+        self._loaded_at = -math.inf
+        
+        self.errors = 0
+    
+    async def _load(self):
+        self._loaded_at = time.monotonic()
+        try:
+            payload = await self._redis.get(SURGE_KEY)
+        except Exception as e:
+            # Redis недоступен - остаются прежние коэффициенты до следующей попытки
+            self.errors += 1
+            logger.warning(f"⚠️ Коэффициенты surge недоступны: {e}")
+            return
+        
+        if payload is None:
+            self._cell_deg, self._cells = None, {}
+            return
+        
+        data = json.loads(payload)
+        self._cell_deg = data['cell_deg']
+        self._cells = {tuple(map(int, key.split(':'))): value for key, value in data['cells'].items()}
+    
+    async def multiplier(self, lat: Optional[float], lon: Optional[float]) -> float:
+        """Коэффициент для точки подачи"""
+        if self._redis is None or lat is None or lon is None:
+            return 1.0
+        
+        if time.monotonic() - self._loaded_at >= self.refresh_sec:
+            await self._load()
+        
+        if not self._cell_deg:
+            return 1.0
+        
+        cell = (int(math.floor(lat / self._cell_deg)), int(math.floor(lon / self._cell_deg)))
+        return self._cells.get(cell, 1.0)
+    
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.close()
+
+
+surge_multipliers = SurgeMultipliers(
+    settings.REDIS_HOST if settings.SURGE_REDIS else None,
+    settings.REDIS_PORT,
+    settings.REDIS_DB,
+    settings.REDIS_PASSWORD,
+    refresh_sec=settings.SURGE_REFRESH_SEC
+)
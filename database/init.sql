@@ -55,7 +55,6 @@ CREATE TABLE drivers (
     insurance_number VARCHAR(50),
     insurance_expiry DATE,
     status driver_status DEFAULT 'offline',
-    current_location GEOMETRY(Point, 4326),
     balance DECIMAL(12,2) DEFAULT 0.00,
     total_earnings DECIMAL(12,2) DEFAULT 0.00,
     total_rides INTEGER DEFAULT 0,
@@ -136,9 +135,9 @@ CREATE TABLE transactions (
     completed_at TIMESTAMP WITH TIME ZONE
 );
 
--- Таблица геолокаций водителей
+-- Таблица геолокаций водителей (секции по дням, см. create_driver_locations_partitions)
 CREATE TABLE driver_locations (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     driver_id INTEGER REFERENCES drivers(id) ON DELETE CASCADE,
     location GEOMETRY(Point, 4326) NOT NULL,
     accuracy DECIMAL(5,2),
@@ -147,7 +146,29 @@ CREATE TABLE driver_locations (
     altitude DECIMAL(8,2),
     battery_level INTEGER,
     is_moving BOOLEAN DEFAULT FALSE,
-    recorded_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    recorded_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (id, recorded_at)
+) PARTITION BY RANGE (recorded_at);
+
+-- Секция для точек вне созданных дневных секций
+CREATE TABLE driver_locations_default PARTITION OF driver_locations DEFAULT;
+
+-- Дни, прореженные до одной точки на водителя в минуту
+CREATE TABLE driver_locations_downsampled (
+    day DATE PRIMARY KEY,
+    rows_before BIGINT,
+    rows_after BIGINT,
+    processed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Последняя позиция каждого водителя (обновляется при записи GPS-точек)
+CREATE TABLE driver_positions (
+    driver_id INTEGER PRIMARY KEY REFERENCES drivers(id) ON DELETE CASCADE,
+    location GEOGRAPHY(Point, 4326) NOT NULL,
+    speed DECIMAL(5,2),
+    heading INTEGER,
+    recorded_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Таблица тарифов
@@ -200,6 +221,27 @@ CREATE TABLE system_logs (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Очередь задач поиска водителя (переживает перезапуск backend)
+CREATE TABLE dispatch_jobs (
+    order_id INTEGER PRIMARY KEY REFERENCES orders(id) ON DELETE CASCADE,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending', -- 'pending', 'running', 'done'
+    attempts INTEGER DEFAULT 0,
+    locked_by VARCHAR(100),
+    lease_until TIMESTAMP WITH TIME ZONE,
+    heartbeat_at TIMESTAMP WITH TIME ZONE,
+    offered_drivers INTEGER[] DEFAULT '{}',
+    search_started_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Водители с активным предложением заказа (не более одного предложения на водителя)
+CREATE TABLE driver_offer_locks (
+    driver_id INTEGER PRIMARY KEY REFERENCES drivers(id) ON DELETE CASCADE,
+    order_id INTEGER REFERENCES orders(id) ON DELETE CASCADE,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
 -- ИНДЕКСЫ для производительности
 
 -- Индексы для users
@@ -211,7 +253,6 @@ CREATE INDEX idx_users_status ON users(status);
 CREATE INDEX idx_drivers_user_id ON drivers(user_id);
 CREATE INDEX idx_drivers_status ON drivers(status);
 CREATE INDEX idx_drivers_verified ON drivers(is_verified) WHERE is_verified = TRUE;
-CREATE INDEX idx_drivers_location ON drivers USING GIST(current_location);
 
 -- Индексы для orders
 CREATE INDEX idx_orders_passenger_id ON orders(passenger_id);
@@ -222,11 +263,18 @@ CREATE INDEX idx_orders_uuid ON orders(order_uuid);
 CREATE INDEX idx_orders_pickup_location ON orders USING GIST(pickup_location);
 CREATE INDEX idx_orders_payment_status ON orders(payment_status);
 
--- Индексы для driver_locations
-CREATE INDEX idx_driver_locations_driver_id ON driver_locations(driver_id);
+-- Индексы для driver_locations (создаются в каждой секции)
+CREATE INDEX idx_driver_locations_driver_recorded ON driver_locations(driver_id, recorded_at DESC);
 CREATE INDEX idx_driver_locations_recorded_at ON driver_locations(recorded_at DESC);
 CREATE INDEX idx_driver_locations_geo ON driver_locations USING GIST(location);
 
+-- Индексы для driver_positions (KNN-поиск через <->)
+CREATE INDEX idx_driver_positions_location ON driver_positions USING GIST(location);
+
+-- Индексы для очереди поиска
+CREATE INDEX idx_dispatch_jobs_claim ON dispatch_jobs(created_at) WHERE status != 'done';
+CREATE INDEX idx_driver_offer_locks_order_id ON driver_offer_locks(order_id);
+
 -- Индексы для транзакций
 CREATE INDEX idx_transactions_user_id ON transactions(user_id);
 CREATE INDEX idx_transactions_order_id ON transactions(order_id);
@@ -259,6 +307,23 @@ CREATE TRIGGER update_user_addresses_updated_at
     BEFORE UPDATE ON user_addresses 
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Уведомление процессов об изменении справочников (кэш тарифов и настроек в памяти)
+CREATE OR REPLACE FUNCTION notify_reference_data_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('reference_data_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER notify_tariffs_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON tariffs
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_reference_data_changed();
+
+CREATE TRIGGER notify_settings_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON settings
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_reference_data_changed();
+
 -- ФУНКЦИИ
 
 -- Функция для поиска ближайших водителей
@@ -282,41 +347,149 @@ BEGIN
     SELECT 
         d.id as driver_id,
         u.id as user_id,
-        ST_Distance(
-            search_point::geography,
-            dl.location::geography
-        ) as distance_meters,
+        ST_Distance(search_point::geography, dp.location)::DECIMAL as distance_meters,
         d.car_brand,
         d.car_model,
         u.rating,
         CEILING(
-            ST_Distance(
-                search_point::geography,
-                dl.location::geography
-            ) / 500.0  -- предполагаем 500 метров в минуту
+            ST_Distance(search_point::geography, dp.location) / 500.0  -- предполагаем 500 метров в минуту
         )::INTEGER as estimated_arrival_minutes
-    FROM drivers d
+    FROM driver_positions dp
+    JOIN drivers d ON d.id = dp.driver_id
     JOIN users u ON d.user_id = u.id
-    JOIN (
-        SELECT DISTINCT ON (driver_id) driver_id, location
-        FROM driver_locations
-        WHERE recorded_at > NOW() - INTERVAL '2 minutes'
-        ORDER BY driver_id, recorded_at DESC
-    ) dl ON dl.driver_id = d.id
-    WHERE d.status = 'online'
+    WHERE dp.recorded_at > NOW() - INTERVAL '2 minutes'
+      AND d.status = 'online'
       AND d.is_verified = TRUE
       AND u.status = 'active'
-      AND ST_DWithin(
-            search_point::geography,
-            dl.location::geography,
-            radius_km * 1000
-          )
+      AND ST_DWithin(search_point::geography, dp.location, radius_km * 1000)
       AND (car_type IS NULL OR d.car_model ILIKE '%' || car_type || '%')
-    ORDER BY distance_meters ASC
+    -- KNN по GiST-индексу: позиции читаются в порядке удаления от точки
+    ORDER BY dp.location <-> search_point::geography
     LIMIT max_drivers;
 END;
 $$ LANGUAGE plpgsql;
 
+-- Создание дневных секций driver_locations на days_ahead дней вперед
+CREATE OR REPLACE FUNCTION create_driver_locations_partitions(days_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    partition_day DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    FOR i IN 0..days_ahead LOOP
+        partition_day := CURRENT_DATE + i;
+        partition_name := 'driver_locations_' || to_char(partition_day, 'YYYYMMDD');
+        
+        IF to_regclass(partition_name) IS NULL THEN
+            -- Точки этого дня могли уже попасть в секцию по умолчанию (сервис работал без
+            -- обслуживания): CREATE ... PARTITION OF на них падает, поэтому секция создается
+            -- отдельной таблицей, точки переносятся в нее и она подключается к driver_locations.
+            -- Ошибка одного дня не отменяет остальные
+            BEGIN
+                EXECUTE format(
+                    'CREATE TABLE %I (LIKE driver_locations INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                    partition_name
+                );
+                EXECUTE format(
+                    'WITH moved AS (
+                        DELETE FROM driver_locations_default
+                        WHERE recorded_at >= %L AND recorded_at < %L
+                        RETURNING *
+                    )
+                    INSERT INTO %I SELECT * FROM moved',
+                    partition_day, partition_day + 1, partition_name
+                );
+                EXECUTE format(
+                    'ALTER TABLE driver_locations ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, partition_day, partition_day + 1
+                );
+                created := created + 1;
+            EXCEPTION WHEN OTHERS THEN
+                RAISE WARNING 'driver_locations partition % not created: %', partition_name, SQLERRM;
+            END;
+        END IF;
+    END LOOP;
+    
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Дневные секции driver_locations с датой (для обслуживания)
+CREATE OR REPLACE FUNCTION driver_locations_partitions()
+RETURNS TABLE (partition_name TEXT, partition_day DATE) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT c.relname::TEXT,
+           to_date(substring(c.relname FROM '[0-9]{8}$'), 'YYYYMMDD')
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN pg_class p ON p.oid = i.inhparent
+    WHERE p.relname = 'driver_locations'
+      AND c.relname ~ '^driver_locations_[0-9]{8}$'
+    ORDER BY 2;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Удаление секций старше retention_days
+CREATE OR REPLACE FUNCTION drop_old_driver_locations_partitions(retention_days INTEGER DEFAULT 30)
+RETURNS INTEGER AS $$
+DECLARE
+    part RECORD;
+    dropped INTEGER := 0;
+BEGIN
+    FOR part IN SELECT * FROM driver_locations_partitions() LOOP
+        IF part.partition_day < CURRENT_DATE - retention_days THEN
+            EXECUTE format('ALTER TABLE driver_locations DETACH PARTITION %I', part.partition_name);
+            EXECUTE format('DROP TABLE %I', part.partition_name);
+            DELETE FROM driver_locations_downsampled WHERE day = part.partition_day;
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+    
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Прореживание секций старше older_than_days: одна (последняя) точка на водителя в минуту
+CREATE OR REPLACE FUNCTION downsample_driver_locations(older_than_days INTEGER DEFAULT 7)
+RETURNS INTEGER AS $$
+DECLARE
+    part RECORD;
+    rows_before BIGINT;
+    rows_after BIGINT;
+    processed INTEGER := 0;
+BEGIN
+    FOR part IN
+        SELECT p.* FROM driver_locations_partitions() p
+        WHERE p.partition_day < CURRENT_DATE - older_than_days
+          AND NOT EXISTS (SELECT 1 FROM driver_locations_downsampled d WHERE d.day = p.partition_day)
+    LOOP
+        EXECUTE format('SELECT COUNT(*) FROM %I', part.partition_name) INTO rows_before;
+        
+        -- Секция переписывается целиком: в отличие от DELETE, не остается раздутой таблицы
+        EXECUTE format(
+            'CREATE TEMP TABLE driver_locations_keep AS
+             SELECT DISTINCT ON (driver_id, date_trunc(''minute'', recorded_at)) *
+             FROM %I
+             ORDER BY driver_id, date_trunc(''minute'', recorded_at), recorded_at DESC',
+            part.partition_name
+        );
+        EXECUTE format('TRUNCATE %I', part.partition_name);
+        EXECUTE format('INSERT INTO %I SELECT * FROM driver_locations_keep', part.partition_name);
+        GET DIAGNOSTICS rows_after = ROW_COUNT;
+        DROP TABLE driver_locations_keep;
+        
+        INSERT INTO driver_locations_downsampled (day, rows_before, rows_after)
+        VALUES (part.partition_day, rows_before, rows_after);
+        
+        processed := processed + 1;
+    END LOOP;
+    
+    RETURN processed;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Функция для расчета стоимости поездки
 CREATE OR REPLACE FUNCTION calculate_ride_price(
     distance_km DECIMAL,
@@ -399,6 +572,9 @@ INSERT INTO settings (key, value, description) VALUES
 ('currency', '"RUB"', 'Основная валюта'),
 ('timezone', '"Europe/Moscow"', 'Часовой пояс');
 
+-- Секции driver_locations на ближайшие дни (дальше создает backend)
+SELECT create_driver_locations_partitions(7);
+
 -- Тестовый администратор
 INSERT INTO users (telegram_id, phone, first_name, last_name, user_type) 
 VALUES (777777777, '+79167777777', 'Админ', 'Системы', 'admin');
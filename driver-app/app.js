@@ -577,6 +577,13 @@ const app = new Vue({
         declineOrder() {
             if (!this.newOrder) return;
             
+            // Сообщаем серверу, чтобы заказ сразу ушел следующему водителю
+            this.sendWebSocketMessage({
+                type: 'order_update',
+                order_id: this.newOrder.id,
+                status: 'declined'
+            });
+            
             this.showNotification('info', 'Отклонено', `Вы отклонили заказ #${this.newOrder.id}`);
             this.newOrder = null;
             this.stopOrderTimer();
@@ -935,6 +942,11 @@ const app = new Vue({
                     driver_id: driverId,
                     status: this.driverStatus
                 });
+                
+                // После переподключения снова следим за текущим заказом
+                if (this.currentOrder) {
+                    this.sendWebSocketMessage({ type: 'subscribe', order_id: this.currentOrder.id });
+                }
             };
             
             this.ws.onmessage = (event) => {
@@ -975,6 +987,10 @@ const app = new Vue({
                     this.handleOrderUpdate(message);
                     break;
                     
+                case 'offer_cancelled':
+                    this.handleOfferCancelled(message);
+                    break;
+                    
                 case 'driver_status_update':
                     this.handleDriverStatusUpdate(message);
                     break;
@@ -1002,10 +1018,25 @@ const app = new Vue({
             this.playNotificationSound();
         },
         
+        handleOfferCancelled(message) {
+            if (!this.newOrder || this.newOrder.id !== message.order_id) return;
+            
+            const reasons = {
+                taken: `Заказ #${message.order_id} уже принят другим водителем`,
+                timeout: `Время на ответ по заказу #${message.order_id} истекло`,
+                cancelled: `Заказ #${message.order_id} отменен`
+            };
+            
+            this.newOrder = null;
+            this.stopOrderTimer();
+            this.showNotification('info', 'Заказ снят', reasons[message.reason] || `Заказ #${message.order_id} больше недоступен`);
+        },
+        
         handleOrderUpdate(message) {
             if (!this.currentOrder || this.currentOrder.id !== message.order_id) return;
             
-            // Обновляем статус заказа
+            // Полный заказ или только измененные поля
+            Object.assign(this.currentOrder, message.order || message.changes || {});
             this.currentOrder.status = message.status;
             
             switch (message.status) {